@@ -1,5 +1,12 @@
 from django.contrib import admin
 
 # Register your models here.
-from .models import Prompt
-admin.site.register(Prompt)
\ No newline at end of file
+from .models import Prompt, PlanJob
+admin.site.register(Prompt)
+
+
+@admin.register(PlanJob)
+class PlanJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "kind", "date", "status", "attempts", "created_at", "finished_at")
+    list_filter = ("status", "kind")
+    readonly_fields = ("created_at", "updated_at", "finished_at", "locked_at", "worker")
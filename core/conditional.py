@@ -0,0 +1,27 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+# ====================================================================
+# Conditional GET
+# ====================================================================
+# Endpoints compute their validators from one cheap indexed lookup, answer
+# If-None-Match / If-Modified-Since with 304 before doing any real work,
+# and stamp the same validators on the full response otherwise.
+
+
+def set_validators(response, etag: str | None = None, last_modified: float | None = None):
+    if etag:
+        response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def not_modified(request, etag: str | None = None, last_modified: float | None = None):
+    """The 304 response if the client's copy is current, else None."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified) if last_modified is not None else None
+    )
+    if response is None or response.status_code != 304:
+        return None
+    return set_validators(response, etag, last_modified)
@@ -0,0 +1,118 @@
+import json
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from llm.planners.daily_plan import generate_daily_plan
+from llm.planners.onboarding import generate_onboarding_plan
+from .models import PlanJob
+
+
+def _job_options() -> dict:
+    """Merge PLAN_JOBS settings over the defaults."""
+    options = {
+        "MAX_ATTEMPTS": 3,
+        "RETRY_BACKOFF_SECONDS": 30,
+        "LEASE_SECONDS": 600,
+    }
+    options.update(getattr(settings, "PLAN_JOBS", {}))
+    return options
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_plan_job(user, kind: str = "daily_plan", reschedule: bool = False) -> tuple[PlanJob, bool]:
+    """
+    Queue a plan generation job, or return the user's active job for the same kind/day.
+    Returns (job, created).
+    """
+    today = timezone.localdate()
+    existing = PlanJob.objects.filter(
+        user=user, kind=kind, date=today, status__in=PlanJob.ACTIVE_STATUSES
+    ).first()
+    if existing:
+        return existing, False
+
+    try:
+        with transaction.atomic():
+            job = PlanJob.objects.create(
+                user=user,
+                kind=kind,
+                date=today,
+                reschedule=reschedule,
+                max_attempts=_job_options()["MAX_ATTEMPTS"],
+            )
+        return job, True
+    except IntegrityError:
+        # Lost a race with a concurrent enqueue → reuse the winner's job
+        job = PlanJob.objects.get(user=user, kind=kind, date=today, status__in=PlanJob.ACTIVE_STATUSES)
+        return job, False
+
+
+def claim_next_job(worker: str) -> PlanJob | None:
+    """
+    Atomically claim the oldest runnable job.
+    The conditional UPDATE only succeeds for one worker, on any database backend.
+    """
+    now = timezone.now()
+    candidates = PlanJob.objects.filter(
+        status=PlanJob.STATUS_QUEUED, run_after__lte=now
+    ).order_by("run_after", "id").values_list("id", flat=True)[:10]
+
+    for job_id in candidates:
+        claimed = PlanJob.objects.filter(id=job_id, status=PlanJob.STATUS_QUEUED).update(
+            status=PlanJob.STATUS_RUNNING, locked_at=now, worker=worker, updated_at=now
+        )
+        if claimed:
+            return PlanJob.objects.select_related("user").get(id=job_id)
+    return None
+
+
+def requeue_stale_jobs() -> int:
+    """Put jobs whose worker died mid-run (lease expired) back on the queue."""
+    options = _job_options()
+    cutoff = timezone.now() - timedelta(seconds=options["LEASE_SECONDS"])
+    return PlanJob.objects.filter(status=PlanJob.STATUS_RUNNING, locked_at__lt=cutoff).update(
+        status=PlanJob.STATUS_QUEUED, locked_at=None, worker="", run_after=timezone.now()
+    )
+
+
+def _execute(job: PlanJob) -> dict:
+    if job.kind == "onboarding":
+        return generate_onboarding_plan(job.user).model_dump()
+    response = generate_daily_plan(job.user, reschedule=job.reschedule)
+    return json.loads(response.content)
+
+
+def run_job(job: PlanJob) -> PlanJob:
+    """Run a claimed job, recording the result or scheduling a retry with exponential backoff."""
+    job.attempts += 1
+    try:
+        job.result = _execute(job)
+    except Exception as e:
+        job.error = str(e)
+        if job.attempts < job.max_attempts:
+            backoff = _job_options()["RETRY_BACKOFF_SECONDS"] * 2 ** (job.attempts - 1)
+            # Rate limits and an open circuit say how long to back off
+            backoff = max(backoff, getattr(e, "retry_after", 0))
+            job.status = PlanJob.STATUS_QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=backoff)
+        else:
+            job.status = PlanJob.STATUS_FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = PlanJob.STATUS_SUCCEEDED
+        job.error = ""
+        job.finished_at = timezone.now()
+
+    job.locked_at = None
+    job.save(update_fields=[
+        "attempts", "result", "error", "status", "run_after", "locked_at", "finished_at", "updated_at"
+    ])
+    return job
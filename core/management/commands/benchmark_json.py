@@ -0,0 +1,88 @@
+import io
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import FastJSONParser, FastJSONRenderer, orjson
+
+
+def _schedule_page(schedules: int, tasks: int) -> list[dict]:
+    """Data shaped like DailyScheduleSerializer output."""
+    start = date(2025, 1, 1)
+    return [
+        {
+            "id": s,
+            "user": 1,
+            "date": (start + timedelta(days=s)).isoformat(),
+            "day_of_week": (start + timedelta(days=s)).strftime("%A"),
+            "tasks": [
+                {
+                    "id": s * tasks + t,
+                    "task_name": f"Task {t} — focus block",
+                    "description": "Deep work on the quarterly report, no notifications",
+                    "estimated_duration_minutes": 25 + t,
+                    "priority": "NOW" if t % 3 == 0 else "LATER",
+                    "related_goal": "Ship the report",
+                    "suggested_time": f"{8 + t % 10:02d}:30:00",
+                    "is_flexible": t % 2 == 0,
+                    "completed": t % 4 == 0,
+                    "feedback": None,
+                    "rating": t % 5 + 1 if t % 4 == 0 else None,
+                }
+                for t in range(tasks)
+            ],
+            "total_tasks": tasks,
+            "high_priority_tasks": (tasks + 2) // 3,
+            "total_committed_hours": 6.5,
+            "total_available_hours": 9.25,
+            "notes": "Front-load the hard tasks.",
+            "updated_commitments": ["Gym at 6pm"],
+            "updated_goals": ["Ship the report"],
+            "user_behaviour_patterns": ["Focus drops after lunch"],
+        }
+        for s in range(schedules)
+    ]
+
+
+def _best_of(repeat: int, func) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's JSON renderer/parser with the orjson-backed ones on a large schedule list."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--schedules", type=int, default=1000)
+        parser.add_argument("--tasks", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        data = _schedule_page(options["schedules"], options["tasks"])
+        stock, fast = JSONRenderer(), FastJSONRenderer()
+        body = stock.render(data)
+        if fast.render(data) != body:
+            raise CommandError("FastJSONRenderer output differs from JSONRenderer")
+
+        repeat = options["repeat"]
+        timings = [
+            ("render", _best_of(repeat, lambda: stock.render(data)), _best_of(repeat, lambda: fast.render(data))),
+            (
+                "parse",
+                _best_of(repeat, lambda: JSONParser().parse(io.BytesIO(body))),
+                _best_of(repeat, lambda: FastJSONParser().parse(io.BytesIO(body))),
+            ),
+        ]
+        self.stdout.write(
+            f"{options['schedules']} schedules x {options['tasks']} tasks, {len(body) / 1024:.0f} KiB, "
+            f"orjson {'available' if orjson else 'missing (stdlib fallback)'}; output identical"
+        )
+        for name, stock_ms, fast_ms in timings:
+            self.stdout.write(f"{name:>7}: stock {stock_ms:8.1f} ms   fast {fast_ms:8.1f} ms   x{stock_ms / fast_ms:.1f}")
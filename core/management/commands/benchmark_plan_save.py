@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from llm.schema import DailyPlan, DailyTask
+from llm.services.save_daily_plan_to_db import apply_daily_plan
+from users.models import User
+
+
+def _plan(size: int, suffix: str = "") -> DailyPlan:
+    return DailyPlan(
+        date="2000-01-01",
+        day_of_week="Saturday",
+        tasks=[
+            DailyTask(
+                task_name=f"Task {i}{suffix if i == 0 else ''}",
+                description="benchmark",
+                estimated_duration_minutes=15,
+                priority="NOW",
+                suggested_time=f"{8 + i % 12}:{i % 60:02d} AM" if i % 12 < 4 else None,
+            )
+            for i in range(size)
+        ],
+    )
+
+
+class Command(BaseCommand):
+    help = "Count the queries save_daily_plan_to_db needs per plan size (rolled back, nothing is kept)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 500])
+
+    def _measure(self, user, plan) -> tuple[int, float]:
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            apply_daily_plan(user, plan)
+            elapsed = time.perf_counter() - started
+        return len(queries), elapsed * 1000
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'tasks':>6} {'first save':>18} {'same plan':>18} {'one task changed':>18}")
+        for size in options["sizes"]:
+            with transaction.atomic():
+                user = User.objects.create_user(username=f"benchmark-{size}", email=f"benchmark-{size}@example.com")
+                first = self._measure(user, _plan(size))
+                same = self._measure(user, _plan(size))
+                changed = self._measure(user, _plan(size, suffix=" (moved)"))
+                transaction.set_rollback(True)
+            self.stdout.write(
+                f"{size:>6} "
+                + " ".join(f"{count:>5} q {ms:>7.1f} ms" for count, ms in (first, same, changed))
+            )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from llm.services.pattern_context import compact_patterns
+from users.models import User, UserPattern
+
+
+class Command(BaseCommand):
+    help = "Fold old behavioural patterns into each user's digest (run periodically, e.g. nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only compact this user id.")
+
+    def handle(self, *args, **options):
+        user_ids = UserPattern.objects.values_list("user_id", flat=True).distinct()
+        if options["user"]:
+            user_ids = user_ids.filter(user_id=options["user"])
+
+        user_ids = list(user_ids)
+        removed = 0
+        for user in User.objects.filter(id__in=user_ids).iterator():
+            removed += compact_patterns(user)
+        self.stdout.write(f"Compacted patterns for {len(user_ids)} user(s), removed {removed} row(s)")
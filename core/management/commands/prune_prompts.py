@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.retention import prune_prompts, vacuum_sqlite
+
+
+class Command(BaseCommand):
+    help = "Expire and evict cached prompts per PROMPT_RETENTION, in small chunks (safe to run while serving)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed.")
+        parser.add_argument("--chunk-size", type=int, help="Rows deleted per transaction (default: CHUNK_SIZE).")
+        parser.add_argument("--vacuum", action="store_true", help="On SQLite, VACUUM afterwards (locks the database).")
+
+    def handle(self, *args, **options):
+        result = prune_prompts(dry_run=options["dry_run"], chunk_size=options["chunk_size"])
+        prefix = "Would remove" if options["dry_run"] else "Removed"
+        self.stdout.write(
+            f"{prefix} {result['expired']} expired and {result['evicted']} evicted prompt(s); "
+            f"{result['remaining']} remaining"
+        )
+        if options["vacuum"] and not options["dry_run"] and vacuum_sqlite():
+            self.stdout.write("Vacuumed SQLite database")
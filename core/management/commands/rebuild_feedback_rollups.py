@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from llm.services.feedback_rollup import rebuild_feedback_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the feedback rollups behind the planner's trend section from the tasks (backfills, repairs)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, help="Only rebuild this user id.")
+
+    def handle(self, *args, **options):
+        user_ids = [options["user"]] if options["user"] else None
+        rows = rebuild_feedback_rollups(user_ids)
+        scope = f"user {options['user']}" if user_ids else "all users"
+        self.stdout.write(f"Rebuilt {rows} feedback rollup row(s) for {scope}")
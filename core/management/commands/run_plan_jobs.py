@@ -0,0 +1,57 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.jobs import claim_next_job, requeue_stale_jobs, run_job, worker_name
+from llm.services.prompt_store import prompt_store
+from llm.services.usage_ledger import ledger
+
+
+class Command(BaseCommand):
+    help = "Run queued plan generation jobs (PlanJob) with bounded concurrency."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", type=int, default=4, help="Max jobs running at once in this process.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain runnable jobs, then exit.")
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options["concurrency"])
+        worker = worker_name()
+        slots = threading.BoundedSemaphore(concurrency)
+        self.stdout.write(f"Plan job worker {worker} started (concurrency={concurrency})")
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            try:
+                while True:
+                    requeue_stale_jobs()
+                    slots.acquire()
+                    job = claim_next_job(worker)
+                    if job is None:
+                        slots.release()
+                        if options["once"]:
+                            break
+                        time.sleep(options["poll_interval"])
+                        continue
+                    pool.submit(self._run, job, slots)
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping; waiting for running jobs to finish...")
+        ledger.flush()
+        prompt_store.flush_hits()
+
+    def _run(self, job, slots):
+        try:
+            job = run_job(job)
+            self.stdout.write(f"{job} (attempt {job.attempts})")
+        except Exception as e:
+            self.stderr.write(f"⚠️ Job {job.id} crashed: {e}")
+        finally:
+            # Jobs never hit request_finished, so flush usage rows / hit counts from here
+            ledger.flush_if_due()
+            prompt_store.flush_hits_if_due()
+            # Each pool thread has its own DB connection; don't leak them
+            close_old_connections()
+            slots.release()
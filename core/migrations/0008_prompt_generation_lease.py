@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_planjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompt',
+            name='generation_lease_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
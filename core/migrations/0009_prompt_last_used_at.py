@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:23
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_last_used_at(apps, schema_editor):
+    # Existing rows have never been tracked; treat creation as their last use
+    Prompt = apps.get_model("core", "Prompt")
+    Prompt.objects.update(last_used_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_prompt_generation_lease'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompt',
+            name='last_used_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_last_used_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(fields=['type', 'last_used_at'], name='core_prompt_type_edca44_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_prompt_last_used_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prompt',
+            name='response_json',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='prompt',
+            name='schema_version',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_prompt_response_json'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(fields=['user', 'type', '-created_at'], name='core_prompt_user_type_idx'),
+        ),
+    ]
@@ -10,6 +10,10 @@ class Prompt(models.Model):
     hash: deterministic hash of (type + text) to allow quick exact-match cache hits.
     is_refined: whether this prompt has been refined/cleaned by LLM already.
     used_count: how many times this prompt has been used in generation (for analytics).
+    last_used_at: last cache hit (or creation); drives retention/eviction (core/retention.py).
+    response_json: llm_response pre-encoded as JSON, served byte-for-byte on cache hits.
+    schema_version: llm.schema version response_json was validated against (0 = never).
+    generation_lease_until: set while one worker is calling the LLM for this hash (single-flight).
     """
     PROMPT_TYPE_CHOICES = [
         ("goal", "Goal Input"),
@@ -33,10 +37,77 @@ class Prompt(models.Model):
     hash = models.CharField(max_length=128, unique=True, help_text="sha256(or similar) of type+text")
     used_count = models.PositiveIntegerField(default=0)
     is_refined = models.BooleanField(default=False)
+    generation_lease_until = models.DateTimeField(null=True, blank=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+    response_json = models.TextField(null=True, blank=True)
+    schema_version = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["type", "last_used_at"]),
+            # user.prompts.filter(type=...).order_by("-created_at")
+            models.Index(fields=["user", "type", "-created_at"], name="core_prompt_user_type_idx"),
+        ]
 
     def __str__(self):
         return f"Prompt({self.type}, hash={self.hash[:8]})"
+
+
+class PlanJob(models.Model):
+    """
+    DB-backed queue entry for background plan generation.
+    Workers (`manage.py run_plan_jobs`) claim queued jobs with a conditional UPDATE,
+    so no external broker is needed and several worker processes can share the table.
+    At most one active (queued/running) job exists per user, kind and day.
+    """
+    KIND_CHOICES = [
+        ("daily_plan", "Daily Plan"),
+        ("onboarding", "Onboarding"),
+    ]
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+    ]
+    ACTIVE_STATUSES = [STATUS_QUEUED, STATUS_RUNNING]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="plan_jobs"
+    )
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES, default="daily_plan")
+    date = models.DateField(default=timezone.localdate, help_text="Day the job plans for (dedup key)")
+    reschedule = models.BooleanField(default=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Earliest time a worker may pick the job up")
+    locked_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=64, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "run_after"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "kind", "date"],
+                condition=models.Q(status__in=["queued", "running"]),
+                name="unique_active_plan_job",
+            ),
+        ]
+
+    def __str__(self):
+        return f"PlanJob({self.kind}, {self.status}, user={self.user_id}, date={self.date})"
@@ -0,0 +1,101 @@
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # e.g. PyPy; the stdlib path below is used instead
+    orjson = None
+
+# ====================================================================
+# orjson-backed JSON for DRF
+# ====================================================================
+# Drop-in replacements for DRF's JSONRenderer/JSONParser that produce the
+# same bytes (compact separators, UTF-8, U+2028/U+2029 escaped). Anything
+# orjson would write differently falls back to the stock implementation:
+# indented output, non-default JSON settings, values orjson cannot encode
+# (big ints, non-str keys, lone surrogates) and floats below 1e-4, which
+# Python writes with an exponent (1e-07, 5e-05) and orjson as 1e-7 / 0.00005.
+# The parser likewise hands over input orjson reads differently: integers
+# past 64 bits (orjson returns floats), numbers out of double range (1e400
+# is inf for Python, an error for orjson) and anything it rejects, so error
+# messages also stay the stock ones.
+
+_DIGITS = b"0123456789"
+# Digits → "0", so a run of 19+ digits is one find() (a regex search is slower than orjson.loads)
+_ZERO_DIGITS = bytes.maketrans(b"123456789", b"000000000")
+
+
+def _has_long_digit_run(data: bytes) -> bool:
+    return data.translate(_ZERO_DIGITS).find(b"0" * 19) != -1
+
+
+def _has_negative_exponent(ret: bytes) -> bool:
+    # Plain substring scans; a regex over a multi-megabyte body costs more than orjson itself
+    i = ret.find(b"e-")
+    while i != -1:
+        if i > 0 and ret[i - 1] in _DIGITS and ret[i + 2:i + 3] and ret[i + 2] in _DIGITS:
+            return True
+        i = ret.find(b"e-", i + 2)
+    return False
+
+
+def _has_small_fraction(ret: bytes) -> bool:
+    # orjson writes 1e-5 <= |x| < 1e-4 as 0.0000…; Python as 9.9e-05
+    i = ret.find(b"0.0000")
+    while i != -1:
+        if i == 0 or ret[i - 1] not in _DIGITS:
+            return True
+        i = ret.find(b"0.0000", i + 6)
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def _default(self, obj):
+        # datetime/Decimal/lazy strings/... get DRF's encoding
+        return self.encoder_class().default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self._default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except (orjson.JSONEncodeError, TypeError):
+            return super().render(data, accepted_media_type, renderer_context)
+        if _has_negative_exponent(ret) or _has_small_fraction(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        # orjson reads UTF-8 only and always rejects NaN/Infinity (i.e. STRICT_JSON)
+        if orjson is None or not self.strict or encoding.lower().replace("_", "-") not in ("utf-8", "utf8"):
+            return super().parse(stream, media_type, parser_context)
+        data = stream.read()
+        # orjson reads integers past 64 bits as floats; Python keeps them exact
+        if not _has_long_digit_run(data):
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                pass  # invalid JSON, or input Python still accepts (1e400 → inf)
+        return super().parse(BytesIO(data), media_type, parser_context)
@@ -0,0 +1,110 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Prompt
+
+
+def _retention_options() -> dict:
+    """Merge PROMPT_RETENTION settings over the defaults."""
+    options = {
+        # Days since last use after which a prompt row may go; None keeps the type forever
+        "TTL_DAYS": {
+            "summary": 14,
+            "override": 14,
+            "other": 30,
+            "onboarding": 180,
+            "goal": None,
+            "commitment": None,
+        },
+        # Size budget: above this many rows, evict least used / least recently used first
+        "MAX_ROWS": 50_000,
+        "CHUNK_SIZE": 500,
+        "SLEEP_SECONDS": 0.05,
+    }
+    configured = getattr(settings, "PROMPT_RETENTION", {})
+    options.update({k: v for k, v in configured.items() if k != "TTL_DAYS"})
+    options["TTL_DAYS"] = {**options["TTL_DAYS"], **configured.get("TTL_DAYS", {})}
+    return options
+
+
+def protected_prompts() -> Q:
+    """
+    Rows the planners still read: each user's newest prompt per type (the current
+    summary, goal, commitment and override) and anything mid-generation.
+    A filter evaluated in SQL, so it does not grow with the number of users.
+    """
+    latest = Prompt.objects.values("user", "type").annotate(latest_id=Max("id")).values("latest_id")
+    return Q(id__in=latest) | Q(generation_lease_until__gt=timezone.now())
+
+
+def expired_prompts():
+    """Rows past their type's TTL (by last use), newest-per-type rows included."""
+    options = _retention_options()
+    now = timezone.now()
+    expired = Q(pk__in=[])
+    for prompt_type, days in options["TTL_DAYS"].items():
+        if days is not None:
+            expired |= Q(type=prompt_type, last_used_at__lt=now - timedelta(days=days))
+    return Prompt.objects.filter(expired)
+
+
+def eviction_candidates():
+    """Everything, least used first, then least recently used."""
+    return Prompt.objects.order_by("used_count", "last_used_at", "id")
+
+
+def _delete_in_chunks(queryset, limit: int | None, options: dict) -> int:
+    """
+    Delete matching rows a chunk at a time, each chunk in its own short transaction,
+    sleeping between chunks so other writers are not starved (SQLite has one writer).
+    """
+    deleted = 0
+    while limit is None or deleted < limit:
+        size = options["CHUNK_SIZE"] if limit is None else min(options["CHUNK_SIZE"], limit - deleted)
+        ids = list(queryset.exclude(protected_prompts()).values_list("id", flat=True)[:size])
+        if not ids:
+            break
+        with transaction.atomic():
+            count, _ = Prompt.objects.filter(id__in=ids).delete()
+        deleted += count
+        if options["SLEEP_SECONDS"]:
+            time.sleep(options["SLEEP_SECONDS"])
+    return deleted
+
+
+def prune_prompts(dry_run: bool = False, chunk_size: int | None = None) -> dict:
+    """
+    Apply PROMPT_RETENTION: drop rows past their type's TTL, then evict down to MAX_ROWS.
+    Returns {"expired": n, "evicted": n, "remaining": n}; with dry_run nothing is deleted.
+    """
+    options = _retention_options()
+    if chunk_size:
+        options["CHUNK_SIZE"] = chunk_size
+
+    if dry_run:
+        expired = expired_prompts().exclude(protected_prompts()).count()
+        remaining = Prompt.objects.count() - expired
+        evictable = max(0, remaining - Prompt.objects.filter(protected_prompts()).count())
+        evicted = min(evictable, max(0, remaining - options["MAX_ROWS"])) if options["MAX_ROWS"] else 0
+        return {"expired": expired, "evicted": evicted, "remaining": remaining - evicted}
+
+    expired = _delete_in_chunks(expired_prompts(), None, options)
+    evicted = 0
+    overflow = Prompt.objects.count() - options["MAX_ROWS"] if options["MAX_ROWS"] else 0
+    if overflow > 0:
+        evicted = _delete_in_chunks(eviction_candidates(), overflow, options)
+    return {"expired": expired, "evicted": evicted, "remaining": Prompt.objects.count()}
+
+
+def vacuum_sqlite() -> bool:
+    """Give freed pages back to the OS on SQLite. Locks the whole database while it runs."""
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("VACUUM")
+    return True
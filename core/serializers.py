@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Prompt
+from .models import Prompt, PlanJob
 
 class PromptSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,3 +16,23 @@ class PromptSerializer(serializers.ModelSerializer):
             "created_at"
         ]
         read_only_fields = ["id", "llm_response", "used_count", "created_at"]
+
+
+class PlanJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PlanJob
+        fields = [
+            "id",
+            "kind",
+            "date",
+            "reschedule",
+            "status",
+            "attempts",
+            "max_attempts",
+            "result",
+            "error",
+            "created_at",
+            "updated_at",
+            "finished_at",
+        ]
+        read_only_fields = [f for f in fields if f not in ("kind", "reschedule")]
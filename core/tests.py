@@ -1,3 +1,436 @@
-from django.test import TestCase
+import json
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import JsonResponse
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import User
+from llm.models import LLMCall
+from llm.schema import DAILY_PLAN_SCHEMA_VERSION
+from llm.services.prompt_cache import GenerationWaitTimeout
+from llm.services.prompt_store import prompt_store
+from llm.services.resilience import breaker
+from llm.services.usage_ledger import ledger
+from .jobs import claim_next_job, enqueue_plan_job, run_job
+from .models import Prompt, PlanJob
+from .renderers import FastJSONParser, FastJSONRenderer
+from .retention import expired_prompts, protected_prompts, prune_prompts
+
+
+FAKE_BACKEND = {"BACKEND": "llm.backends.fake.FakeBackend", "MODEL": "fake", "OPTIONS": {"STREAM_CHUNK_SIZE": 40}}
+FAILING_BACKEND = {"BACKEND": "llm.backends.fake.FakeBackend", "MODEL": "fake", "OPTIONS": {"ERROR_RATE": 1.0}}
+NO_BACKOFF = {"BACKOFF_BASE_SECONDS": 0}
+
+
+def make_plan(**overrides):
+    plan = {
+        "date": date.today().isoformat(),
+        "day_of_week": date.today().strftime("%A"),
+        "tasks": [
+            {
+                "task_name": "Write report",
+                "description": "Draft the weekly report",
+                "estimated_duration_minutes": 45,
+                "priority": "NOW",
+                "related_goal": "Work",
+                "suggested_time": "9:00 AM",
+                "is_flexible": False,
+            },
+        ],
+        "total_committed_hours": 0.75,
+        "total_available_hours": 8.0,
+        "notes": "",
+        "updated_commitments": [],
+        "updated_goals": [],
+        "user_behaviour_patterns": [],
+    }
+    plan.update(overrides)
+    return plan
+
+
+@override_settings(LLM_BACKEND=FAKE_BACKEND, LLM_RESILIENCE=NO_BACKOFF)
+class DailyPlanViewTests(APITestCase):
+
+    def setUp(self):
+        self.url = reverse("core:daily-plan")
+        self.user = User.objects.create_user(username="planner", email="p@example.com", password="strongpassword123")
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+        breaker.reset()
+        self.addCleanup(breaker.reset)
+        ledger.clear()
+        self.addCleanup(ledger.clear)
+        cache.clear()
+        prompt_store.clear()
+        self.addCleanup(prompt_store.clear)
+
+    def test_daily_plan_requires_auth(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_daily_plan_invalid_token(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer fake_token")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(LLM_BACKEND=FAILING_BACKEND)
+    def test_daily_plan_returns_cached_summary(self):
+        Prompt.objects.create(user=self.user, type="summary", text="t", hash="h1", llm_response=make_plan())
+        response = self.client.get(self.url, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["tasks"][0]["task_name"], "Write report")
+
+    @override_settings(LLM_BACKEND=FAILING_BACKEND)
+    def test_daily_plan_cached_payload_served_as_is(self):
+        payload = json.dumps(make_plan(notes="pre-encoded"))
+        Prompt.objects.create(
+            user=self.user, type="summary", text="t", hash="h1", llm_response=make_plan(),
+            response_json=payload, schema_version=DAILY_PLAN_SCHEMA_VERSION,
+        )
+        with mock.patch("llm.services.plan_payload.DailyPlan.model_validate") as validate:
+            response = self.client.get(self.url, **self.auth)
+        validate.assert_not_called()
+        self.assertEqual(response.content, payload.encode())
+
+    @override_settings(LLM_BACKEND=FAILING_BACKEND)
+    def test_daily_plan_if_none_match_returns_304_without_planner(self):
+        Prompt.objects.create(user=self.user, type="summary", text="t", hash="h1", llm_response=make_plan())
+        etag = self.client.get(self.url, **self.auth)["ETag"]
+        with mock.patch("core.views.agenerate_daily_plan") as planner:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, **self.auth)
+        planner.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    @override_settings(LLM_BACKEND=FAILING_BACKEND)
+    def test_daily_plan_new_summary_changes_etag(self):
+        Prompt.objects.create(user=self.user, type="summary", text="t", hash="h1", llm_response=make_plan())
+        etag = self.client.get(self.url, **self.auth)["ETag"]
+        Prompt.objects.create(user=self.user, type="summary", text="t2", hash="h2", llm_response=make_plan(notes="new"))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["notes"], "new")
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(LLM_BACKEND=FAILING_BACKEND)
+    def test_daily_plan_outdated_schema_revalidated_once(self):
+        prompt = Prompt.objects.create(
+            user=self.user, type="summary", text="t", hash="h1", llm_response=make_plan(),
+            response_json="{}", schema_version=DAILY_PLAN_SCHEMA_VERSION - 1,
+        )
+        response = self.client.get(self.url, **self.auth)
+        self.assertEqual(response.json()["tasks"][0]["task_name"], "Write report")
+        prompt.refresh_from_db()
+        self.assertEqual(prompt.schema_version, DAILY_PLAN_SCHEMA_VERSION)
+        self.assertEqual(prompt.response_json.encode(), response.content)
+
+    def test_daily_plan_generated_and_cached_bodies_match(self):
+        first = self.client.get(self.url, **self.auth)
+        second = self.client.get(self.url, **self.auth)
+        self.assertEqual(first.content, second.content)
+
+    def test_daily_plan_reports_schedule_patch_once(self):
+        first = self.client.get(self.url, **self.auth)
+        self.assertIn("/tasks/", first["X-Plan-Patch"])
+        second = self.client.get(self.url, **self.auth)
+        self.assertNotIn("X-Plan-Patch", second)
+
+    def test_daily_plan_generates_and_persists(self):
+        response = self.client.get(self.url, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()["tasks"]), 5)
+        self.assertTrue(self.user.daily_schedules.filter(date=date.today()).exists())
+        self.assertTrue(Prompt.objects.filter(user=self.user, type="summary", llm_response__isnull=False).exists())
+
+    def test_daily_plan_records_usage(self):
+        self.client.get(self.url, **self.auth)
+        self.client.get(self.url, **self.auth)
+        ledger.flush()
+        calls = LLMCall.objects.filter(user=self.user)
+        self.assertEqual(list(calls.order_by("created_at").values_list("outcome", flat=True)), ["ok", "cache_hit"])
+        first = calls.get(outcome="ok")
+        self.assertEqual((first.prompt_type, first.model), ("summary", "fake"))
+        self.assertGreater(first.output_tokens, 0)
+
+    def test_daily_plan_reschedule_reuses_prompt_without_rendering(self):
+        self.client.get(self.url, {"reschedule": "true"}, **self.auth)
+        with mock.patch("llm.planners.daily_plan.plan_the_day") as render:
+            response = self.client.get(self.url, {"reschedule": "true"}, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        render.assert_not_called()
+        self.assertEqual(Prompt.objects.filter(user=self.user, type="summary").count(), 1)
+
+    def test_daily_plan_stream_pushes_tasks_then_plan(self):
+        response = self.client.get(self.url, {"stream": "true"}, **self.auth)
+        content = b"".join(response).decode()
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(content.count("event: task"), 5)
+        self.assertLess(content.rindex("event: task"), content.index("event: plan"))
+        self.assertTrue(self.user.daily_schedules.filter(date=date.today()).exists())
+
+    def test_daily_plan_single_flight_wait_timeout_returns_504(self):
+        with mock.patch(
+            "llm.planners.daily_plan.aacquire_generation", side_effect=GenerationWaitTimeout("still generating")
+        ):
+            response = self.client.get(self.url, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_504_GATEWAY_TIMEOUT)
+
+    @override_settings(LLM_BACKEND=FAILING_BACKEND)
+    def test_daily_plan_llm_error_returns_502(self):
+        response = self.client.get(self.url, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+        self.assertIn("error", response.json())
+        # The single-flight lease is released so the next request can retry
+        self.assertFalse(Prompt.objects.filter(generation_lease_until__isnull=False).exists())
+
+    @override_settings(LLM_RATE_LIMIT={"USER_REQUESTS_PER_MINUTE": 1, "MAX_WAIT_SECONDS": 0})
+    def test_daily_plan_rate_limited_returns_429(self):
+        self.client.get(self.url, {"reschedule": "true"}, **self.auth)
+        Prompt.objects.create(user=self.user, type="override", text="move my workout to the evening", hash="o1")
+        response = self.client.get(self.url, {"reschedule": "true"}, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", response)
+
+    def test_daily_plan_open_circuit_serves_stale_plan(self):
+        Prompt.objects.create(user=self.user, type="summary", text="t", hash="h1", llm_response=make_plan())
+        Prompt.objects.create(user=self.user, type="override", text="move my workout to the evening", hash="o1")
+        with override_settings(LLM_RESILIENCE={"BREAKER_FAILURE_THRESHOLD": 1}):
+            breaker.record_failure()
+            response = self.client.get(self.url, {"reschedule": "true"}, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Plan-Stale"], "true")
+
+    @override_settings(LLM_BACKEND=FAILING_BACKEND)
+    def test_daily_plan_small_override_rescheduled_locally(self):
+        Prompt.objects.create(user=self.user, type="summary", text="t", hash="h1", llm_response=make_plan())
+        Prompt.objects.create(user=self.user, type="override", text="Add a 20 min walk", hash="o1")
+        response = self.client.get(self.url, {"reschedule": "true"}, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        walk = next(t for t in response.json()["tasks"] if t["task_name"] == "Walk")
+        self.assertEqual(walk["estimated_duration_minutes"], 20)
+        # Plain GETs now return the rescheduled day
+        response = self.client.get(self.url, **self.auth)
+        self.assertIn("Walk", [t["task_name"] for t in response.json()["tasks"]])
+
+    def test_daily_plan_open_circuit_without_cache_returns_503(self):
+        with override_settings(LLM_RESILIENCE={"BREAKER_FAILURE_THRESHOLD": 1}):
+            breaker.record_failure()
+            response = self.client.get(self.url, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn("Retry-After", response)
+
+
+class PlanJobTests(APITestCase):
+
+    def setUp(self):
+        self.create_url = reverse("core:plan-job-create")
+        self.user = User.objects.create_user(username="jobber", email="j@example.com", password="strongpassword123")
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_create_job_queues(self):
+        response = self.client.post(self.create_url, {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["status"], PlanJob.STATUS_QUEUED)
+
+    def test_create_job_deduplicates_per_day(self):
+        first = self.client.post(self.create_url, {}, format="json")
+        second = self.client.post(self.create_url, {"reschedule": True}, format="json")
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data["id"], second.data["id"])
+        self.assertEqual(PlanJob.objects.count(), 1)
+
+    def test_get_job_other_user_not_found(self):
+        other = User.objects.create_user(username="other", email="o@example.com", password="strongpassword123")
+        job, _ = enqueue_plan_job(other)
+        response = self.client.get(reverse("core:plan-job-detail", args=[job.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(LLM_BACKEND=FAKE_BACKEND)
+    def test_run_job_drives_the_async_planners(self):
+        cache.clear()
+        prompt_store.clear()
+        self.addCleanup(prompt_store.clear)
+        self.addCleanup(ledger.clear)
+        for kind in ("onboarding", "daily_plan"):
+            job, _ = enqueue_plan_job(self.user, kind=kind)
+            job = run_job(claim_next_job("test"))
+            self.assertEqual(job.status, PlanJob.STATUS_SUCCEEDED)
+            self.assertTrue(job.result["tasks"])
+        self.assertTrue(self.user.daily_schedules.exists())
+
+    def test_run_job_retries_then_fails(self):
+        job, _ = enqueue_plan_job(self.user)
+        job.max_attempts = 2
+        job.save()
+        with mock.patch("core.jobs.generate_daily_plan", side_effect=Exception("quota")):
+            job = run_job(claim_next_job("test"))
+            self.assertEqual(job.status, PlanJob.STATUS_QUEUED)
+            self.assertGreater(job.run_after, timezone.now())
+            self.assertIsNone(claim_next_job("test"))
+
+            PlanJob.objects.filter(id=job.id).update(run_after=timezone.now())
+            job = run_job(claim_next_job("test"))
+        self.assertEqual(job.status, PlanJob.STATUS_FAILED)
+        self.assertEqual(job.error, "quota")
+
+
+class PlanJobWorkerTests(APITransactionTestCase):
+    # Workers run jobs on pool threads with their own DB connections,
+    # so the queued job must be committed for them to see it.
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="worker", email="w@example.com", password="strongpassword123")
+
+    def test_worker_runs_job(self):
+        job, _ = enqueue_plan_job(self.user)
+        fake = JsonResponse(make_plan())
+        with mock.patch("core.jobs.generate_daily_plan", return_value=fake):
+            call_command("run_plan_jobs", "--once", "--concurrency", "1", stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, PlanJob.STATUS_SUCCEEDED)
+        self.assertEqual(job.result["tasks"][0]["task_name"], "Write report")
+
+
+@override_settings(PROMPT_RETENTION={"SLEEP_SECONDS": 0})
+class PromptRetentionTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="keeper", email="k@example.com", password="strongpassword123")
+        self.old = timezone.now() - timedelta(days=60)
+        cache.clear()
+        prompt_store.clear()
+        self.addCleanup(prompt_store.clear)
+
+    def make_prompt(self, hash_key, prompt_type="summary", last_used_at=None, used_count=0):
+        return Prompt.objects.create(
+            user=self.user, type=prompt_type, text="t", hash=hash_key,
+            used_count=used_count, last_used_at=last_used_at or timezone.now(),
+        )
+
+    def test_prune_expires_old_summaries_but_keeps_latest(self):
+        stale = self.make_prompt("s1", last_used_at=self.old)
+        latest = self.make_prompt("s2", last_used_at=self.old)
+        result = prune_prompts()
+        self.assertEqual(result["expired"], 1)
+        self.assertFalse(Prompt.objects.filter(id=stale.id).exists())
+        self.assertTrue(Prompt.objects.filter(id=latest.id).exists())
+
+    def test_prune_keeps_goal_rows(self):
+        self.make_prompt("g1", prompt_type="goal", last_used_at=self.old)
+        self.make_prompt("g2", prompt_type="goal", last_used_at=self.old)
+        self.assertEqual(prune_prompts()["expired"], 0)
+        self.assertEqual(Prompt.objects.count(), 2)
+
+    def test_prune_evicts_least_used_over_budget(self):
+        cold = self.make_prompt("o1", prompt_type="other", used_count=0)
+        warm = self.make_prompt("o2", prompt_type="other", used_count=5)
+        self.make_prompt("o3", prompt_type="other", used_count=1)
+        with override_settings(PROMPT_RETENTION={"SLEEP_SECONDS": 0, "MAX_ROWS": 2}):
+            result = prune_prompts()
+        self.assertEqual(result["evicted"], 1)
+        self.assertFalse(Prompt.objects.filter(id=cold.id).exists())
+        self.assertTrue(Prompt.objects.filter(id=warm.id).exists())
+
+    def test_prune_dry_run_deletes_nothing(self):
+        self.make_prompt("s1", last_used_at=self.old)
+        self.make_prompt("s2")
+        result = prune_prompts(dry_run=True)
+        self.assertEqual(result["expired"], 1)
+        self.assertEqual(Prompt.objects.count(), 2)
+
+    def test_protection_does_not_bind_a_parameter_per_user(self):
+        def bound_params():
+            return len(expired_prompts().exclude(protected_prompts()).query.sql_with_params()[1])
+
+        self.make_prompt("s0")
+        before = bound_params()
+        for i in range(20):
+            user = User.objects.create_user(username=f"keeper{i}", password="strongpassword123")
+            Prompt.objects.create(user=user, type="summary", text="t", hash=f"u{i}")
+        self.assertEqual(bound_params(), before)
+
+    def test_prune_command_reports_counts(self):
+        self.make_prompt("s1", last_used_at=self.old)
+        self.make_prompt("s2")
+        out = StringIO()
+        call_command("prune_prompts", "--chunk-size", "1", stdout=out)
+        self.assertIn("Removed 1 expired", out.getvalue())
+        self.assertEqual(Prompt.objects.count(), 1)
+
+
+class HotLookupIndexTests(TestCase):
+    # The per-request planner lookups must be index seeks with no sort step.
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="indexed", email="i@example.com", password="strongpassword123")
+
+    def assertIndexSeek(self, queryset):
+        plan = queryset.explain()
+        self.assertIn("USING", plan)
+        self.assertIn("INDEX", plan)
+        self.assertNotIn("SCAN", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_hot_lookups_use_indexes(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("query plan wording is SQLite specific")
+        self.assertIndexSeek(self.user.daily_schedules.filter(date=date.today()))
+        self.assertIndexSeek(self.user.prompts.filter(type="summary").order_by("-created_at")[:1])
+        self.assertIndexSeek(
+            self.user.prompts.filter(type="summary", llm_response__isnull=False).order_by("-created_at")[:1]
+        )
+        self.assertIndexSeek(self.user.goals.order_by("-updated_at")[:1])
+        self.assertIndexSeek(self.user.commitments.order_by("-updated_at")[:1])
+
+    def test_users_can_share_a_schedule_date(self):
+        other = User.objects.create_user(username="indexed2", email="i2@example.com", password="strongpassword123")
+        self.user.daily_schedules.create(date=date.today(), day_of_week="Monday")
+        other.daily_schedules.create(date=date.today(), day_of_week="Monday")
+        self.assertEqual(other.daily_schedules.count(), 1)
+
+
+class FastJSONTests(TestCase):
+
+    def test_renderer_output_matches_drf(self):
+        data = {
+            "name": "Café ☕ — line\u2028break",
+            "when": datetime(2025, 1, 1, 9, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            "price": Decimal("1.50"),
+            "hours": [0.1, 6.5, 1e-07, 5e-05, -9.9e-05, 0.0001, 1e16],
+            "nested": [{"id": 1, "done": True, "rating": None}],
+            "big": 2 ** 70,
+        }
+        for sample in (data, {"hours": [0.25, 9.75]}, [], "plain"):
+            self.assertEqual(FastJSONRenderer().render(sample), JSONRenderer().render(sample))
+        self.assertEqual(
+            FastJSONRenderer().render(data, "application/json; indent=2"),
+            JSONRenderer().render(data, "application/json; indent=2"),
+        )
+
+    def test_parser_reads_utf8_and_rejects_bad_json(self):
+        self.assertEqual(FastJSONParser().parse(BytesIO('{"a": "é"}'.encode())), {"a": "é"})
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b"{nope"))
+
+    def test_parser_accepts_what_drf_accepts(self):
+        for body in (b'{"big": 1180591620717411303424}', b'[-9223372036854775809, 1e400, 0.5]', b'"\\ud800"'):
+            self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+
+    def test_command_reports_identical_output(self):
+        out = StringIO()
+        call_command("benchmark_json", "--schedules", "20", "--repeat", "1", stdout=out)
+        self.assertIn("output identical", out.getvalue())
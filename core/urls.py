@@ -1,6 +1,6 @@
 from django.urls import path
 
-from .views import PromptCreateView, OnboardUserView, DailyPlanView
+from .views import PromptCreateView, OnboardUserView, DailyPlanView, PlanJobCreateView, PlanJobDetailView
 
 app_name = "core"
 
@@ -9,4 +9,6 @@ urlpatterns = [
 
     path("onboard/", OnboardUserView.as_view(), name="onboard-user"),
     path("daily-plan/", DailyPlanView.as_view(), name="daily-plan"),
+    path("daily-plan/jobs/", PlanJobCreateView.as_view(), name="plan-job-create"),
+    path("daily-plan/jobs/<int:pk>/", PlanJobDetailView.as_view(), name="plan-job-detail"),
 ]
@@ -1,13 +1,27 @@
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import generics, status, permissions
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from llm.planners.daily_plan import generate_daily_plan
-from .models import Prompt
-from .serializers import PromptSerializer
-from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
-from llm.planners.onboarding import generate_onboarding_plan
+from llm.planners.daily_plan import acurrent_plan_etag, agenerate_daily_plan, astream_daily_plan
+from .conditional import not_modified
+from .jobs import enqueue_plan_job
+from .models import Prompt, PlanJob
+from .serializers import PromptSerializer, PlanJobSerializer
+from llm.planners.onboarding import agenerate_onboarding_plan
+from llm.backends import CircuitOpenError, LLMError, LLMTimeout
+from llm.services.rate_limiter import RateLimitExceeded
+from llm.services.prompt_cache import lookup_prompt
+from llm.services.prompt_store import prompt_store
 import hashlib
+import json
 
 
 class PromptCreateView(generics.ListCreateAPIView):
@@ -37,11 +51,10 @@ class PromptCreateView(generics.ListCreateAPIView):
         data["hash"] = hash_key
         data["user"] = request.user.id
 
-        # Check cache for *this user*
-        cached_prompt = Prompt.objects.filter(user=request.user, hash=hash_key).first()
+        # Check cache for *this user* (in-process → shared cache → DB; hit count is batched)
+        cached_prompt = lookup_prompt(hash_key, user=request.user)
         if cached_prompt:
-            cached_prompt.used_count += 1
-            cached_prompt.save()
+            prompt_store.record_hit(cached_prompt)
             serializer = self.get_serializer(cached_prompt)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -51,33 +64,157 @@ class PromptCreateView(generics.ListCreateAPIView):
         self.perform_create(serializer)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-class OnboardUserView(APIView):
-    permission_classes = [IsAuthenticated]
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of DRF's APIView for long-running LLM endpoints.
+    Authenticates with the configured DRF authentication classes (JWT) and
+    requires an authenticated user; handlers are async and return JsonResponse.
+    """
+
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    def _authenticate(self, request):
+        drf_request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        return drf_request.user
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user = await sync_to_async(self._authenticate)(request)
+        except APIException as e:
+            return JsonResponse({"detail": e.detail}, status=e.status_code)
+
+        if not user or not user.is_authenticated:
+            response = JsonResponse(
+                {"detail": "Authentication credentials were not provided."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+            response["WWW-Authenticate"] = 'Bearer realm="api"'
+            return response
 
-    def get(self, request):
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+
+def _llm_error_response(e: RateLimitExceeded | LLMError) -> JsonResponse:
+    """Map model-call failures to gateway-style statuses instead of a blanket 500."""
+    if isinstance(e, RateLimitExceeded):
+        code = status.HTTP_429_TOO_MANY_REQUESTS
+    elif isinstance(e, CircuitOpenError):
+        code = status.HTTP_503_SERVICE_UNAVAILABLE
+    elif isinstance(e, LLMTimeout):
+        code = status.HTTP_504_GATEWAY_TIMEOUT
+    else:
+        code = status.HTTP_502_BAD_GATEWAY
+    response = JsonResponse({"error": str(e)}, status=code)
+    if getattr(e, "retry_after", None):
+        response["Retry-After"] = str(e.retry_after)
+    return response
+
+
+class OnboardUserView(AsyncAPIView):
+
+    async def get(self, request):
         """
         Onboard the authenticated user and generate their initial daily plan.
         """
         try:
-            plan = generate_onboarding_plan(request.user)
-            return Response(plan.model_dump(), status=status.HTTP_200_OK)
+            plan = await agenerate_onboarding_plan(request.user)
+            return JsonResponse(plan.model_dump(), status=status.HTTP_200_OK)
+        except (RateLimitExceeded, LLMError) as e:
+            return _llm_error_response(e)
         except Exception as e:
-            return Response(
+            return JsonResponse(
                 {"error": str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class DailyPlanView(APIView):
-    permission_classes = [IsAuthenticated]
 
-    def get(self, request):
+def _sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+class DailyPlanView(AsyncAPIView):
+
+    async def get(self, request):
         """
         Generate and return the daily plan for the authenticated user.
+        With ?stream=true, tasks are pushed as SSE `task` events while the model
+        is still generating, followed by one `plan` event with the saved plan.
+        Streaming needs the ASGI entry point (jing.asgi); WSGI buffers the whole
+        async response, so there the events arrive together at the end.
+        When saving changed the stored schedule, the diff is sent as JSON-patch-style
+        ops in the X-Plan-Patch header (or a `patch` event when streaming).
+        Cached plans carry a strong ETag; a matching If-None-Match gets a 304
+        without running the planner.
         """
+        reschedule = request.GET.get("reschedule", "false").lower() == "true"
+        if request.GET.get("stream", "false").lower() == "true":
+            return self.stream(request.user, reschedule)
+
+        # 🔹 Client already has the current plan → 304 from one lookup
+        if not reschedule and "HTTP_IF_NONE_MATCH" in request.META:
+            etag = await acurrent_plan_etag(request.user)
+            response = not_modified(request, etag=etag) if etag else None
+            if response is not None:
+                return response
+
         try:
-            reschedule = request.query_params.get("reschedule", "false").lower() == "true"
-            plan = generate_daily_plan(request.user, reschedule=reschedule)
+            plan = await agenerate_daily_plan(request.user, reschedule=reschedule)
             return plan
+        except (RateLimitExceeded, LLMError) as e:
+            return _llm_error_response(e)
         except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
\ No newline at end of file
+            return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def stream(self, user, reschedule: bool) -> StreamingHttpResponse:
+        async def events():
+            try:
+                async for event, data in astream_daily_plan(user, reschedule=reschedule):
+                    yield _sse_event(event, data)
+            except (RateLimitExceeded, CircuitOpenError) as e:
+                yield _sse_event("error", {"error": str(e), "retry_after": e.retry_after})
+            except Exception as e:
+                yield _sse_event("error", {"error": str(e)})
+
+        response = StreamingHttpResponse(events(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # disable proxy buffering (nginx)
+        return response
+
+
+class PlanJobCreateView(generics.CreateAPIView):
+    """
+    POST: Queue background generation of today's plan (or onboarding plan).
+    Returns 202 with the new job, or 200 with the already-active job for the same day.
+    """
+
+    serializer_class = PlanJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job, created = enqueue_plan_job(
+            request.user,
+            kind=serializer.validated_data.get("kind", "daily_plan"),
+            reschedule=serializer.validated_data.get("reschedule", False),
+        )
+        return Response(
+            self.get_serializer(job).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK,
+        )
+
+
+class PlanJobDetailView(generics.RetrieveAPIView):
+    """GET: Poll the status (and result, once finished) of one of the user's plan jobs."""
+
+    serializer_class = PlanJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return PlanJob.objects.filter(user=self.request.user)
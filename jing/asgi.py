@@ -3,6 +3,14 @@ ASGI config for jing project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The planning endpoints (core.views.DailyPlanView / OnboardUserView) are async,
+so serving them through this entry point (e.g. ``uvicorn jing.asgi:application``)
+lets one worker hold many in-flight Gemini calls at once. It is also required
+for ?stream=true: WSGI buffers async streaming responses until they finish.
+
+Lifespan events (sent by uvicorn and most ASGI servers) give the worker's loop
+its own pooled async Gemini client at startup and close it at shutdown.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +21,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jing.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from llm.services.gemini_client import aclose_gemini_clients, serve_on_running_loop  # noqa: E402  (needs apps loaded)
+
+
+async def application(scope, receive, send):
+    if scope["type"] != "lifespan":
+        return await django_application(scope, receive, send)
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            serve_on_running_loop()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aclose_gemini_clients()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
@@ -78,6 +78,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # orjson-backed, byte-identical to DRF's JSON classes (see core/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 TEMPLATES = [
@@ -149,3 +159,154 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Gemini client pool (see llm/services/gemini_client.py)
+# TIMEOUT is in seconds, capped at LLM_RESILIENCE['TIMEOUT_SECONDS'] (None = that deadline);
+# POOL_SIZE caps concurrent connections per process.
+
+GEMINI_CLIENT = {
+    'POOL_SIZE': 10,
+    'KEEPALIVE_CONNECTIONS': 10,
+    'KEEPALIVE_EXPIRY': 30.0,
+    'TIMEOUT': None,
+}
+
+# Background plan jobs (see core/jobs.py and `manage.py run_plan_jobs`)
+
+PLAN_JOBS = {
+    'MAX_ATTEMPTS': 3,
+    'RETRY_BACKOFF_SECONDS': 30,
+    'LEASE_SECONDS': 600,
+}
+
+# Single-flight LLM calls per prompt hash (see llm/services/prompt_cache.py)
+
+PROMPT_SINGLE_FLIGHT = {
+    # None = derived from LLM_RESILIENCE/LLM_RATE_LIMIT (worst-case generation time + margin)
+    'LEASE_SECONDS': None,
+    'WAIT_SECONDS': None,
+    'POLL_INTERVAL': 0.25,
+}
+
+# LLM backend used by the planners (see llm/backends/).
+# For load testing without quota or network, switch to the deterministic fake:
+#   'BACKEND': 'llm.backends.fake.FakeBackend',
+#   'OPTIONS': {'LATENCY_MS': 800, 'LATENCY_SIGMA': 0.5, 'ERROR_RATE': 0.01},
+
+LLM_BACKEND = {
+    'BACKEND': 'llm.backends.gemini.GeminiBackend',
+    'MODEL': 'gemini-2.5-flash',
+    'OPTIONS': {},
+}
+
+# Outbound LLM rate limits, shared by all workers (see llm/services/rate_limiter.py).
+# Set a limit to 0 to disable that bucket.
+
+LLM_RATE_LIMIT = {
+    'REQUESTS_PER_MINUTE': 60,
+    'TOKENS_PER_MINUTE': 250000,
+    'USER_REQUESTS_PER_MINUTE': 6,
+    'EST_OUTPUT_TOKENS': 2000,
+    'MAX_WAIT_SECONDS': 10,
+    'MAX_WAITERS': 50,
+}
+
+# Deadlines, retries, hedging and circuit breaker around model calls
+# (see llm/services/resilience.py; state is exposed at /api/llm/status/).
+
+LLM_RESILIENCE = {
+    'TIMEOUT_SECONDS': 30,
+    'MAX_RETRIES': 2,
+    'BACKOFF_BASE_SECONDS': 0.5,
+    'BACKOFF_MAX_SECONDS': 8,
+    'HEDGE': False,
+    'HEDGE_MIN_SECONDS': 2.0,
+    'HEDGE_PERCENTILE': 0.95,
+    'BREAKER_FAILURE_THRESHOLD': 5,
+    'BREAKER_RESET_SECONDS': 30,
+}
+
+# Per-call usage ledger (see llm/services/usage_ledger.py and the LLM Calls admin).
+# Rows are buffered in memory and written in batches after the response is sent.
+# PRICES are USD per million tokens.
+
+LLM_USAGE_LEDGER = {
+    'ENABLED': True,
+    'BATCH_SIZE': 50,
+    'FLUSH_SECONDS': 5,
+    'MAX_BUFFER': 5000,
+    'PRICES': {
+        'gemini-2.5-flash': {'input': 0.30, 'output': 2.50},
+    },
+}
+
+# Behavioural pattern context for the planner prompt (see llm/services/pattern_context.py).
+# Keeps the WINDOW most recent patterns plus a digest of the DIGEST_ITEMS most recurring ones.
+
+USER_PATTERNS = {
+    'WINDOW': 20,
+    'DIGEST_ITEMS': 10,
+    'COMPACT_SLACK': 10,
+    'SIMILARITY': 0.8,
+    'MAX_CHARS': 2000,
+}
+
+# Local slot-filling for small ?reschedule=true overrides (see llm/services/local_scheduler.py).
+# Overrides the parser cannot handle still go to the model.
+
+LOCAL_SCHEDULER = {
+    'DAY_START': '08:00',
+    'DAY_END': '22:00',
+    'BUFFER_MINUTES': 10,
+    'DEFAULT_DURATION_MINUTES': 30,
+    'MAX_OVERRIDE_TASKS': 5,
+}
+
+# Read-through prompt cache in front of core.Prompt (see llm/services/prompt_store.py):
+# in-process LRU → Django cache CACHE_ALIAS → database. Point CACHE_ALIAS at a shared
+# backend (Redis/Memcached) in production so invalidation reaches every worker; on the
+# default local-memory cache L2 entries are kept no longer than L1_TTL_SECONDS.
+
+PROMPT_CACHE = {
+    'CACHE_ALIAS': 'default',
+    'L1_MAX_ENTRIES': 1024,
+    'L1_TTL_SECONDS': 30,
+    'L2_TTL_SECONDS': 3600,
+    'GENERATION_CHECK_SECONDS': 1.0,
+    'HIT_FLUSH_SIZE': 100,
+    'HIT_FLUSH_SECONDS': 5,
+}
+
+# core.Prompt retention, applied by `manage.py prune_prompts` (see core/retention.py).
+# TTL_DAYS counts from last use; None keeps a type forever. Above MAX_ROWS the least
+# used rows are evicted. Each user's newest prompt per type is always kept.
+
+PROMPT_RETENTION = {
+    'TTL_DAYS': {
+        'summary': 14,
+        'override': 14,
+        'other': 30,
+        'onboarding': 180,
+        'goal': None,
+        'commitment': None,
+    },
+    'MAX_ROWS': 50000,
+    'CHUNK_SIZE': 500,
+    'SLEEP_SECONDS': 0.05,
+}
+
+# Delta sync at /api/llm/sync/?since=<cursor> (see llm/services/change_log.py).
+# At most MAX_CHANGES log rows are returned per call; clients follow has_more.
+
+CHANGE_SYNC = {
+    'MAX_CHANGES': 500,
+}
+
+# Long-term completion/rating trends in the daily plan prompt (see llm/services/feedback_rollup.py).
+# Up to MAX_ROWS rollups with at least MIN_TASKS tasks, counting only schedules before the day being
+# planned; `manage.py rebuild_feedback_rollups` backfills.
+
+FEEDBACK_TRENDS = {
+    'MIN_TASKS': 3,
+    'MAX_ROWS': 12,
+}
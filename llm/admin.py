@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.core.exceptions import ValidationError
-from .models import DailySchedule, Task
+from django.db import transaction
+from .models import ChangeLog, DailySchedule, LLMCall, Task
+from .services.change_log import record_changes
+from .services.feedback_rollup import record_feedback_changes
+from .services.usage_ledger import usage_by_user_day
 
 
 # ==========================================================
@@ -15,6 +19,13 @@ class DailyScheduleAdmin(admin.ModelAdmin):
     filter_horizontal = ("tasks",)
     readonly_fields = ("created_at", "updated_at")
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("user").with_task_counts()
+
+    @admin.display(description="Total tasks", ordering="task_count")
+    def total_tasks(self, obj):
+        return obj.total_tasks
+
 
 # ==========================================================
 # Task Admin
@@ -37,21 +48,74 @@ class TaskAdmin(admin.ModelAdmin):
     # -------------------------------
     # Custom display methods
     # -------------------------------
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related("daily_schedules")
+
     def schedule_dates(self, obj):
         """Show all schedule dates this task belongs to."""
-        schedules = obj.daily_schedules.all().values_list("date", flat=True)
+        schedules = [schedule.date for schedule in obj.daily_schedules.all()]
         return ", ".join(str(d) for d in schedules) if schedules else "—"
     schedule_dates.short_description = "Schedule Dates"
 
     # -------------------------------
     # Custom admin actions
     # -------------------------------
+    def _set_completed(self, queryset, completed: bool) -> int:
+        # queryset.update() skips Task.save(), so do its bookkeeping here for the whole batch
+        with transaction.atomic():
+            index = Task.FEEDBACK_STATE_FIELDS.index("completed")
+            before = list(queryset.values_list(*Task.FEEDBACK_STATE_FIELDS))
+            updated = queryset.update(completed=completed)
+            DailySchedule.objects.filter(tasks__in=queryset).touch()
+            record_changes(ChangeLog.KIND_TASK, queryset.values_list("user_id", "id"))
+            record_feedback_changes((state, state[:index] + (completed,) + state[index + 1:]) for state in before)
+        return updated
+
     def mark_as_completed(self, request, queryset):
-        updated = queryset.update(completed=True)
+        updated = self._set_completed(queryset, True)
         self.message_user(request, f"{updated} task(s) marked as completed.")
     mark_as_completed.short_description = "✅ Mark selected tasks as completed"
 
     def mark_as_incomplete(self, request, queryset):
-        updated = queryset.update(completed=False)
+        updated = self._set_completed(queryset, False)
         self.message_user(request, f"{updated} task(s) marked as incomplete.")
     mark_as_incomplete.short_description = "❌ Mark selected tasks as incomplete"
+
+
+# ==========================================================
+# LLM Usage Ledger Admin
+# ==========================================================
+@admin.register(LLMCall)
+class LLMCallAdmin(admin.ModelAdmin):
+    list_display = (
+        "created_at",
+        "user",
+        "prompt_type",
+        "model",
+        "outcome",
+        "input_tokens",
+        "output_tokens",
+        "latency_ms",
+        "cost_usd",
+    )
+    list_filter = ("prompt_type", "outcome", "model", "cache_hit")
+    search_fields = ("user__email", "user__username")
+    date_hierarchy = "created_at"
+    list_select_related = ("user",)
+    change_list_template = "admin/llm/llmcall/change_list.html"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        """Show a per user / per day rollup of the filtered rows above the list (latest 200 user-days)."""
+        response = super().changelist_view(request, extra_context=extra_context)
+        try:
+            queryset = response.context_data["cl"].queryset
+        except (AttributeError, KeyError):
+            return response  # redirects / error pages have no changelist
+        response.context_data["daily_usage"] = list(usage_by_user_day(queryset=queryset.order_by())[:200])
+        return response
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LlmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'llm'
+
+    def ready(self):
+        # Connects the change-log signals behind /api/llm/sync/ and the feedback rollup delete hook
+        from .services import change_log, feedback_rollup  # noqa: F401
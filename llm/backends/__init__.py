@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .base import (
+    LLMBackend, LLMResponse,
+    LLMError, InvalidLLMResponse, LLMTimeout, CircuitOpenError,
+)
+
+_backend: LLMBackend | None = None
+
+
+def get_llm_backend() -> LLMBackend:
+    """Return the process-wide backend configured by settings.LLM_BACKEND."""
+    global _backend
+    if _backend is None:
+        config = {
+            "BACKEND": "llm.backends.gemini.GeminiBackend",
+            "MODEL": "gemini-2.5-flash",
+            "OPTIONS": {},
+        }
+        config.update(getattr(settings, "LLM_BACKEND", {}))
+        backend_cls = import_string(config["BACKEND"])
+        _backend = backend_cls(config["MODEL"], **config["OPTIONS"])
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting == "LLM_BACKEND":
+        _backend = None
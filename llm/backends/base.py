@@ -0,0 +1,54 @@
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+from pydantic import BaseModel
+
+
+class LLMError(Exception):
+    """Raised by backends when the model call itself fails."""
+
+
+class InvalidLLMResponse(LLMError):
+    """The model answered, but not with JSON matching the requested schema."""
+
+
+class LLMTimeout(LLMError):
+    """The model did not answer within the per-call deadline."""
+
+
+class CircuitOpenError(LLMError):
+    """Calls are short-circuited because the provider looks degraded."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f"LLM provider unavailable, retry after {self.retry_after}s")
+
+
+@dataclass
+class LLMResponse:
+    text: str
+    model: str
+    input_tokens: int | None = None
+    output_tokens: int | None = None
+
+
+class LLMBackend:
+    """
+    Interface every planner goes through to reach a model.
+    `schema` is the Pydantic model the response JSON must follow (e.g. DailyPlan).
+    """
+
+    def __init__(self, model: str, **options):
+        self.model = model
+        self.options = options
+
+    def generate(self, prompt: str, schema: type[BaseModel]) -> LLMResponse:
+        raise NotImplementedError
+
+    async def agenerate(self, prompt: str, schema: type[BaseModel]) -> LLMResponse:
+        raise NotImplementedError
+
+    async def astream(self, prompt: str, schema: type[BaseModel]) -> AsyncIterator[str]:
+        """Yield the response JSON as text chunks as the model produces them."""
+        raise NotImplementedError
+        yield  # pragma: no cover
@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import random
+import time
+from datetime import datetime
+
+from llm.schema import DailyPlan, DailyTask
+from .base import LLMBackend, LLMError, LLMResponse
+
+TASK_NAMES = [
+    "Deep work block", "Reply to messages", "Walk outside", "Review notes",
+    "Plan tomorrow", "Tidy workspace", "Read a chapter", "Stretch break",
+    "Prepare meals", "Practice exercises",
+]
+PRIORITIES = ["NOW", "LATER", "DELEGATE", "REMOVE"]
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic local stand-in for load testing; never touches the network.
+
+    The plan content is seeded from the prompt text, so identical prompts give
+    identical plans. Latency and failures are drawn from a per-backend RNG:
+    - LATENCY_MS / LATENCY_SIGMA: lognormal latency (median ms, shape; 0 = fixed)
+    - ERROR_RATE: probability of raising LLMError
+    - INVALID_JSON_RATE: probability of returning truncated JSON
+    - TASKS: number of tasks per plan
+    - SEED: seed for the latency/error RNG
+    - STREAM_CHUNK_SIZE: characters per streamed chunk
+    """
+
+    def __init__(self, model: str, **options):
+        super().__init__(model, **options)
+        self.latency_ms = options.get("LATENCY_MS", 0)
+        self.latency_sigma = options.get("LATENCY_SIGMA", 0.0)
+        self.error_rate = options.get("ERROR_RATE", 0.0)
+        self.invalid_json_rate = options.get("INVALID_JSON_RATE", 0.0)
+        self.tasks = options.get("TASKS", 5)
+        self.chunk_size = options.get("STREAM_CHUNK_SIZE", 64)
+        self._rng = random.Random(options.get("SEED", 0))
+
+    def _latency(self) -> float:
+        if not self.latency_ms:
+            return 0.0
+        if not self.latency_sigma:
+            return self.latency_ms / 1000
+        return self._rng.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000
+
+    def _plan(self, prompt: str) -> DailyPlan:
+        seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        rng = random.Random(seed)
+        today = datetime.now()
+        tasks = [
+            DailyTask(
+                task_name=f"{rng.choice(TASK_NAMES)} #{i + 1}",
+                description="Generated by the fake LLM backend.",
+                estimated_duration_minutes=rng.choice([15, 30, 45, 60, 90]),
+                priority=rng.choice(PRIORITIES),
+                related_goal=None,
+                suggested_time=f"{rng.randint(8, 20):02d}:{rng.choice(['00', '30'])}" if rng.random() < 0.5 else None,
+                is_flexible=rng.random() < 0.7,
+            )
+            for i in range(self.tasks)
+        ]
+        committed = sum(t.estimated_duration_minutes for t in tasks) / 60
+        return DailyPlan(
+            date=today.date().isoformat(),
+            day_of_week=today.strftime("%A"),
+            tasks=tasks,
+            total_committed_hours=round(committed, 2),
+            total_available_hours=round(24 - today.hour - today.minute / 60, 1),
+            notes="Fake plan for load testing.",
+            updated_goals=["NOW: Example goal"],
+            updated_commitments=[],
+            user_behaviour_patterns=["Prefers short focus blocks"],
+        )
+
+    def _respond(self, prompt: str, schema) -> LLMResponse:
+        if schema is not DailyPlan:
+            raise NotImplementedError(f"FakeBackend only produces DailyPlan, not {schema.__name__}")
+        if self._rng.random() < self.error_rate:
+            raise LLMError("Fake backend injected error")
+        text = self._plan(prompt).model_dump_json()
+        if self._rng.random() < self.invalid_json_rate:
+            text = text[: len(text) // 2]
+        return LLMResponse(
+            text=text,
+            model=self.model,
+            input_tokens=len(prompt) // 4,
+            output_tokens=len(text) // 4,
+        )
+
+    def generate(self, prompt, schema):
+        time.sleep(self._latency())
+        return self._respond(prompt, schema)
+
+    async def agenerate(self, prompt, schema):
+        await asyncio.sleep(self._latency())
+        return self._respond(prompt, schema)
+
+    async def astream(self, prompt, schema):
+        latency = self._latency()
+        text = self._respond(prompt, schema).text
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            yield chunk
@@ -0,0 +1,73 @@
+from asgiref.sync import sync_to_async
+from google.genai import types
+
+from llm.services.gemini_client import get_gemini_client, get_async_gemini_client, has_async_client
+from .base import LLMBackend, LLMResponse
+
+_STREAM_END = object()
+
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini via the shared, pooled genai clients.
+    Async calls use the async pool on a long-lived (ASGI) loop, else the sync pool in a thread.
+    """
+
+    def _config(self, schema) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=schema,
+        )
+
+    def _to_response(self, response) -> LLMResponse:
+        usage = response.usage_metadata
+        return LLMResponse(
+            text=response.text,
+            model=self.model,
+            input_tokens=usage.prompt_token_count if usage else None,
+            output_tokens=usage.candidates_token_count if usage else None,
+        )
+
+    def generate(self, prompt, schema):
+        response = get_gemini_client().models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self._config(schema),
+        )
+        return self._to_response(response)
+
+    async def agenerate(self, prompt, schema):
+        if not has_async_client():
+            return await sync_to_async(self.generate, thread_sensitive=False)(prompt, schema)
+        response = await get_async_gemini_client().models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self._config(schema),
+        )
+        return self._to_response(response)
+
+    async def astream(self, prompt, schema):
+        if not has_async_client():
+            chunks = await sync_to_async(self._sync_stream, thread_sensitive=False)(prompt, schema)
+            next_chunk = sync_to_async(next, thread_sensitive=False)
+            while True:
+                text = await next_chunk(chunks, _STREAM_END)
+                if text is _STREAM_END:
+                    return
+                yield text
+        stream = await get_async_gemini_client().models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+            config=self._config(schema),
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+    def _sync_stream(self, prompt, schema):
+        stream = get_gemini_client().models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+            config=self._config(schema),
+        )
+        return (chunk.text for chunk in stream if chunk.text)
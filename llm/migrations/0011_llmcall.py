@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm', '0010_ratelimitbucket'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prompt_type', models.CharField(max_length=32)),
+                ('model', models.CharField(blank=True, max_length=64)),
+                ('outcome', models.CharField(choices=[('ok', 'OK'), ('cache_hit', 'Cache hit'), ('invalid', 'Invalid response'), ('timeout', 'Timeout'), ('error', 'Error'), ('rate_limited', 'Rate limited'), ('short_circuit', 'Short-circuited')], max_length=16)),
+                ('cache_hit', models.BooleanField(default=False)),
+                ('input_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('output_tokens', models.PositiveIntegerField(blank=True, null=True)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+                ('cost_usd', models.FloatField(default=0.0)),
+                ('created_at', models.DateTimeField()),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='llm_calls', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'LLM Call',
+                'verbose_name_plural': 'LLM Calls',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='llm_llmcall_created_96d408_idx'), models.Index(fields=['user', 'created_at'], name='llm_llmcall_user_id_2f9820_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm', '0011_llmcall'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyschedule',
+            name='plan_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+FIELDS = [
+    "task_name", "description", "estimated_duration_minutes", "priority", "related_goal",
+    "suggested_time", "is_flexible", "completed", "feedback", "rating",
+]
+
+
+def assign_task_owners(apps, schema_editor):
+    # Tasks used to be looked up globally by name, so one row can sit in several
+    # users' schedules. Give each task to the first user and copy it for the rest.
+    Task = apps.get_model("llm", "Task")
+    Through = apps.get_model("llm", "DailySchedule").tasks.through
+
+    links = {}
+    for link in Through.objects.select_related("dailyschedule").order_by("id"):
+        links.setdefault(link.task_id, []).append(link)
+
+    for task in Task.objects.filter(id__in=links):
+        owners = {}
+        for link in links[task.id]:
+            owners.setdefault(link.dailyschedule.user_id, []).append(link)
+        first_owner, *other_owners = owners
+        task.user_id = first_owner
+        task.save(update_fields=["user"])
+        for owner in other_owners:
+            copy = Task.objects.create(user_id=owner, **{field: getattr(task, field) for field in FIELDS})
+            Through.objects.filter(id__in=[link.id for link in owners[owner]]).update(task=copy)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm', '0012_dailyschedule_plan_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tasks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(assign_task_owners, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:32
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_schedules(apps, schema_editor):
+    # Date was globally unique, so duplicates should not exist; databases where
+    # that constraint was missing keep the most recently updated schedule and
+    # move the other schedules' tasks onto it.
+    DailySchedule = apps.get_model("llm", "DailySchedule")
+    Through = DailySchedule.tasks.through
+
+    duplicates = (
+        DailySchedule.objects.filter(user__isnull=False)
+        .values("user", "date")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        schedules = list(
+            DailySchedule.objects.filter(user=row["user"], date=row["date"]).order_by("-updated_at", "-id")
+        )
+        keeper, others = schedules[0], schedules[1:]
+        linked = set(Through.objects.filter(dailyschedule=keeper).values_list("task_id", flat=True))
+        for link in Through.objects.filter(dailyschedule__in=others):
+            if link.task_id not in linked:
+                Through.objects.create(dailyschedule=keeper, task_id=link.task_id)
+                linked.add(link.task_id)
+        DailySchedule.objects.filter(id__in=[s.id for s in others]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm', '0013_task_user'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailyschedule',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.RunPython(merge_duplicate_schedules, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyschedule',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='llm_schedule_user_date_uniq'),
+        ),
+    ]
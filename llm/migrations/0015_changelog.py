@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_change_log(apps, schema_editor):
+    # Log every existing owned object once, so a sync from cursor 0 returns the full state
+    ChangeLog = apps.get_model("llm", "ChangeLog")
+    sources = [
+        ("goal", apps.get_model("users", "Goal").objects.all()),
+        ("schedule", apps.get_model("llm", "DailySchedule").objects.filter(user__isnull=False)),
+        ("task", apps.get_model("llm", "Task").objects.filter(user__isnull=False)),
+    ]
+    for kind, queryset in sources:
+        batch = []
+        for user_id, object_id in queryset.order_by("id").values_list("user_id", "id").iterator(chunk_size=2000):
+            batch.append(ChangeLog(user_id=user_id, kind=kind, object_id=object_id))
+            if len(batch) == 500:
+                ChangeLog.objects.bulk_create(batch)
+                batch = []
+        ChangeLog.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm', '0014_dailyschedule_per_user_date'),
+        ('users', '0005_goal_commitment_user_updated_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('task', 'Task'), ('schedule', 'Schedule'), ('goal', 'Goal')], max_length=16)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='llm_changelog_user_seq_idx'), models.Index(fields=['user', 'kind', 'object_id'], name='llm_changelog_object_idx')],
+            },
+        ),
+        migrations.RunPython(seed_change_log, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
+from datetime import time
+
 from django.db import models
+from django.utils import timezone
 from pydantic import ValidationError
 
 # ======================================================
@@ -13,6 +16,14 @@ class Task(models.Model):
         ("REMOVE", "REMOVE"),
     ]
 
+    # Owner; tasks are never shared between users' schedules
+    user = models.ForeignKey(
+        "users.User",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="tasks",
+    )
     task_name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     estimated_duration_minutes = models.PositiveIntegerField(default=0)
@@ -26,10 +37,47 @@ class Task(models.Model):
         choices=RATING_CHOICES, blank=True, null=True
     )
 
+    # What llm.FeedbackRollup counts a task under (see llm/services/feedback_rollup.py)
+    FEEDBACK_STATE_FIELDS = ("user_id", "related_goal", "suggested_time", "priority", "completed", "rating")
+
     class Meta:
         ordering = ["-priority", "estimated_duration_minutes"]
         verbose_name = "Task"
         verbose_name_plural = "Tasks"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not instance.get_deferred_fields() & set(cls.FEEDBACK_STATE_FIELDS):
+            instance._loaded_feedback_state = instance.feedback_state()
+        return instance
+
+    def feedback_state(self) -> tuple:
+        return tuple(getattr(self, field) for field in self.FEEDBACK_STATE_FIELDS)
+
+    def stored_feedback_state(self) -> tuple | None:
+        """Feedback state as last loaded/saved; read from the database if unknown."""
+        state = getattr(self, "_loaded_feedback_state", None)
+        if state is None and self.pk is not None:
+            state = Task.objects.filter(pk=self.pk).values_list(*self.FEEDBACK_STATE_FIELDS).first()
+        return state
+
+    def save(self, *args, **kwargs):
+        from llm.services.feedback_rollup import record_feedback_changes  # the service imports these models
+
+        adding = self._state.adding
+        before = None if adding else self.stored_feedback_state()
+        super().save(*args, **kwargs)
+        self._loaded_feedback_state = self.feedback_state()
+        record_feedback_changes([(before, self._loaded_feedback_state)])
+        if not adding:
+            # Schedule responses embed their tasks; keep their Last-Modified/ETag honest
+            DailySchedule.objects.filter(tasks=self).touch()
+
+    def delete(self, *args, **kwargs):
+        DailySchedule.objects.filter(tasks=self).touch()
+        return super().delete(*args, **kwargs)
+
     def clean(self):
         if self.rating and not (1 <= self.rating <= 5):
             raise ValidationError("Rating must be between 1 and 5.")
@@ -44,6 +92,28 @@ class Task(models.Model):
 # ======================================================
 # Daily Schedule Model
 # ======================================================
+HIGH_PRIORITIES = ["NOW"]
+
+
+class DailyScheduleQuerySet(models.QuerySet):
+    def with_task_counts(self):
+        """Annotate task_count/high_priority_count so listing schedules needs no per-row COUNTs."""
+        return self.annotate(
+            task_count=models.Count("tasks", distinct=True),
+            high_priority_count=models.Count("tasks", filter=models.Q(tasks__priority__in=HIGH_PRIORITIES), distinct=True),
+        )
+
+    def touch(self):
+        """Bump updated_at without loading the rows (e.g. after their tasks changed)."""
+        from llm.services.change_log import record_changes  # the service imports these models
+
+        rows = list(self.values_list("user_id", "id"))
+        if not rows:
+            return 0
+        record_changes(ChangeLog.KIND_SCHEDULE, rows)
+        return DailySchedule.objects.filter(pk__in=[pk for _, pk in rows]).update(updated_at=timezone.now())
+
+
 class DailySchedule(models.Model):
     user = models.ForeignKey(
         "users.User",
@@ -52,7 +122,7 @@ class DailySchedule(models.Model):
         blank=True,
         related_name="daily_schedules",
     )
-    date = models.DateField(unique=True)
+    date = models.DateField()
     day_of_week = models.CharField(max_length=20)
     tasks = models.ManyToManyField(Task, related_name="daily_schedules")
 
@@ -65,12 +135,21 @@ class DailySchedule(models.Model):
     updated_goals = models.JSONField(default=list, blank=True)
     user_behaviour_patterns = models.JSONField(default=list, blank=True)
 
+    # sha256 of the DailyPlan last saved here; an identical plan is not rewritten
+    plan_hash = models.CharField(max_length=64, blank=True, default="")
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DailyScheduleQuerySet.as_manager()
+
     class Meta:
         ordering = ["date"]
         indexes = [models.Index(fields=["date"])]
+        constraints = [
+            # One schedule per user per day; also the index behind user.daily_schedules.filter(date=...)
+            models.UniqueConstraint(fields=["user", "date"], name="llm_schedule_user_date_uniq"),
+        ]
 
         verbose_name = "Daily Schedule"
         verbose_name_plural = "Daily Schedules"
@@ -78,13 +157,26 @@ class DailySchedule(models.Model):
     def __str__(self) -> str:
         return f"{self.day_of_week}, {self.date}"
 
+    def _prefetched_tasks(self):
+        return getattr(self, "_prefetched_objects_cache", {}).get("tasks")
+
+    # Counts come from with_task_counts() annotations or prefetched tasks when
+    # available, and only fall back to a COUNT query otherwise.
     @property
     def total_tasks(self):
-        return self.tasks.count()
+        if hasattr(self, "task_count"):
+            return self.task_count
+        tasks = self._prefetched_tasks()
+        return len(tasks) if tasks is not None else self.tasks.count()
 
     @property
     def high_priority_tasks(self):
-        return self.tasks.filter(priority__in=["NOW"]).count()
+        if hasattr(self, "high_priority_count"):
+            return self.high_priority_count
+        tasks = self._prefetched_tasks()
+        if tasks is not None:
+            return sum(task.priority in HIGH_PRIORITIES for task in tasks)
+        return self.tasks.filter(priority__in=HIGH_PRIORITIES).count()
 
     def summary(self):
         """Returns a compact text summary (useful for debugging/UI)."""
@@ -94,3 +186,143 @@ class DailySchedule(models.Model):
             "high_priority": self.high_priority_tasks,
             "available_hours": self.total_available_hours,
         }
+
+
+
+# ======================================================
+# Rate Limit Bucket
+# ======================================================
+class RateLimitBucket(models.Model):
+    """
+    Token bucket shared by every worker process (see llm/services/rate_limiter.py).
+    Updates are compare-and-swap on `version`, so no row locks are needed.
+    """
+    key = models.CharField(max_length=128, unique=True)
+    tokens = models.FloatField()
+    refilled_at = models.FloatField(help_text="Unix time of the last refill")
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.key}: {self.tokens:.1f}"
+
+
+# ======================================================
+# LLM Usage Ledger
+# ======================================================
+class LLMCall(models.Model):
+    """
+    One row per model request (or planner cache hit), written in batches by
+    llm/services/usage_ledger.py. Kept narrow so the table stays cheap to scan.
+    """
+    OUTCOME_CHOICES = [
+        ("ok", "OK"),
+        ("cache_hit", "Cache hit"),
+        ("invalid", "Invalid response"),
+        ("timeout", "Timeout"),
+        ("error", "Error"),
+        ("rate_limited", "Rate limited"),
+        ("short_circuit", "Short-circuited"),
+    ]
+
+    user = models.ForeignKey(
+        "users.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="llm_calls",
+    )
+    prompt_type = models.CharField(max_length=32)
+    model = models.CharField(max_length=64, blank=True)
+    outcome = models.CharField(max_length=16, choices=OUTCOME_CHOICES)
+    cache_hit = models.BooleanField(default=False)
+    input_tokens = models.PositiveIntegerField(null=True, blank=True)
+    output_tokens = models.PositiveIntegerField(null=True, blank=True)
+    latency_ms = models.PositiveIntegerField(default=0)
+    cost_usd = models.FloatField(default=0.0)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["created_at"]),
+            models.Index(fields=["user", "created_at"]),
+        ]
+        verbose_name = "LLM Call"
+        verbose_name_plural = "LLM Calls"
+
+    def __str__(self) -> str:
+        return f"{self.prompt_type} {self.outcome} ({self.latency_ms} ms)"
+
+
+# ======================================================
+# Change Log (delta sync)
+# ======================================================
+class ChangeLog(models.Model):
+    """
+    One row per changed task/schedule/goal; the autoincrement id is the sync cursor
+    (written under a per-user lock so each user's ids commit in order, see
+    llm/services/change_log.py).
+    A new change replaces the object's previous row, so the log holds at most one
+    row per object and deletions stay as tombstones.
+    """
+    KIND_TASK = "task"
+    KIND_SCHEDULE = "schedule"
+    KIND_GOAL = "goal"
+    KIND_CHOICES = [
+        (KIND_TASK, "Task"),
+        (KIND_SCHEDULE, "Schedule"),
+        (KIND_GOAL, "Goal"),
+    ]
+
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="changes")
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # user.changes.filter(id__gt=cursor).order_by("id")
+            models.Index(fields=["user", "id"], name="llm_changelog_user_seq_idx"),
+            # replacing an object's previous row
+            models.Index(fields=["user", "kind", "object_id"], name="llm_changelog_object_idx"),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.kind} {self.object_id}{' (deleted)' if self.deleted else ''}"
+
+
+# ======================================================
+# Feedback Rollups
+# ======================================================
+# Time-of-day buckets by suggested start time: (name, upper bound); None = no bound
+FEEDBACK_BUCKETS = [("morning", time(12)), ("afternoon", time(17)), ("evening", None)]
+UNSCHEDULED_BUCKET = "anytime"
+
+
+class FeedbackRollup(models.Model):
+    """
+    Running task/completion/rating totals per (user, goal, time-of-day bucket, priority),
+    kept current as tasks change; the planner reads them as long-term trends.
+    """
+    BUCKET_CHOICES = [(name, name.title()) for name, _ in FEEDBACK_BUCKETS] + [
+        (UNSCHEDULED_BUCKET, UNSCHEDULED_BUCKET.title()),
+    ]
+
+    user = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="feedback_rollups")
+    goal = models.CharField(max_length=255, blank=True, default="")  # Task.related_goal, "" if none
+    bucket = models.CharField(max_length=16, choices=BUCKET_CHOICES)
+    priority = models.CharField(max_length=50)
+    total_tasks = models.IntegerField(default=0)
+    completed_tasks = models.IntegerField(default=0)
+    rated_tasks = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # Also the index behind user.feedback_rollups
+            models.UniqueConstraint(fields=["user", "goal", "bucket", "priority"], name="llm_feedback_rollup_key_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.goal or 'No goal'} · {self.bucket} · {self.priority}: {self.completed_tasks}/{self.total_tasks}"
@@ -0,0 +1,19 @@
+from rest_framework.pagination import CursorPagination
+
+# Keyset (cursor) pagination: each page is an indexed range scan after the
+# last row of the previous page, so deep pages cost the same as the first.
+
+
+class ScheduleCursorPagination(CursorPagination):
+    # (user, date) is unique, so date alone is a stable key within one user's schedules
+    ordering = "-date"
+    page_size = 30
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class TaskCursorPagination(CursorPagination):
+    ordering = "-id"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
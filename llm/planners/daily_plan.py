@@ -1,23 +1,44 @@
 from __future__ import annotations
 import json
 from datetime import datetime, timedelta
-from typing import TYPE_CHECKING
-from django.http import JsonResponse
+from typing import TYPE_CHECKING, NamedTuple
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
 from django.contrib.auth import get_user_model
-from pydantic import ValidationError
-from google.genai import types
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from asgiref.sync import async_to_sync, sync_to_async
 
-from llm.schema import DailyPlan
-from llm.prompts.daily_plan import plan_the_day
-from llm.services.gemini_client import get_gemini_client
-from llm.services.prompt_cache import get_or_create_prompt_cache
-from llm.services.save_daily_plan_to_db import save_daily_plan_to_db
+from llm.schema import DAILY_PLAN_SCHEMA_VERSION, DailyPlan
+from llm.prompts.daily_plan import PLAN_THE_DAY_VERSION, plan_the_day
+from llm.backends import CircuitOpenError, get_llm_backend
+from llm.services.prompt_cache import (
+    get_or_create_structured_prompt, aget_or_create_structured_prompt,
+    aacquire_generation, complete_generation, acomplete_generation, arelease_generation,
+)
+from llm.services.save_daily_plan_to_db import apply_daily_plan, aapply_daily_plan
+from llm.services.plan_stream import DailyTaskStreamParser
+from llm.services.resilience import acall_llm, astream_llm, parse_llm_response
+from llm.services.usage_ledger import record_cache_hit
+from llm.services.pattern_context import apattern_context
+from llm.services.feedback_rollup import afeedback_trends
+from llm.services.local_scheduler import reschedule_locally
+from llm.services.plan_payload import aplan_payload, encode_plan, plan_etag, plan_response
 
 if TYPE_CHECKING:
     from django.contrib.auth.models import AbstractUser
 
 User = get_user_model()
 
+# Larger schedule diffs are not sent as a header; the body has the full plan anyway
+PATCH_HEADER_MAX_CHARS = 4096
+
+
+class PlanHit(NamedTuple):
+    """A plan served without the model: JSON body, schedule diff, ETag (None if not cacheable)."""
+    payload: str
+    patch: list[dict] = []
+    etag: str | None = None
+
 
 def format_feedback_from_tasks(tasks):
     if not tasks:
@@ -30,76 +51,253 @@ def format_feedback_from_tasks(tasks):
     )
 
 
-def generate_daily_plan(user: AbstractUser, reschedule: bool = False) -> JsonResponse:
-    """Generate or reuse a daily plan; optionally reschedule if override content exists."""
-    client = get_gemini_client()
+def _summary_prompt(goals, commitments, patterns, feedback_tasks, trends, override_content, today):
+    """Structured cache-key inputs for the daily plan prompt, plus a callable that renders it."""
+    inputs = {
+        "goals": goals,
+        "commitments": commitments,
+        "patterns": patterns,
+        "feedback": None if feedback_tasks is None else [
+            [t.task_name, t.completed, t.rating, t.feedback] for t in feedback_tasks
+        ],
+        "trends": trends,
+        "override": override_content,
+        "date": today.isoformat(),
+    }
+
+    def render() -> str:
+        feedback = format_feedback_from_tasks(feedback_tasks) if feedback_tasks is not None else "No previous schedule found."
+        return plan_the_day(
+            goals, commitments, patterns, feedback, target_date=datetime.now(), override=override_content, trends=trends
+        )
+
+    return inputs, render
+
+
+async def _astale_plan(user: AbstractUser) -> str | None:
+    stale = await user.prompts.filter(type="summary", llm_response__isnull=False).order_by("-created_at").afirst()
+    return await aplan_payload(stale) if stale else None
+
+
+def _with_patch(response: HttpResponse, patch: list[dict]) -> HttpResponse:
+    """Attach the schedule diff from the save (JSON-patch-style ops) as X-Plan-Patch."""
+    if patch:
+        encoded = json.dumps(patch, cls=DjangoJSONEncoder)
+        if len(encoded) <= PATCH_HEADER_MAX_CHARS:
+            response["X-Plan-Patch"] = encoded
+    return response
+
+
+async def acurrent_plan_etag(user: AbstractUser) -> str | None:
+    """
+    ETag a plain (non-reschedule) GET would be served with: the newest summary's,
+    if it already has a plan. One indexed lookup, no payload read.
+    """
+    latest = await (
+        user.prompts.filter(type="summary").order_by("-created_at")
+        .annotate(ready=ExpressionWrapper(Q(llm_response__isnull=False), output_field=BooleanField()))
+        .values_list("hash", "ready")
+        .afirst()
+    )
+    return plan_etag(latest[0]) if latest and latest[1] else None
+
+
+def _complete_plan(cached, plan: DailyPlan) -> None:
+    complete_generation(cached, plan.model_dump(), encode_plan(plan), DAILY_PLAN_SCHEMA_VERSION)
+
+
+async def _acomplete_plan(cached, plan: DailyPlan) -> None:
+    await acomplete_generation(cached, plan.model_dump(), encode_plan(plan), DAILY_PLAN_SCHEMA_VERSION)
+
+
+# ====================================================================
+# Planner flow
+# ====================================================================
+# One async implementation serves the ASGI views and the streaming path;
+# generate_daily_plan() runs it to completion for sync callers (plan jobs,
+# the shell). Steps that only touch the ORM run via sync_to_async.
+
+
+def _local_reschedule(user: AbstractUser, cached_summary, override_prompt) -> tuple[DailyPlan, list[dict]] | None:
+    """
+    Apply a small structured override ("Add a 20 min walk") on top of the cached
+    plan with the local scheduler. Returns (plan, schedule patch), or None when
+    the model is needed.
+    """
+    if not (cached_summary and cached_summary.llm_response and override_prompt and override_prompt.text.strip()):
+        return None
+    try:
+        base = DailyPlan.model_validate(cached_summary.llm_response)
+    except Exception:
+        return None
+    plan = reschedule_locally(base, override_prompt.text, now=datetime.now())
+    if plan is None:
+        return None
+    if plan == base:
+        return plan, []
+
+    # 🔹 Store as the newest summary so plain GETs return the rescheduled day
+    cached, _ = get_or_create_structured_prompt(
+        user,
+        "summary",
+        {"base": cached_summary.hash, "override": override_prompt.text},
+        lambda: f"local-reschedule of {cached_summary.hash}:\n{override_prompt.text}",
+        PLAN_THE_DAY_VERSION,
+    )
+    if cached.llm_response:
+        plan = DailyPlan.model_validate(cached.llm_response)
+    else:
+        _complete_plan(cached, plan)
+    _, patch = apply_daily_plan(user, plan)
+    return plan, patch
+
+
+async def _aprepare_daily_plan(user: AbstractUser, reschedule: bool = False):
+    """
+    Shared async front half of the planner: cache checks, context gathering and prompt build.
+    Returns (PlanHit, None, None) when no model call is needed,
+    else (None, cache_row, prompt_text) for the LLM.
+    """
     today = datetime.now().date()
 
     # 🔹 Cached summary prompt
-    cached_summary = user.prompts.filter(type="summary").order_by("-created_at").first()
-    
+    cached_summary = await user.prompts.filter(type="summary").order_by("-created_at").afirst()
+
     # 🧠 If reschedule requested, check override prompt
     override_prompt = None
     if reschedule:
-        override_prompt = user.prompts.filter(type="override").order_by("-created_at").first()
+        override_prompt = await user.prompts.filter(type="override").order_by("-created_at").afirst()
         if override_prompt and not override_prompt.text.strip() and cached_summary and cached_summary.llm_response:
             # No new override content → return cached plan
-            try:
-                return JsonResponse(DailyPlan.model_validate(cached_summary.llm_response).model_dump(), safe=False)
-            except Exception as e:
-                print(f"⚠️ Failed to load cached summary: {e}")
+            payload = await aplan_payload(cached_summary)
+            if payload is not None:
+                record_cache_hit(user, "summary")
+                return PlanHit(payload, etag=plan_etag(cached_summary.hash)), None, None
+
+        # 🔹 Small structured override → slot it in locally, no model call
+        local = await sync_to_async(_local_reschedule)(user, cached_summary, override_prompt)
+        if local is not None:
+            plan, patch = local
+            return PlanHit(encode_plan(plan), patch), None, None
 
-    # 🔹 Return cached summary if exists & no reschedule
+    # 🔹 Return cached summary if exists & no reschedule (pre-encoded, no re-validation)
     if cached_summary and not reschedule:
-        try:
-            return JsonResponse(DailyPlan.model_validate(cached_summary.llm_response).model_dump(), safe=False)
-        except Exception as e:
-            print(f"⚠️ Failed to load cached summary: {e}")
+        payload = await aplan_payload(cached_summary)
+        if payload is not None:
+            record_cache_hit(user, "summary")
+            return PlanHit(payload, etag=plan_etag(cached_summary.hash)), None, None
 
     # 🔹 Latest user data
-    latest_goal = user.goals.order_by("-updated_at").first()
+    latest_goal = await user.goals.order_by("-updated_at").afirst()
     goals = latest_goal.llm_response if latest_goal else []
 
-    latest_commitment = user.commitments.order_by("-updated_at").first()
+    latest_commitment = await user.commitments.order_by("-updated_at").afirst()
     commitments = latest_commitment.llm_response if latest_commitment else []
 
-    patterns = list(user.userpattern_set.order_by("-created_at").values_list("pattern_text", flat=True))
+    patterns = await apattern_context(user)
 
     # 🔹 Gather yesterday’s feedback
-    yesterday_schedule = user.daily_schedules.filter(date=today - timedelta(days=1)).prefetch_related("tasks").first()
-    feedback = format_feedback_from_tasks(yesterday_schedule.tasks.all()) if yesterday_schedule else "No previous schedule found."
+    yesterday_schedule = await user.daily_schedules.filter(date=today - timedelta(days=1)).prefetch_related("tasks").afirst()
+    feedback_tasks = list(yesterday_schedule.tasks.all()) if yesterday_schedule else None
+
+    # 🔹 Longer-term trends from the feedback rollups (schedules before today)
+    trends = await afeedback_trends(user, today)
 
     # 🔹 Include override content in prompt if exists
     override_content = override_prompt.text if override_prompt else None
 
-    # 🔹 Build LLM prompt
-    prompt_text = plan_the_day(goals, commitments, patterns, feedback, target_date=datetime.now(), override=override_content)
+    # 🔹 Use cache layer (keyed on the inputs; the prompt is only rendered on a miss)
+    inputs, render = _summary_prompt(goals, commitments, patterns, feedback_tasks, trends, override_content, today)
+    cached, created = await aget_or_create_structured_prompt(user, "summary", inputs, render, PLAN_THE_DAY_VERSION)
+    prompt_text = cached.text
+    if (not created and cached.llm_response) or not await aacquire_generation(cached):
+        # 🔹 Already generated, or another request just did (single-flight)
+        payload = await aplan_payload(cached)
+        _, patch = await aapply_daily_plan(user, DailyPlan.model_validate_json(payload))
+        record_cache_hit(user, "summary")
+        return PlanHit(payload, patch, plan_etag(cached.hash)), None, None
 
-    # 🔹 Use cache layer
-    cached, created = get_or_create_prompt_cache(user, prompt_text, "summary", ignore_time=True)
-    if not created and cached.llm_response:
-        plan = DailyPlan.model_validate(cached.llm_response)
-        save_daily_plan_to_db(user, plan)
-        return JsonResponse(plan.model_dump(), safe=False)
-
-    # 🔹 Query Gemini
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt_text,
-        config=types.GenerateContentConfig(
-            response_mime_type="application/json",
-            response_schema=DailyPlan,
-        ),
-    )
+    return None, cached, prompt_text
 
-    try:
-        daily_plan = DailyPlan.model_validate(json.loads(response.text))
-    except (json.JSONDecodeError, ValidationError) as e:
-        raise Exception(f"LLM returned invalid response: {e}")
 
+async def _afinish_daily_plan(user: AbstractUser, cached, daily_plan: DailyPlan) -> list[dict]:
     # 🔹 Cache & save
-    cached.llm_response = daily_plan.model_dump()
-    cached.save(update_fields=["llm_response"])
-    save_daily_plan_to_db(user, daily_plan)
+    await _acomplete_plan(cached, daily_plan)
+    _, patch = await aapply_daily_plan(user, daily_plan)
+    return patch
+
+
+async def agenerate_daily_plan(user: AbstractUser, reschedule: bool = False) -> HttpResponse:
+    """Generate or reuse a daily plan; optionally reschedule if override content exists."""
+    backend = get_llm_backend()
+    hit, cached, prompt_text = await _aprepare_daily_plan(user, reschedule)
+    if hit is not None:
+        return _with_patch(plan_response(hit.payload, hit.etag), hit.patch)
+
+    # 🔹 Query the LLM backend (rate limit, deadline, retries, breaker) without blocking the event loop
+    try:
+        daily_plan = await acall_llm(backend, user, prompt_text, DailyPlan, prompt_type="summary")
+    except CircuitOpenError:
+        await arelease_generation(cached)
+        stale = await _astale_plan(user)
+        if stale is None:
+            raise
+        response = plan_response(stale)
+        response["X-Plan-Stale"] = "true"
+        return response
+    except BaseException:
+        await arelease_generation(cached)
+        raise
+    patch = await _afinish_daily_plan(user, cached, daily_plan)
+
+    return _with_patch(plan_response(cached.response_json, plan_etag(cached.hash)), patch)
+
+
+def generate_daily_plan(user: AbstractUser, reschedule: bool = False) -> HttpResponse:
+    """Sync entry point for agenerate_daily_plan() (plan jobs, management commands)."""
+    return async_to_sync(agenerate_daily_plan)(user, reschedule)
+
+
+async def astream_daily_plan(user: AbstractUser, reschedule: bool = False):
+    """
+    Streaming variant of agenerate_daily_plan().
+    Yields ("task", dict) for each DailyTask as soon as it is complete in the model output,
+    then ("patch", list) with the schedule diff if the save changed anything,
+    then ("plan", dict) with the validated plan after it has been cached and saved.
+    """
+    backend = get_llm_backend()
+    hit, cached, prompt_text = await _aprepare_daily_plan(user, reschedule)
+    if hit is not None:
+        plan = json.loads(hit.payload)
+        for task in plan["tasks"]:
+            yield "task", task
+        if hit.patch:
+            yield "patch", hit.patch
+        yield "plan", plan
+        return
+
+    parser = DailyTaskStreamParser()
+    try:
+        async for text in astream_llm(backend, user, prompt_text, DailyPlan, prompt_type="summary"):
+            for task in parser.feed(text):
+                yield "task", task.model_dump()
 
-    return JsonResponse(daily_plan.model_dump(), safe=False)
+        daily_plan = parse_llm_response(parser.buffer, DailyPlan)
+    except CircuitOpenError:
+        await arelease_generation(cached)
+        stale = await _astale_plan(user)
+        if stale is None:
+            raise
+        stale = json.loads(stale)
+        for task in stale["tasks"]:
+            yield "task", task
+        yield "stale_plan", stale
+        return
+    except BaseException:
+        # Includes client disconnects (CancelledError / GeneratorExit)
+        await arelease_generation(cached)
+        raise
+    patch = await _afinish_daily_plan(user, cached, daily_plan)
+    if patch:
+        yield "patch", patch
+    yield "plan", daily_plan.model_dump()
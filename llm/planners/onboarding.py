@@ -1,26 +1,27 @@
 from __future__ import annotations
 
-import json
+from datetime import date
 from typing import TYPE_CHECKING
 
+from asgiref.sync import async_to_sync
 from django.contrib.auth import get_user_model
-from pydantic import ValidationError
-from google import genai
-from google.genai import types
 
 from llm.schema import DailyPlan
-from llm.services.prompt_cache import get_or_create_prompt_cache
-from llm.prompts.onboarding import onboard_user
+from llm.services.prompt_cache import (
+    aget_or_create_structured_prompt, aacquire_generation, acomplete_generation, arelease_generation,
+)
+from llm.prompts.onboarding import ONBOARD_USER_VERSION, onboard_user
 from core.models import Prompt
-from llm.services.save_onboarding import save_onboarding
-from django.http import JsonResponse
+from llm.services.save_onboarding import asave_onboarding
+from llm.services.resilience import acall_llm
+from llm.services.usage_ledger import record_cache_hit
 if TYPE_CHECKING:
     from django.contrib.auth.models import AbstractUser
 
 User = get_user_model()
 
 
-from llm.services.gemini_client import get_gemini_client
+from llm.backends import get_llm_backend
 
 
 # ====================================================================
@@ -28,48 +29,49 @@ from llm.services.gemini_client import get_gemini_client
 # ====================================================================
 
 
-def generate_onboarding_plan(user: AbstractUser) -> JsonResponse:
-    client = get_gemini_client()
-    print("Here")
-    goal_prompt = Prompt.objects.filter(user=user, type="goal").first()
-    commitment_prompt = Prompt.objects.filter(user=user, type="commitment").first()
+def _onboarding_inputs(goal_data, commitment_data) -> dict:
+    # The onboarding prompt plans "today", so the date is part of the key
+    return {"goals": goal_data, "commitments": commitment_data, "date": date.today().isoformat()}
+
+
+async def agenerate_onboarding_plan(user: AbstractUser) -> DailyPlan:
+    """Generate (or replay from the prompt cache) the user's first plan."""
+    backend = get_llm_backend()
+    goal_prompt = await Prompt.objects.filter(user=user, type="goal").afirst()
+    commitment_prompt = await Prompt.objects.filter(user=user, type="commitment").afirst()
 
     goal_data = goal_prompt.text if goal_prompt else None
     commitment_data = commitment_prompt.text if commitment_prompt else None
 
-    
-    prompt_text = onboard_user(goal_data, commitment_data)
-    print(prompt_text)
-    # 🔹 Use cache layer
-    cached_prompt, created = get_or_create_prompt_cache(
-        user=user,
-        prompt_text=prompt_text,
-        prompt_type="onboarding",
-        ignore_time=True, 
+    # 🔹 Use cache layer (keyed on the inputs; the prompt is only rendered on a miss)
+    cached_prompt, created = await aget_or_create_structured_prompt(
+        user,
+        "onboarding",
+        _onboarding_inputs(goal_data, commitment_data),
+        lambda: onboard_user(goal_data, commitment_data),
+        ONBOARD_USER_VERSION,
     )
+    prompt_text = cached_prompt.text
 
-    if not created and cached_prompt.llm_response:
-        save_onboarding(user, cached_prompt.llm_response)
+    # 🔹 Cache hit, or another request just generated it (single-flight)
+    if (not created and cached_prompt.llm_response) or not await aacquire_generation(cached_prompt):
+        await asave_onboarding(user, cached_prompt.llm_response, fresh=False)
+        record_cache_hit(user, "onboarding")
         return DailyPlan.model_validate(cached_prompt.llm_response)
 
-    # 🔹 Query LLM
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt_text,
-        config=types.GenerateContentConfig(
-            response_mime_type="application/json",
-            response_schema=DailyPlan,
-        ),
-    )
-
     try:
-        response_json = json.loads(response.text)
-        initial_plan = DailyPlan.model_validate(response_json)
-    except (json.JSONDecodeError, ValidationError) as e:
-        raise Exception(f"LLM returned invalid response: {e}")
-
-    cached_prompt.llm_response = initial_plan.model_dump()
-    cached_prompt.save(update_fields=["llm_response"])
-    save_onboarding(user, initial_plan)
-    
+        # 🔹 Query LLM (rate limit, deadline, retries, breaker) without blocking the event loop
+        initial_plan = await acall_llm(backend, user, prompt_text, DailyPlan, prompt_type="onboarding")
+    except BaseException:
+        await arelease_generation(cached_prompt)
+        raise
+
+    await acomplete_generation(cached_prompt, initial_plan.model_dump())
+    await asave_onboarding(user, initial_plan)
+
     return initial_plan
+
+
+def generate_onboarding_plan(user: AbstractUser) -> DailyPlan:
+    """Sync entry point for agenerate_onboarding_plan() (plan jobs)."""
+    return async_to_sync(agenerate_onboarding_plan)(user)
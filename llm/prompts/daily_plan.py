@@ -1,11 +1,17 @@
 from llm.prompts.__init__ import format_json, render_date_info
 from datetime import datetime
 
+# Part of the prompt cache key: bump whenever the template below changes
+PLAN_THE_DAY_VERSION = 2
 
-def plan_the_day(goals, commitments, patterns, feedback, target_date: datetime = None, override: str = None) -> str:
+
+def plan_the_day(
+    goals, commitments, patterns, feedback, target_date: datetime = None, override: str = None, trends: str = None
+) -> str:
     """
     Build the system prompt for Gemini (or LLM) to plan the user's next day.
-    Includes user goals, commitments, patterns, yesterday feedback, and optional override content.
+    Includes user goals, commitments, patterns, yesterday feedback, long-term feedback trends,
+    and optional override content.
     Returns structured JSON matching the DailyPlan schema.
     """
     target_date = target_date or datetime.now()
@@ -19,6 +25,7 @@ def plan_the_day(goals, commitments, patterns, feedback, target_date: datetime =
     commitments_section = commitments or "No commitments recorded yet."
     patterns_section = patterns or "No behavior patterns detected yet."
     feedback_section = feedback or "No task feedback provided yet."
+    trends_section = trends or "Not enough history yet."
     override_section = override.strip() if override and override.strip() else None
 
     override_text = f"\n\n⚡ **OVERRIDE / NEW TASKS**\n{override_section}" if override_section else ""
@@ -45,6 +52,9 @@ Approximate remaining hours today: {remaining_hours:.1f}
 
 💬 PREVIOUS DAY’S TASK FEEDBACK
 {feedback_section}
+
+📈 LONGER-TERM TRENDS (goal · time of day · priority: completion, average rating)
+{trends_section}
 {override_text}
 
 ────────────────────────────────────────────
@@ -1,6 +1,10 @@
 
+import hashlib
 from datetime import datetime, timedelta
-from llm.services.generate_hash import H
+
+# Part of the prompt cache key: bump whenever the template below changes
+ONBOARD_USER_VERSION = 1
+
 
 def onboard_user(goals_list: str, commitments_list: str, custom_context: str = ""):
     """
@@ -12,7 +16,8 @@ def onboard_user(goals_list: str, commitments_list: str, custom_context: str = "
     current_time_readable = now.strftime("%I:%M %p").lstrip('0')  # "7:30 PM" format
     current_day = now.strftime("%A")
     current_date = now.strftime("%Y-%m-%d")
-    user_hash = H(10)
+    # Delimiter fencing the user's text; derived from it so the prompt is reproducible
+    user_hash = hashlib.sha256(f"{goals_list}\x00{commitments_list}".encode("utf-8")).hexdigest()[:10]
 
     goals_section = goals_list if goals_list else "No specific goals provided. User needs help identifying priorities."
     commitments_section = commitments_list if commitments_list else "No fixed commitments provided. Assume flexible schedule."
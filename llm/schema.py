@@ -5,6 +5,10 @@ from typing import List, Optional
 # Pydantic Models for Structured Output (Daily Plan)
 # ====================================================================
 # Keep in sync with llm/models.py
+# Bump DAILY_PLAN_SCHEMA_VERSION whenever DailyPlan/DailyTask change shape:
+# cached plans encoded under an older version are re-validated on their next hit.
+
+DAILY_PLAN_SCHEMA_VERSION = 1
 
 class DailyTask(BaseModel):
     task_name: str
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Task, DailySchedule
+from .models import ChangeLog, Task, DailySchedule
+from .services.change_log import record_changes
+from .services.feedback_rollup import record_feedback_changes
 
 
 class TaskSerializer(serializers.ModelSerializer):
@@ -23,6 +25,8 @@ class TaskSerializer(serializers.ModelSerializer):
 
 class DailyScheduleSerializer(serializers.ModelSerializer):
     tasks = TaskSerializer(many=True)
+    total_tasks = serializers.IntegerField(read_only=True)
+    high_priority_tasks = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = DailySchedule
@@ -32,6 +36,8 @@ class DailyScheduleSerializer(serializers.ModelSerializer):
             "date",
             "day_of_week",
             "tasks",
+            "total_tasks",
+            "high_priority_tasks",
             "total_committed_hours",
             "total_available_hours",
             "notes",
@@ -41,10 +47,41 @@ class DailyScheduleSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "user"]
 
+    def validate(self, attrs):
+        # `user` is read-only, so DRF adds no validator for the (user, date) constraint
+        date = attrs.get("date", getattr(self.instance, "date", None))
+        user = self.instance.user if self.instance else self.context["request"].user
+        schedules = DailySchedule.objects.filter(user=user, date=date)
+        if self.instance is not None:
+            schedules = schedules.exclude(pk=self.instance.pk)
+        if schedules.exists():
+            raise serializers.ValidationError({"date": "A schedule for this date already exists."})
+        return attrs
+
     def create(self, validated_data):
         tasks_data = validated_data.pop("tasks", [])
         schedule = DailySchedule.objects.create(**validated_data)
-        for task_data in tasks_data:
-            task = Task.objects.create(**task_data)
-            schedule.tasks.add(task)
+        tasks = Task.objects.bulk_create([Task(user=schedule.user, **task_data) for task_data in tasks_data])
+        schedule.tasks.add(*tasks)
+        record_changes(ChangeLog.KIND_TASK, [(task.user_id, task.pk) for task in tasks])
+        record_feedback_changes([(None, task.feedback_state()) for task in tasks])
         return schedule
+
+
+class TaskFeedbackListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        ids = [item["id"] for item in attrs]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError("Each task may appear only once.")
+        return attrs
+
+
+class TaskFeedbackSerializer(serializers.Serializer):
+    """One item of a batch feedback request; omitted fields are left as they are."""
+    id = serializers.IntegerField()
+    completed = serializers.BooleanField(required=False)
+    rating = serializers.ChoiceField(choices=Task.RATING_CHOICES, required=False, allow_null=True)
+    feedback = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+    class Meta:
+        list_serializer_class = TaskFeedbackListSerializer
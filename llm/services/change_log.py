@@ -0,0 +1,124 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save
+
+from llm.models import ChangeLog, DailySchedule, Task
+from users.models import Goal, User
+
+
+def _sync_options() -> dict:
+    options = {
+        "MAX_CHANGES": 500,
+    }
+    options.update(getattr(settings, "CHANGE_SYNC", {}))
+    return options
+
+
+# ====================================================================
+# Recording changes
+# ====================================================================
+# Every write to a task, schedule or goal leaves one ChangeLog row whose id
+# is the sync cursor. Rows are written after the surrounding transaction
+# commits, so a cursor never runs ahead of data the client can read and
+# rolled-back writes leave nothing behind. Writing an object's row deletes
+# its previous one: the log stays one row per object and a sync returns
+# each object at most once.
+#
+# Cursors are per user, so a user's rows must become visible in id order:
+# a client that has synced past id N must never later see a row below N
+# commit. Each write therefore locks the user row (SELECT ... FOR UPDATE)
+# before its ids are allocated and holds it until commit, so concurrent
+# writers for the same user take ids one transaction after the other.
+# SQLite ignores FOR UPDATE but already serializes all writers.
+#
+# save()/delete() are caught by signals; bulk writes (bulk_create,
+# bulk_update, queryset.update) call record_changes() themselves.
+
+KINDS = {
+    Task: ChangeLog.KIND_TASK,
+    DailySchedule: ChangeLog.KIND_SCHEDULE,
+    Goal: ChangeLog.KIND_GOAL,
+}
+
+
+def _write(kind: str, changes: dict[int, set[int]], deleted: bool) -> None:
+    for user_id, object_ids in changes.items():
+        try:
+            with transaction.atomic():
+                if not User.objects.select_for_update().filter(pk=user_id).exists():
+                    continue
+                ChangeLog.objects.filter(user_id=user_id, kind=kind, object_id__in=object_ids).delete()
+                ChangeLog.objects.bulk_create([
+                    ChangeLog(user_id=user_id, kind=kind, object_id=object_id, deleted=deleted)
+                    for object_id in sorted(object_ids)
+                ])
+        except IntegrityError:
+            # The user was deleted along with the object; there is no one left to sync
+            pass
+
+
+def record_changes(kind: str, rows, deleted: bool = False) -> None:
+    """Log (user_id, object_id) pairs as changed (or deleted) once the transaction commits."""
+    changes = defaultdict(set)
+    for user_id, object_id in rows:
+        if user_id is not None:  # ownerless rows are not synced to anyone
+            changes[user_id].add(object_id)
+    if changes:
+        transaction.on_commit(lambda: _write(kind, changes, deleted))
+
+
+def _record_save(sender, instance, raw=False, **kwargs):
+    if not raw:  # fixtures
+        record_changes(KINDS[sender], [(instance.user_id, instance.pk)])
+
+
+def _record_delete(sender, instance, **kwargs):
+    record_changes(KINDS[sender], [(instance.user_id, instance.pk)], deleted=True)
+
+
+for _model, _kind in KINDS.items():
+    post_save.connect(_record_save, sender=_model, dispatch_uid=f"change_log_save_{_kind}")
+    post_delete.connect(_record_delete, sender=_model, dispatch_uid=f"change_log_delete_{_kind}")
+
+
+# ====================================================================
+# Reading changes
+# ====================================================================
+
+def changes_since(user, since: int, limit: int | None = None) -> dict:
+    """
+    The user's tasks, schedules and goals changed after cursor `since`, oldest change
+    first and at most `limit` log rows; deleted objects are returned as ids.
+    """
+    limit = limit or _sync_options()["MAX_CHANGES"]
+    entries = list(
+        user.changes.filter(id__gt=since)
+        .order_by("id")
+        .values_list("id", "kind", "object_id", "deleted")[: limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    changed = {kind: [] for kind in KINDS.values()}
+    deleted = {kind: [] for kind in KINDS.values()}
+    for _, kind, object_id, is_deleted in entries:
+        (deleted if is_deleted else changed)[kind].append(object_id)
+
+    # 🔹 One query per kind that actually changed
+    def fetch(queryset, kind):
+        return list(queryset.filter(user=user, pk__in=changed[kind]).order_by("pk")) if changed[kind] else []
+
+    return {
+        "cursor": entries[-1][0] if entries else since,
+        "has_more": has_more,
+        "tasks": fetch(Task.objects, ChangeLog.KIND_TASK),
+        "schedules": fetch(DailySchedule.objects.prefetch_related("tasks"), ChangeLog.KIND_SCHEDULE),
+        "goals": fetch(Goal.objects, ChangeLog.KIND_GOAL),
+        "deleted": {
+            "tasks": deleted[ChangeLog.KIND_TASK],
+            "schedules": deleted[ChangeLog.KIND_SCHEDULE],
+            "goals": deleted[ChangeLog.KIND_GOAL],
+        },
+    }
@@ -0,0 +1,192 @@
+from collections import defaultdict
+from datetime import date, time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from llm.models import FEEDBACK_BUCKETS, UNSCHEDULED_BUCKET, DailySchedule, FeedbackRollup, Task
+
+
+def _trend_options() -> dict:
+    options = {
+        "MIN_TASKS": 3,
+        "MAX_ROWS": 12,
+    }
+    options.update(getattr(settings, "FEEDBACK_TRENDS", {}))
+    return options
+
+
+# ====================================================================
+# Incremental rollups
+# ====================================================================
+# Every owned task counts once in FeedbackRollup under (goal, time-of-day
+# bucket, priority). A change is applied as the difference between the
+# task's state before and after: -1 under the old key, +1 under the new
+# one, so counts move with F() updates and nothing is re-scanned. Writes
+# run inside the caller's transaction and roll back with it.
+#
+# Task.save() and deletes (signal) are tracked automatically; bulk writes
+# pass (before, after) feedback states to record_feedback_changes().
+# `manage.py rebuild_feedback_rollups` recomputes everything from the
+# tasks (backfills, or after raw SQL edits).
+
+COUNT_FIELDS = ["total_tasks", "completed_tasks", "rated_tasks", "rating_sum"]
+
+
+def time_bucket(suggested_time: time | None) -> str:
+    if suggested_time is None:
+        return UNSCHEDULED_BUCKET
+    for name, until in FEEDBACK_BUCKETS:
+        if until is None or suggested_time < until:
+            return name
+
+
+def _add(deltas: dict, state: tuple | None, sign: int) -> None:
+    if state is None or state[0] is None:  # ownerless tasks are not rolled up
+        return
+    user_id, goal, suggested_time, priority, completed, rating = state
+    delta = deltas[(user_id, goal or "", time_bucket(suggested_time), priority)]
+    delta[0] += sign
+    delta[1] += sign * bool(completed)
+    delta[2] += sign * (rating is not None)
+    delta[3] += sign * (rating or 0)
+
+
+def _apply(key: tuple, delta: list[int]) -> None:
+    user_id, goal, bucket, priority = key
+    rows = FeedbackRollup.objects.filter(user_id=user_id, goal=goal, bucket=bucket, priority=priority)
+    increments = {field: F(field) + value for field, value in zip(COUNT_FIELDS, delta) if value}
+    if rows.update(**increments, updated_at=timezone.now()):
+        return
+    # No row yet: only a newly counted task creates one (not a removal, e.g. while
+    # the user is being deleted, nor a change to a task counted before a rebuild)
+    if delta[0] <= 0:
+        return
+    try:
+        with transaction.atomic():
+            FeedbackRollup.objects.create(
+                user_id=user_id, goal=goal, bucket=bucket, priority=priority, **dict(zip(COUNT_FIELDS, delta))
+            )
+    except IntegrityError:
+        rows.update(**increments, updated_at=timezone.now())  # created concurrently
+
+
+def record_feedback_changes(changes) -> None:
+    """Apply (before, after) Task.feedback_state() pairs; None means created/deleted."""
+    deltas = defaultdict(lambda: [0, 0, 0, 0])
+    for before, after in changes:
+        _add(deltas, before, -1)
+        _add(deltas, after, 1)
+    for key, delta in deltas.items():
+        if any(delta):
+            _apply(key, delta)
+
+
+def _record_delete(sender, instance, **kwargs):
+    # The row is gone; use the state it was loaded with
+    state = getattr(instance, "_loaded_feedback_state", None) or instance.feedback_state()
+    record_feedback_changes([(state, None)])
+
+
+post_delete.connect(_record_delete, sender=Task, dispatch_uid="feedback_rollup_delete")
+
+
+def _totals(tasks):
+    """Per-rollup-key aggregates of `tasks` (one GROUP BY query)."""
+    bucket = Case(
+        When(suggested_time__isnull=True, then=Value(UNSCHEDULED_BUCKET)),
+        *[When(suggested_time__lt=until, then=Value(name)) for name, until in FEEDBACK_BUCKETS if until],
+        default=Value(FEEDBACK_BUCKETS[-1][0]),
+        output_field=CharField(),
+    )
+    return (
+        tasks.annotate(goal_key=Coalesce("related_goal", Value("")), bucket_key=bucket)
+        .values("user_id", "goal_key", "bucket_key", "priority")
+        .annotate(
+            total=Count("id"),
+            completed=Count("id", filter=Q(completed=True)),
+            rated=Count("rating"),
+            rating_total=Coalesce(Sum("rating"), 0),
+        )
+        .order_by()
+    )
+
+
+def rebuild_feedback_rollups(user_ids=None) -> int:
+    """Recompute rollups from the tasks with one aggregate query. Returns the row count."""
+    tasks = Task.objects.filter(user__isnull=False)
+    rollups = FeedbackRollup.objects.all()
+    if user_ids is not None:
+        tasks = tasks.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+
+    totals = _totals(tasks)
+    with transaction.atomic():
+        rollups.delete()
+        created = FeedbackRollup.objects.bulk_create(
+            [
+                FeedbackRollup(
+                    user_id=row["user_id"],
+                    goal=row["goal_key"],
+                    bucket=row["bucket_key"],
+                    priority=row["priority"],
+                    total_tasks=row["total"],
+                    completed_tasks=row["completed"],
+                    rated_tasks=row["rated"],
+                    rating_sum=row["rating_total"],
+                )
+                for row in totals
+            ],
+            batch_size=500,
+        )
+    return len(created)
+
+
+# ====================================================================
+# Trend section for the planner prompt
+# ====================================================================
+
+def feedback_trends(user, before: date) -> str | None:
+    """
+    Compact completion/rating trends for the prompt: the MAX_ROWS largest rollups
+    with at least MIN_TASKS tasks. Tasks on schedules dated `before` or later are
+    left out, so saving or updating today's plan does not change the prompt (and
+    its cache key). Two queries; None if there are no trends yet.
+    """
+    options = _trend_options()
+    counts = {
+        (row.goal, row.bucket, row.priority): [getattr(row, field) for field in COUNT_FIELDS]
+        for row in FeedbackRollup.objects.filter(user=user)
+    }
+    Through = DailySchedule.tasks.through
+    current = Task.objects.filter(
+        user=user,
+        pk__in=Through.objects.filter(dailyschedule__user=user, dailyschedule__date__gte=before).values("task_id"),
+    )
+    for row in _totals(current):
+        key = (row["goal_key"], row["bucket_key"], row["priority"])
+        if key in counts:
+            delta = (row["total"], row["completed"], row["rated"], row["rating_total"])
+            counts[key] = [count - value for count, value in zip(counts[key], delta)]
+
+    rows = sorted(
+        ((key, count) for key, count in counts.items() if count[0] >= options["MIN_TASKS"]),
+        key=lambda item: (-item[1][0], *item[0]),
+    )
+    lines = []
+    for (goal, bucket, priority), (total, completed, rated, rating_sum) in rows[: options["MAX_ROWS"]]:
+        line = f"- {goal or 'No goal'} · {bucket} · {priority}: {completed}/{total} completed ({completed * 100 // total}%)"
+        if rated:
+            line += f", avg rating {rating_sum / rated:.1f}/5"
+        lines.append(line)
+    return "\n".join(lines) or None
+
+
+async def afeedback_trends(user, before: date) -> str | None:
+    """Async variant of feedback_trends(), run in a sync thread."""
+    return await sync_to_async(feedback_trends)(user, before)
@@ -1,8 +1,139 @@
 from google import genai
+from google.genai import types
+from django.conf import settings
+import asyncio
+import atexit
+import httpx
 import os
+import threading
+import weakref
 
-def get_gemini_client() -> genai.Client:
+# Process-wide registry of Gemini clients, keyed by API key.
+# Each client owns a keep-alive httpx pool, so reusing it avoids paying
+# for client setup and a cold TLS handshake on every planning request.
+_clients: dict[str, genai.Client] = {}
+_lock = threading.Lock()
+
+# Async httpx pools are bound to the event loop that opened them, so the async
+# path keeps one client per long-lived loop: the loop an ASGI worker serves
+# requests on, registered at lifespan startup (see jing/asgi.py). Under WSGI,
+# async_to_sync runs every request on a fresh loop; a pool opened there would
+# be cold each time and never closed, so async calls use the pooled sync
+# client in a thread instead.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, genai.Client]" = weakref.WeakKeyDictionary()
+_serving_loops: "weakref.WeakSet[asyncio.AbstractEventLoop]" = weakref.WeakSet()
+
+
+def _client_options() -> dict:
+    """Merge GEMINI_CLIENT settings over the defaults."""
+    from llm.services.resilience import _resilience_options
+
+    options = {
+        "POOL_SIZE": 10,
+        "KEEPALIVE_CONNECTIONS": 10,
+        "KEEPALIVE_EXPIRY": 30.0,
+        "TIMEOUT": None,
+    }
+    options.update(getattr(settings, "GEMINI_CLIENT", {}))
+    # A request the resilience layer has given up on must not keep holding
+    # its call thread (and pool connection) after the attempt deadline
+    attempt_timeout = _resilience_options()["TIMEOUT_SECONDS"]
+    options["TIMEOUT"] = attempt_timeout if options["TIMEOUT"] is None else min(options["TIMEOUT"], attempt_timeout)
+    return options
+
+
+def _build_client(api_key: str) -> genai.Client:
+    options = _client_options()
+    limits = httpx.Limits(
+        max_connections=options["POOL_SIZE"],
+        max_keepalive_connections=options["KEEPALIVE_CONNECTIONS"],
+        keepalive_expiry=options["KEEPALIVE_EXPIRY"],
+    )
+    http_options = types.HttpOptions(
+        timeout=int(options["TIMEOUT"] * 1000),  # genai expects milliseconds
+        client_args={"limits": limits},
+        async_client_args={"limits": limits},
+    )
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def _get_api_key() -> str:
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY environment variable not set")
-    return genai.Client(api_key=api_key)
\ No newline at end of file
+    return api_key
+
+
+def get_gemini_client() -> genai.Client:
+    """Return the shared, pooled Gemini client for this process."""
+    api_key = _get_api_key()
+    client = _clients.get(api_key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = _build_client(api_key)
+    return client
+
+
+def serve_on_running_loop() -> None:
+    """Mark the running loop as long-lived, so it gets its own async pool (ASGI startup hook)."""
+    _serving_loops.add(asyncio.get_running_loop())
+
+
+def has_async_client() -> bool:
+    """True when the running loop is long-lived and may hold an async pool."""
+    return asyncio.get_running_loop() in _serving_loops
+
+
+def get_async_gemini_client():
+    """
+    Return the pooled async Gemini client (``client.aio``) for the running loop.
+    Only for loops registered with serve_on_running_loop(); check has_async_client().
+    """
+    api_key = _get_api_key()
+    loop = asyncio.get_running_loop()
+    if loop not in _serving_loops:
+        raise RuntimeError("No long-lived event loop; use the sync client in a thread")
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = _build_client(api_key)
+    return client.aio
+
+
+async def aclose_gemini_clients() -> None:
+    """Close the async client bound to the running loop (ASGI shutdown hook)."""
+    loop = asyncio.get_running_loop()
+    _serving_loops.discard(loop)
+    client = _async_clients.pop(loop, None)
+    if client is not None:
+        await client.aio.aclose()
+
+
+def close_gemini_clients() -> None:
+    """Close every pooled client and empty the registry (shutdown hook)."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            print(f"⚠️ Failed to close Gemini client: {e}")
+
+
+def _reset_after_fork() -> None:
+    # Sockets inherited from the parent must not be shared with the child.
+    # Drop the references without closing them; the parent still owns them.
+    global _lock
+    _lock = threading.Lock()
+    _clients.clear()
+    _async_clients.clear()
+    _serving_loops.clear()
+
+
+atexit.register(close_gemini_clients)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,225 @@
+import re
+from datetime import datetime
+
+from django.conf import settings
+
+from llm.schema import DailyPlan, DailyTask
+
+# ====================================================================
+# Local slot-filling scheduler
+# ====================================================================
+# Places tasks into the free intervals of a day without calling the model.
+# Fixed tasks (is_flexible=False with a suggested_time) and tasks that
+# already have a time are kept where they are; the remaining tasks are
+# placed first-fit in priority order, with a rest buffer after each block.
+# Everything works in minutes since midnight on small lists, so a typical
+# day is scheduled in well under a millisecond.
+
+PRIORITY_RANK = {
+    "highest": 0, "now": 0,
+    "urgent": 1,
+    "high": 2,
+    "medium": 3,
+    "low": 4, "later": 4,
+    "delegate": 5,
+}
+UNSCHEDULABLE_PRIORITIES = {"remove"}
+
+_TIME_RE = re.compile(r"^\s*(\d{1,2})(?::(\d{2}))?\s*([ap]\.?m\.?)?\s*$", re.IGNORECASE)
+
+
+def _scheduler_options() -> dict:
+    options = {
+        "DAY_START": "08:00",
+        "DAY_END": "22:00",
+        "BUFFER_MINUTES": 10,
+        "DEFAULT_DURATION_MINUTES": 30,
+        "MAX_OVERRIDE_TASKS": 5,
+    }
+    options.update(getattr(settings, "LOCAL_SCHEDULER", {}))
+    return options
+
+
+def parse_time(value: str | None) -> int | None:
+    """'9:30 AM', '14:00' or '3pm' → minutes since midnight; None if unparsable."""
+    if not value:
+        return None
+    match = _TIME_RE.match(value)
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem.lower().startswith("p") else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+def format_time(minutes: int) -> str:
+    """Minutes since midnight → '9:05 AM' (the format save_daily_plan_to_db parses)."""
+    hour, minute = divmod(minutes, 60)
+    return f"{hour % 12 or 12}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+def _free_intervals(busy: list[tuple[int, int]], start: int, end: int) -> list[list[int]]:
+    intervals, cursor = [], start
+    for busy_start, busy_end in sorted(busy):
+        if busy_start > cursor:
+            intervals.append([cursor, min(busy_start, end)])
+        cursor = max(cursor, busy_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        intervals.append([cursor, end])
+    return [iv for iv in intervals if iv[1] > iv[0]]
+
+
+def schedule_tasks(plan: DailyPlan, new_tasks: list[DailyTask] = (), now: datetime | None = None) -> DailyPlan:
+    """
+    Return a copy of `plan` with `new_tasks` added and every untimed task given a
+    suggested_time. Tasks that do not fit are left untimed and listed in `notes`.
+    """
+    options = _scheduler_options()
+    buffer = options["BUFFER_MINUTES"]
+    day_start = parse_time(options["DAY_START"])
+    day_end = parse_time(options["DAY_END"])
+    if now is not None and now.date().isoformat() == plan.date:
+        day_start = max(day_start, now.hour * 60 + now.minute)
+
+    tasks = [task.model_copy() for task in plan.tasks] + [task.model_copy() for task in new_tasks]
+
+    # 🔹 Fixed tasks block their interval (plus rest)
+    busy, pending = [], []
+    for task in tasks:
+        start = parse_time(task.suggested_time)
+        if start is not None and not task.is_flexible:
+            busy.append((start, start + task.estimated_duration_minutes + buffer))
+
+    # 🔹 Timed flexible tasks stay put unless a fixed task now overlaps them
+    for index, task in enumerate(tasks):
+        start = parse_time(task.suggested_time)
+        if start is not None and not task.is_flexible:
+            continue
+        if start is not None:
+            end = start + task.estimated_duration_minutes + buffer
+            if not any(start < busy_end and busy_start < end for busy_start, busy_end in busy):
+                busy.append((start, end))
+                continue
+            task.suggested_time = None
+        if task.priority.lower() not in UNSCHEDULABLE_PRIORITIES:
+            pending.append(index)
+
+    # 🔹 First-fit the rest: most important first, then longest first
+    pending.sort(key=lambda i: (
+        PRIORITY_RANK.get(tasks[i].priority.lower(), 3),
+        -tasks[i].estimated_duration_minutes,
+        i,
+    ))
+    free = _free_intervals(busy, day_start, day_end)
+    unplaced = []
+    for index in pending:
+        task = tasks[index]
+        duration = task.estimated_duration_minutes
+        for interval in free:
+            if interval[1] - interval[0] >= duration:
+                task.suggested_time = format_time(interval[0])
+                interval[0] = min(interval[1], interval[0] + duration + buffer)
+                break
+        else:
+            unplaced.append(task.task_name)
+        free = [iv for iv in free if iv[1] > iv[0]]
+
+    scheduled = sorted(
+        tasks, key=lambda t: (parse_time(t.suggested_time) is None, parse_time(t.suggested_time) or 0)
+    )
+    notes = plan.notes
+    if unplaced:
+        notes = f"{notes}\nCould not fit today: {', '.join(unplaced)}.".strip()
+
+    return plan.model_copy(update={
+        "tasks": scheduled,
+        "total_committed_hours": round(sum(t.estimated_duration_minutes for t in scheduled) / 60, 2),
+        "notes": notes,
+    })
+
+
+# ====================================================================
+# Override parsing
+# ====================================================================
+# Small, structured overrides ("Add a 20 min walk", "Call dentist at 3pm
+# for 15 min, high") are applied locally. Anything else — removals, moves,
+# free-form requests — returns None and goes to the model as before.
+
+_LLM_ONLY_RE = re.compile(
+    r"\b(cancel|remove|delete|move|skip|instead|replace|reschedule|swap|postpone|don't|dont|without)\b",
+    re.IGNORECASE,
+)
+_LINE_RE = re.compile(
+    r"""^(?:[-*•]\s*)?(?:add\s+)?(?:an?\s+)?
+    (?:(?P<lead_dur>\d+)\s*(?P<lead_unit>m|mins?|minutes?|h|hrs?|hours?)\s+)?
+    (?P<name>[^,()]+?)
+    (?:\s+at\s+(?P<time>\d{1,2}(?::\d{2})?\s*(?:[ap]\.?m\.?)?))?
+    (?:(?:\s*(?:for\s|,|\()|\s)\s*(?P<dur>\d+)\s*(?P<unit>m|mins?|minutes?|h|hrs?|hours?)\)?)?
+    (?:\s*[,(]?\s*(?P<priority>highest|urgent|high|medium|low)(?:\s+priority)?\)?)?
+    \s*\.?$""",
+    re.IGNORECASE | re.VERBOSE,
+)
+
+
+def _minutes(amount: str | None, unit: str | None) -> int | None:
+    if amount is None:
+        return None
+    return int(amount) * (60 if unit.lower().startswith("h") else 1)
+
+
+def parse_override_tasks(text: str) -> list[DailyTask] | None:
+    """
+    Parse a short override into new tasks, one per line (or ';').
+    Returns None when the override needs the model.
+    """
+    options = _scheduler_options()
+    lines = [line.strip() for line in re.split(r"[\n;]", text or "") if line.strip()]
+    if not lines or len(lines) > options["MAX_OVERRIDE_TASKS"] or _LLM_ONLY_RE.search(text):
+        return None
+
+    tasks = []
+    for line in lines:
+        match = _LINE_RE.match(line)
+        if not match:
+            return None
+        time_text = match.group("time")
+        if time_text and parse_time(time_text) is None:
+            return None
+        duration = (
+            _minutes(match.group("dur"), match.group("unit"))
+            or _minutes(match.group("lead_dur"), match.group("lead_unit"))
+            or options["DEFAULT_DURATION_MINUTES"]
+        )
+        name = match.group("name").strip()
+        if len(name.split()) > 6:
+            return None  # reads like a request, not a task name
+        tasks.append(DailyTask(
+            task_name=name[:1].upper() + name[1:],
+            description=line,
+            estimated_duration_minutes=duration,
+            priority=(match.group("priority") or "Medium").capitalize(),
+            suggested_time=format_time(parse_time(time_text)) if time_text else None,
+            is_flexible=time_text is None,
+        ))
+    return tasks
+
+
+def reschedule_locally(plan: DailyPlan, override_text: str, now: datetime | None = None) -> DailyPlan | None:
+    """
+    Apply a small override to an existing plan without the model.
+    Tasks already in the plan (same name) are not added twice, so repeating
+    the same override is a no-op. Returns None if the override needs the model.
+    """
+    new_tasks = parse_override_tasks(override_text)
+    if new_tasks is None:
+        return None
+    existing = {task.task_name.casefold() for task in plan.tasks}
+    new_tasks = [task for task in new_tasks if task.task_name.casefold() not in existing]
+    return schedule_tasks(plan, new_tasks, now=now)
@@ -0,0 +1,166 @@
+import hashlib
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from users.models import UserPattern
+
+# ====================================================================
+# Behavioural pattern context
+# ====================================================================
+# Patterns are stored one per row. Near-identical observations bump the
+# existing row instead of adding a new one. Only the WINDOW most recently
+# seen observations are kept as-is; older ones are folded into at most
+# DIGEST_ITEMS digest rows (the most recurring patterns). The prompt gets
+# digest + window, capped at MAX_CHARS, so its size does not grow with
+# account age.
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def _pattern_options() -> dict:
+    options = {
+        "WINDOW": 20,
+        "DIGEST_ITEMS": 10,
+        "COMPACT_SLACK": 10,
+        "SIMILARITY": 0.8,
+        "MAX_CHARS": 2000,
+    }
+    options.update(getattr(settings, "USER_PATTERNS", {}))
+    return options
+
+
+def normalize_pattern(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def pattern_fingerprint(text: str) -> str:
+    return hashlib.sha256(normalize_pattern(text).encode("utf-8")).hexdigest()
+
+
+def _is_similar(a: set[str], b: set[str], threshold: float) -> bool:
+    """Jaccard similarity of the two word sets."""
+    if not a or not b:
+        return False
+    return len(a & b) / len(a | b) >= threshold
+
+
+def _find_match(rows: list[UserPattern], text: str, fingerprint: str, threshold: float) -> UserPattern | None:
+    words = set(normalize_pattern(text).split())
+    for row in rows:
+        if row.fingerprint and row.fingerprint == fingerprint:
+            return row
+    for row in rows:
+        if _is_similar(words, set(normalize_pattern(row.pattern_text).split()), threshold):
+            return row
+    return None
+
+
+def record_patterns(user, patterns: list[str], seen_at=None) -> int:
+    """
+    Merge freshly inferred patterns into the user's stored ones.
+    Returns the number of new rows; duplicates only bump seen_count/last_seen_at.
+    """
+    options = _pattern_options()
+    seen_at = seen_at or timezone.now()
+    created = 0
+
+    with transaction.atomic():
+        observations = list(
+            UserPattern.objects.select_for_update()
+            .filter(user=user, kind=UserPattern.KIND_OBSERVATION)
+            .order_by("-last_seen_at")
+        )
+        for text in patterns:
+            text = text.strip()
+            if not normalize_pattern(text):
+                continue
+            fingerprint = pattern_fingerprint(text)
+            match = _find_match(observations, text, fingerprint, options["SIMILARITY"])
+            if match is not None:
+                UserPattern.objects.filter(pk=match.pk).update(
+                    seen_count=F("seen_count") + 1, last_seen_at=seen_at, updated_at=timezone.now()
+                )
+                continue
+            observations.append(UserPattern.objects.create(
+                user=user,
+                pattern_text=text,
+                fingerprint=fingerprint,
+                last_seen_at=seen_at,
+            ))
+            created += 1
+
+        if len(observations) > options["WINDOW"] + options["COMPACT_SLACK"]:
+            compact_patterns(user)
+    return created
+
+
+def compact_patterns(user) -> int:
+    """
+    Fold observations outside the rolling window into the digest and trim the
+    digest to its most recurring items. Returns the number of rows removed.
+    """
+    options = _pattern_options()
+    removed = 0
+
+    with transaction.atomic():
+        stale = list(
+            UserPattern.objects.select_for_update()
+            .filter(user=user, kind=UserPattern.KIND_OBSERVATION)
+            .order_by("-last_seen_at", "-id")[options["WINDOW"]:]
+        )
+        if stale:
+            digest = list(UserPattern.objects.select_for_update().filter(user=user, kind=UserPattern.KIND_DIGEST))
+            for row in stale:
+                match = _find_match(digest, row.pattern_text, row.fingerprint, options["SIMILARITY"])
+                if match is not None:
+                    match.seen_count += row.seen_count
+                    match.last_seen_at = max(match.last_seen_at, row.last_seen_at)
+                    match.save(update_fields=["seen_count", "last_seen_at", "updated_at"])
+                    row.delete()
+                    removed += 1
+                else:
+                    row.kind = UserPattern.KIND_DIGEST
+                    row.save(update_fields=["kind", "updated_at"])
+                    digest.append(row)
+
+        overflow = (
+            UserPattern.objects.filter(user=user, kind=UserPattern.KIND_DIGEST)
+            .order_by("-seen_count", "-last_seen_at", "-id")
+            .values_list("id", flat=True)[options["DIGEST_ITEMS"]:]
+        )
+        deleted, _ = UserPattern.objects.filter(id__in=list(overflow)).delete()
+        removed += deleted
+    return removed
+
+
+def pattern_context(user) -> list[str]:
+    """
+    Pattern lines for the planner prompt: the digest (most recurring first),
+    then the rolling window (most recent first), within MAX_CHARS.
+    """
+    options = _pattern_options()
+    digest = UserPattern.objects.filter(user=user, kind=UserPattern.KIND_DIGEST).order_by(
+        "-seen_count", "-last_seen_at", "-id"
+    )[:options["DIGEST_ITEMS"]]
+    window = UserPattern.objects.filter(user=user, kind=UserPattern.KIND_OBSERVATION).order_by(
+        "-last_seen_at", "-id"
+    )[:options["WINDOW"]]
+
+    lines, used = [], 0
+    for text in [*digest.values_list("pattern_text", flat=True), *window.values_list("pattern_text", flat=True)]:
+        if used + len(text) > options["MAX_CHARS"]:
+            break
+        lines.append(text)
+        used += len(text)
+    return lines
+
+
+async def apattern_context(user) -> list[str]:
+    """Async variant of pattern_context(), run in a sync thread."""
+    return await sync_to_async(pattern_context)(user)
@@ -0,0 +1,67 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+from core.models import Prompt
+from llm.schema import DAILY_PLAN_SCHEMA_VERSION, DailyPlan
+
+# ====================================================================
+# Pre-encoded plan payloads
+# ====================================================================
+# A plan is validated and encoded once, when it is stored. Cache hits send
+# Prompt.response_json as-is instead of model_validate → model_dump →
+# json.dumps on every request. Rows encoded under an older
+# DAILY_PLAN_SCHEMA_VERSION (or before payloads existed) are re-validated
+# once and rewritten.
+
+
+def encode_plan(plan: DailyPlan) -> str:
+    # Same encoder and separators as JsonResponse, so cached and fresh bodies are identical
+    return json.dumps(plan.model_dump(), cls=DjangoJSONEncoder)
+
+
+def _is_current(prompt: Prompt) -> bool:
+    return prompt.response_json is not None and prompt.schema_version == DAILY_PLAN_SCHEMA_VERSION
+
+
+def _revalidate(prompt: Prompt) -> str | None:
+    if prompt.llm_response is None:
+        return None
+    try:
+        plan = DailyPlan.model_validate(prompt.llm_response)
+    except Exception as e:
+        print(f"⚠️ Failed to load cached summary: {e}")
+        return None
+    prompt.llm_response = plan.model_dump()
+    prompt.response_json = encode_plan(plan)
+    prompt.schema_version = DAILY_PLAN_SCHEMA_VERSION
+    prompt.save(update_fields=["llm_response", "response_json", "schema_version"])
+    return prompt.response_json
+
+
+def plan_payload(prompt: Prompt) -> str | None:
+    """JSON body for a cached plan row; None if it has no (valid) plan."""
+    if _is_current(prompt):
+        return prompt.response_json
+    return _revalidate(prompt)
+
+
+async def aplan_payload(prompt: Prompt) -> str | None:
+    if _is_current(prompt):
+        return prompt.response_json
+    return await sync_to_async(_revalidate)(prompt)
+
+
+def plan_etag(hash_key: str) -> str:
+    """Strong ETag for the plan stored on the Prompt row with this hash."""
+    return f'"{hash_key}-v{DAILY_PLAN_SCHEMA_VERSION}"'
+
+
+def plan_response(payload: str, etag: str | None = None) -> HttpResponse:
+    """Send an already-encoded plan without decoding it again."""
+    response = HttpResponse(payload, content_type="application/json")
+    if etag:
+        response["ETag"] = etag
+    return response
@@ -0,0 +1,90 @@
+import json
+from pydantic import ValidationError
+
+from llm.schema import DailyTask
+
+
+class DailyTaskStreamParser:
+    """
+    Incrementally pull complete DailyTask objects out of a streamed DailyPlan JSON.
+
+    Feed raw text chunks as they arrive from the model; each call returns the
+    tasks whose objects closed inside the `tasks` array since the last call.
+    Only the unread tail of the buffer is scanned, so total work is linear.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0              # next character to scan
+        self._in_tasks = False     # inside the "tasks": [ ... ] array
+        self._done = False         # tasks array closed
+        self._depth = 0            # object/array depth relative to the tasks array
+        self._in_string = False
+        self._escaped = False
+        self._task_start = None
+
+    def feed(self, chunk: str) -> list[DailyTask]:
+        self.buffer += chunk
+        if self._done:
+            return []
+        if not self._in_tasks and not self._find_tasks_array():
+            return []
+        return self._scan()
+
+    def _find_tasks_array(self) -> bool:
+        key = self.buffer.find('"tasks"')
+        while key > 0 and self.buffer[key - 1] == "\\":
+            # Escaped quote inside another string value, not the key
+            key = self.buffer.find('"tasks"', key + 1)
+        if key == -1:
+            return False
+        bracket = self.buffer.find("[", key)
+        if bracket == -1:
+            return False
+        self._in_tasks = True
+        self._pos = bracket + 1
+        return True
+
+    def _scan(self) -> list[DailyTask]:
+        tasks = []
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0 and ch == "{":
+                    self._task_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    # Closing bracket of the tasks array itself
+                    self._done = True
+                    self._pos = i + 1
+                    return tasks
+                self._depth -= 1
+                if self._depth == 0 and ch == "}" and self._task_start is not None:
+                    task = self._parse_task(buf[self._task_start:i + 1])
+                    if task is not None:
+                        tasks.append(task)
+                    self._task_start = None
+        self._pos = len(buf)
+        return tasks
+
+    @staticmethod
+    def _parse_task(raw: str) -> DailyTask | None:
+        try:
+            return DailyTask.model_validate(json.loads(raw))
+        except (json.JSONDecodeError, ValidationError) as e:
+            # Skip it here; the full plan is still validated once the stream ends
+            print(f"⚠️ Skipping unparsable streamed task: {e}")
+            return None
@@ -1,5 +1,19 @@
+import asyncio
 import hashlib
+import json
+import re
+import time
+from collections.abc import Callable
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
 from core.models import Prompt
+from llm.backends import LLMTimeout
+from llm.services.resilience import generation_budget_seconds
+from llm.services.prompt_store import prompt_store
 
 
 def _compute_prompt_hash(prompt_type: str, prompt_text: str, scope: str | None = None, ignore_time: bool = False) -> str:
@@ -8,6 +22,41 @@ def _compute_prompt_hash(prompt_type: str, prompt_text: str, scope: str | None =
     return hashlib.sha256(base).hexdigest()
 
 
+def _prompt_cache_key(prompt_text: str, prompt_type: str, scope: str | None = None, ignore_time: bool = False) -> str:
+    """
+    Internal: hash key for a prompt.
+    ignore_time: If True, removes any timestamps from prompt text before hashing.
+    """
+    text_to_hash = prompt_text
+    if ignore_time:
+        # Strip or normalize current time from prompt (labels as emitted by llm/prompts/*)
+        text_to_hash = _TIME_LINE_RE.sub(lambda m: f"{m.group(1)} <ignored>", text_to_hash)
+    return _compute_prompt_hash(prompt_type, text_to_hash, scope)
+
+
+_TIME_LINE_RE = re.compile(
+    r"((?:Current time|Approx(?:imate|\.)? remaining hours today|Total Available Hours)\W*:\W*).*",
+    re.IGNORECASE,
+)
+
+
+def structured_prompt_key(prompt_type: str, inputs: dict, template_version: int, scope: str | None = None) -> str:
+    """
+    Hash key from the structured inputs a prompt is rendered from, instead of the
+    rendered text. Inputs are canonicalized (sorted keys, compact separators), so
+    equal inputs give equal keys and nothing time-of-day dependent leaks in.
+    """
+    canonical = json.dumps(inputs, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return _compute_prompt_hash(prompt_type, f"v{template_version}::{canonical}", scope)
+
+
+def _user_scope(user, scope: str | None) -> str | None:
+    """Internal: prompt rows are owned per user, so key them per user unless a scope is given."""
+    if scope is None and user is not None:
+        return f"user:{user.pk}"
+    return scope
+
+
 def get_or_create_prompt_cache(user, prompt_text: str, prompt_type: str, scope: str | None = None, ignore_time: bool = False) -> tuple[Prompt, bool]:
     """
     Unified abstraction for caching LLM prompts and responses.
@@ -16,31 +65,209 @@ def get_or_create_prompt_cache(user, prompt_text: str, prompt_type: str, scope:
     - exact-match retrieval
     - creation of empty cache records if not found
     """
+    hash_key = _prompt_cache_key(prompt_text, prompt_type, _user_scope(user, scope), ignore_time)
+    return _get_or_create(hash_key, user, prompt_type, lambda: prompt_text)
+
+
+async def aget_or_create_prompt_cache(user, prompt_text: str, prompt_type: str, scope: str | None = None, ignore_time: bool = False) -> tuple[Prompt, bool]:
+    """Async variant of get_or_create_prompt_cache() using the async ORM."""
+    hash_key = _prompt_cache_key(prompt_text, prompt_type, _user_scope(user, scope), ignore_time)
+    return await _aget_or_create(hash_key, user, prompt_type, lambda: prompt_text)
+
+
+def lookup_prompt(hash_key: str, user=None) -> Prompt | None:
     """
-    ignore_time: If True, removes any timestamps from prompt text before hashing.
+    Read a Prompt by hash through the in-process and shared cache tiers, then the table.
+    With `user`, only a row owned by that user is returned.
     """
-    text_to_hash = prompt_text
-    if ignore_time:
-        # Strip or normalize current time from prompt
-        import re
-        text_to_hash = re.sub(r"Current Time:.*", "Current Time: <ignored>", text_to_hash)
-        text_to_hash = re.sub(r"Date:.*", "Date: <ignored>", text_to_hash)
-        text_to_hash = re.sub(r"Approx. Remaining Hours Today:.*", "Approx. Remaining Hours Today: <ignored>", text_to_hash)
-    hash_key = _compute_prompt_hash(prompt_type, text_to_hash, scope)
-
-    cached_prompt, created = Prompt.objects.get_or_create(
-        user=user,
-        hash=hash_key,
-        type=prompt_type,
-        defaults={
-            "text": prompt_text,
-            "llm_response": None,
-            "is_refined": False,
-        },
+    prompt = prompt_store.get(hash_key)
+    if prompt is not None and (user is None or prompt.user_id == user.pk):
+        return prompt
+    queryset = Prompt.objects.filter(hash=hash_key)
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    prompt = queryset.first()
+    if prompt is not None:
+        prompt_store.put(prompt)
+    return prompt
+
+
+async def _alookup(hash_key: str) -> Prompt | None:
+    prompt = await prompt_store.aget(hash_key)
+    if prompt is None:
+        prompt = await Prompt.objects.filter(hash=hash_key).afirst()
+        if prompt is not None:
+            await prompt_store.aput(prompt)
+    return prompt
+
+
+def _get_or_create(hash_key: str, user, prompt_type: str, render: Callable[[], str]) -> tuple[Prompt, bool]:
+    """
+    Internal: cached lookup by hash, else create the row with `render()` as its text.
+    Hits only count used_count in memory (flushed in batches), so they do no writes.
+    """
+    cached_prompt = lookup_prompt(hash_key)
+    if cached_prompt is None:
+        # Create by the unique hash alone so concurrent inserts resolve to the same row
+        cached_prompt, created = Prompt.objects.get_or_create(
+            hash=hash_key,
+            defaults={
+                "user": user,
+                "type": prompt_type,
+                "text": render(),
+                "llm_response": None,
+                "is_refined": False,
+            },
+        )
+        prompt_store.put(cached_prompt)
+        if created:
+            return cached_prompt, True
+    prompt_store.record_hit(cached_prompt)
+    return cached_prompt, False
+
+
+async def _aget_or_create(hash_key: str, user, prompt_type: str, render: Callable[[], str]) -> tuple[Prompt, bool]:
+    cached_prompt = await _alookup(hash_key)
+    if cached_prompt is None:
+        cached_prompt, created = await Prompt.objects.aget_or_create(
+            hash=hash_key,
+            defaults={
+                "user": user,
+                "type": prompt_type,
+                "text": render(),
+                "llm_response": None,
+                "is_refined": False,
+            },
+        )
+        await prompt_store.aput(cached_prompt)
+        if created:
+            return cached_prompt, True
+    prompt_store.record_hit(cached_prompt)
+    return cached_prompt, False
+
+
+def get_or_create_structured_prompt(user, prompt_type: str, inputs: dict, render: Callable[[], str],
+                                    template_version: int, scope: str | None = None) -> tuple[Prompt, bool]:
+    """
+    Like get_or_create_prompt_cache(), keyed by structured_prompt_key().
+    `render()` builds the prompt text and is only called on a miss; on a hit the
+    stored row (with its text) is returned without any prompt rendering.
+    """
+    hash_key = structured_prompt_key(prompt_type, inputs, template_version, _user_scope(user, scope))
+    return _get_or_create(hash_key, user, prompt_type, render)
+
+
+async def aget_or_create_structured_prompt(user, prompt_type: str, inputs: dict, render: Callable[[], str],
+                                           template_version: int, scope: str | None = None) -> tuple[Prompt, bool]:
+    """Async variant of get_or_create_structured_prompt()."""
+    hash_key = structured_prompt_key(prompt_type, inputs, template_version, _user_scope(user, scope))
+    return await _aget_or_create(hash_key, user, prompt_type, render)
+
+
+# ====================================================================
+# Single-flight generation
+# ====================================================================
+# Concurrent requests for the same prompt hash share one LLM call: the
+# first to take the row's generation lease calls the model, the others
+# poll the row until `llm_response` is filled in. The lease expires so a
+# crashed worker cannot block the hash forever.
+#
+# Waiters must outlast the leader's worst case (see generation_budget_seconds),
+# and the lease must outlast the waiters, so both default to that budget plus
+# a margin rather than fixed numbers that drift from LLM_RESILIENCE.
+
+# Extra seconds on top of the generation budget: parsing, saving, polling jitter
+SINGLE_FLIGHT_MARGIN_SECONDS = 10
+
+
+class GenerationWaitTimeout(LLMTimeout, TimeoutError):
+    """Gave up waiting for another request's generation of the same prompt (504)."""
+
+
+def _single_flight_options() -> dict:
+    options = {
+        "LEASE_SECONDS": None,
+        "WAIT_SECONDS": None,
+        "POLL_INTERVAL": 0.25,
+    }
+    options.update(getattr(settings, "PROMPT_SINGLE_FLIGHT", {}))
+    budget = generation_budget_seconds()
+    if options["WAIT_SECONDS"] is None:
+        options["WAIT_SECONDS"] = budget + SINGLE_FLIGHT_MARGIN_SECONDS
+    if options["LEASE_SECONDS"] is None:
+        options["LEASE_SECONDS"] = budget + 2 * SINGLE_FLIGHT_MARGIN_SECONDS
+    return options
+
+
+def _claim_queryset(prompt: Prompt):
+    now = timezone.now()
+    return Prompt.objects.filter(pk=prompt.pk, llm_response__isnull=True).filter(
+        Q(generation_lease_until__isnull=True) | Q(generation_lease_until__lt=now)
     )
 
-    if not created:
-        cached_prompt.used_count += 1
-        cached_prompt.save(update_fields=["used_count"])
 
-    return cached_prompt, created
+def _lease_until():
+    return timezone.now() + timedelta(seconds=_single_flight_options()["LEASE_SECONDS"])
+
+
+def acquire_generation(prompt: Prompt) -> bool:
+    """
+    Block until the caller either owns the generation lease for this prompt (True)
+    or another worker has stored the response on it (False; `prompt` is refreshed).
+    """
+    options = _single_flight_options()
+    deadline = time.monotonic() + options["WAIT_SECONDS"]
+    while True:
+        if _claim_queryset(prompt).update(generation_lease_until=_lease_until()):
+            return True
+        prompt.refresh_from_db(fields=["llm_response", "response_json", "schema_version", "generation_lease_until"])
+        if prompt.llm_response is not None:
+            return False
+        if time.monotonic() > deadline:
+            raise GenerationWaitTimeout("Timed out waiting for an in-flight generation of this prompt")
+        time.sleep(options["POLL_INTERVAL"])
+
+
+async def aacquire_generation(prompt: Prompt) -> bool:
+    """Async variant of acquire_generation()."""
+    options = _single_flight_options()
+    deadline = time.monotonic() + options["WAIT_SECONDS"]
+    while True:
+        if await _claim_queryset(prompt).aupdate(generation_lease_until=_lease_until()):
+            return True
+        await prompt.arefresh_from_db(fields=["llm_response", "response_json", "schema_version", "generation_lease_until"])
+        if prompt.llm_response is not None:
+            return False
+        if time.monotonic() > deadline:
+            raise GenerationWaitTimeout("Timed out waiting for an in-flight generation of this prompt")
+        await asyncio.sleep(options["POLL_INTERVAL"])
+
+
+def complete_generation(prompt: Prompt, llm_response, response_json: str | None = None, schema_version: int = 0) -> None:
+    """
+    Store the response and release the lease in one write; waiters pick it up.
+    `response_json` is the pre-encoded response to serve on later hits.
+    """
+    prompt.llm_response = llm_response
+    prompt.response_json = response_json
+    prompt.schema_version = schema_version
+    prompt.generation_lease_until = None
+    prompt.save(update_fields=["llm_response", "response_json", "schema_version", "generation_lease_until"])
+
+
+async def acomplete_generation(prompt: Prompt, llm_response, response_json: str | None = None,
+                               schema_version: int = 0) -> None:
+    prompt.llm_response = llm_response
+    prompt.response_json = response_json
+    prompt.schema_version = schema_version
+    prompt.generation_lease_until = None
+    await prompt.asave(update_fields=["llm_response", "response_json", "schema_version", "generation_lease_until"])
+
+
+def release_generation(prompt: Prompt) -> None:
+    """Drop the lease after a failed generation so a waiter can take over."""
+    Prompt.objects.filter(pk=prompt.pk).update(generation_lease_until=None)
+
+
+async def arelease_generation(prompt: Prompt) -> None:
+    await Prompt.objects.filter(pk=prompt.pk).aupdate(generation_lease_until=None)
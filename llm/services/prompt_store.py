@@ -0,0 +1,247 @@
+import atexit
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from core.models import Prompt
+
+# ====================================================================
+# Read-through prompt cache tiers
+# ====================================================================
+# L1: bounded in-process LRU with a short TTL.
+# L2: a Django cache backend shared by all workers (PROMPT_CACHE["CACHE_ALIAS"]).
+# L3: the Prompt table.
+#
+# Rows are only cached after their transaction commits. Updating or deleting
+# a Prompt deletes its L2 entry only; an L1 entry older than
+# GENERATION_CHECK_SECONDS is re-read from L2 on its next hit (and dropped if
+# L2 no longer has it), so one hot row changing leaves every other L1 entry
+# alone. invalidate_all() bumps a shared generation number that drops every
+# process's whole L1, for bulk writes that bypass the model signals. Hits
+# bump used_count in memory only; the counts are written in batches.
+#
+# When CACHE_ALIAS is a local-memory backend, L2 is private to the process
+# too and invalidations never reach other workers, so its entries live no
+# longer than L1's.
+
+_FIELDS = [f.attname for f in Prompt._meta.concrete_fields]
+_GENERATION_KEY = "prompt-cache:generation"
+
+
+def _store_options() -> dict:
+    options = {
+        "CACHE_ALIAS": "default",
+        "L1_MAX_ENTRIES": 1024,
+        "L1_TTL_SECONDS": 30,
+        "L2_TTL_SECONDS": 3600,
+        "GENERATION_CHECK_SECONDS": 1.0,
+        "HIT_FLUSH_SIZE": 100,
+        "HIT_FLUSH_SECONDS": 5,
+    }
+    options.update(getattr(settings, "PROMPT_CACHE", {}))
+    return options
+
+
+def _l2_key(hash_key: str) -> str:
+    return f"prompt-cache:{hash_key}"
+
+
+def _to_entry(prompt: Prompt) -> tuple:
+    return tuple(getattr(prompt, name) for name in _FIELDS)
+
+
+def _from_entry(entry: tuple) -> Prompt:
+    # A fresh instance per hit, so callers can mutate/save it safely
+    return Prompt.from_db("default", _FIELDS, entry)
+
+
+class PromptStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # hash -> (expires_at, checked_at, entry)
+        self._l1: OrderedDict[str, tuple[float, float, tuple]] = OrderedDict()
+        self._generation = None
+        self._checked_at = 0.0
+        self._hits: Counter[int] = Counter()
+        self._hits_since = 0.0
+
+    @property
+    def _l2(self):
+        return caches[_store_options()["CACHE_ALIAS"]]
+
+    def _l2_ttl(self, options) -> float:
+        if isinstance(self._l2, LocMemCache):
+            return min(options["L2_TTL_SECONDS"], options["L1_TTL_SECONDS"])
+        return options["L2_TTL_SECONDS"]
+
+    # ---------- generation (cross-process invalidation) ----------
+
+    def _sync_generation(self, options) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < options["GENERATION_CHECK_SECONDS"]:
+            return
+        generation = self._l2.get(_GENERATION_KEY, 0)
+        with self._lock:
+            self._checked_at = now
+            if generation != self._generation:
+                self._l1.clear()
+                self._generation = generation
+
+    def _bump_generation(self) -> None:
+        try:
+            self._l2.incr(_GENERATION_KEY)
+        except ValueError:
+            self._l2.add(_GENERATION_KEY, 1, timeout=None)
+
+    # ---------- lookups ----------
+
+    def _l1_get(self, hash_key: str, options) -> tuple | None:
+        """The L1 entry, or None if absent, expired or due to be re-checked against L2."""
+        self._sync_generation(options)
+        now = time.monotonic()
+        with self._lock:
+            item = self._l1.get(hash_key)
+            if item is None:
+                return None
+            expires_at, checked_at, entry = item
+            if expires_at < now:
+                del self._l1[hash_key]
+                return None
+            if now - checked_at >= options["GENERATION_CHECK_SECONDS"]:
+                return None
+            self._l1.move_to_end(hash_key)
+            return entry
+
+    def _l1_put(self, hash_key: str, entry: tuple, options) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._l1[hash_key] = (now + options["L1_TTL_SECONDS"], now, entry)
+            self._l1.move_to_end(hash_key)
+            while len(self._l1) > options["L1_MAX_ENTRIES"]:
+                self._l1.popitem(last=False)
+
+    def get(self, hash_key: str) -> Prompt | None:
+        """L1, then L2. None means the caller should read the Prompt table."""
+        options = _store_options()
+        entry = self._l1_get(hash_key, options)
+        if entry is None:
+            entry = self._l2.get(_l2_key(hash_key))
+            if entry is None:
+                self.discard(hash_key)
+                return None
+            self._l1_put(hash_key, entry, options)
+        return _from_entry(entry)
+
+    async def aget(self, hash_key: str) -> Prompt | None:
+        options = _store_options()
+        entry = self._l1_get(hash_key, options)
+        if entry is None:
+            entry = await self._l2.aget(_l2_key(hash_key))
+            if entry is None:
+                self.discard(hash_key)
+                return None
+            self._l1_put(hash_key, entry, options)
+        return _from_entry(entry)
+
+    def put(self, prompt: Prompt) -> None:
+        """Cache `prompt` in both tiers once the current transaction commits."""
+        entry = _to_entry(prompt)
+
+        def store():
+            options = _store_options()
+            self._l1_put(prompt.hash, entry, options)
+            self._l2.set(_l2_key(prompt.hash), entry, timeout=self._l2_ttl(options))
+
+        transaction.on_commit(store)
+
+    async def aput(self, prompt: Prompt) -> None:
+        # on_commit needs the (sync-only) connection state
+        await sync_to_async(self.put)(prompt)
+
+    def discard(self, hash_key: str) -> None:
+        """Drop the L1 entry in this process only."""
+        with self._lock:
+            self._l1.pop(hash_key, None)
+
+    def invalidate(self, hash_key: str) -> None:
+        """Drop one row: L1 here, L2 for everyone (other L1s notice on their next check)."""
+        self.discard(hash_key)
+        self._l2.delete(_l2_key(hash_key))
+
+    def invalidate_all(self) -> None:
+        """Drop every process's L1 (after bulk writes that skip the Prompt signals)."""
+        with self._lock:
+            self._l1.clear()
+        self._bump_generation()
+
+    def clear(self) -> None:
+        """Drop this process's L1 and pending hit counts (L2 is left alone)."""
+        with self._lock:
+            self._l1.clear()
+            self._hits.clear()
+            self._generation = None
+            self._checked_at = 0.0
+
+    # ---------- batched used_count ----------
+
+    def record_hit(self, prompt: Prompt) -> None:
+        with self._lock:
+            if not self._hits:
+                self._hits_since = time.monotonic()
+            self._hits[prompt.pk] += 1
+        prompt.used_count += 1
+
+    def flush_hits(self) -> int:
+        """Write pending used_count/last_used_at: one UPDATE per distinct increment."""
+        with self._lock:
+            hits, self._hits = self._hits, Counter()
+        by_increment: dict[int, list[int]] = {}
+        for pk, count in hits.items():
+            by_increment.setdefault(count, []).append(pk)
+        now = timezone.now()
+        try:
+            for increment, pks in by_increment.items():
+                Prompt.objects.filter(pk__in=pks).update(used_count=F("used_count") + increment, last_used_at=now)
+        except Exception as e:
+            print(f"⚠️ Dropped prompt hit counts: {e}")
+            return 0
+        return len(hits)
+
+    def flush_hits_if_due(self) -> int:
+        options = _store_options()
+        with self._lock:
+            due = bool(self._hits) and (
+                len(self._hits) >= options["HIT_FLUSH_SIZE"]
+                or time.monotonic() - self._hits_since >= options["HIT_FLUSH_SECONDS"]
+            )
+        return self.flush_hits() if due else 0
+
+
+prompt_store = PromptStore()
+
+
+def _invalidate_prompt(sender, instance, created=False, **kwargs) -> None:
+    if created:
+        return  # nothing can be cached for a row that did not exist
+    prompt_store.discard(instance.hash)
+    transaction.on_commit(lambda: prompt_store.invalidate(instance.hash))
+
+
+def _flush_after_request(sender, **kwargs) -> None:
+    prompt_store.flush_hits_if_due()
+
+
+post_save.connect(_invalidate_prompt, sender=Prompt, dispatch_uid="prompt_store_invalidate_save")
+post_delete.connect(_invalidate_prompt, sender=Prompt, dispatch_uid="prompt_store_invalidate_delete")
+request_finished.connect(_flush_after_request, dispatch_uid="prompt_store_flush_hits")
+atexit.register(prompt_store.flush_hits)
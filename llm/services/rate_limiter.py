@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from llm.models import RateLimitBucket
+
+
+class RateLimitExceeded(Exception):
+    """Raised when LLM quota cannot be granted before the deadline."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f"LLM rate limit reached, retry after {self.retry_after}s")
+
+
+class _Conflict(Exception):
+    """Internal: another process updated a bucket between our read and write."""
+
+
+# Callers currently sleeping in this process; bounds the local wait queue
+_waiting = 0
+_waiting_lock = threading.Lock()
+
+
+def _limit_options() -> dict:
+    options = {
+        "REQUESTS_PER_MINUTE": 60,
+        "TOKENS_PER_MINUTE": 250_000,
+        "USER_REQUESTS_PER_MINUTE": 6,
+        "EST_OUTPUT_TOKENS": 2_000,
+        "MAX_WAIT_SECONDS": 10,
+        "MAX_WAITERS": 50,
+    }
+    options.update(getattr(settings, "LLM_RATE_LIMIT", {}))
+    return options
+
+
+def estimate_tokens(prompt_text: str) -> int:
+    """Rough input+output token estimate (~4 characters per token)."""
+    return len(prompt_text) // 4 + _limit_options()["EST_OUTPUT_TOKENS"]
+
+
+def _bucket_specs(user, prompt_text: str) -> dict[str, tuple[float, float]]:
+    """Map bucket key → (capacity per minute, cost of this call). Zero/None limits are disabled."""
+    options = _limit_options()
+    specs = {
+        "global:requests": (options["REQUESTS_PER_MINUTE"], 1),
+        "global:tokens": (options["TOKENS_PER_MINUTE"], estimate_tokens(prompt_text)),
+    }
+    if user is not None:
+        specs[f"user:{user.pk}:requests"] = (options["USER_REQUESTS_PER_MINUTE"], 1)
+    return {key: spec for key, spec in specs.items() if spec[0]}
+
+
+def _try_acquire(specs: dict[str, tuple[float, float]]) -> float:
+    """
+    Take the cost from every bucket, all or nothing.
+    Returns 0 on success, otherwise the seconds until all buckets could cover it.
+    """
+    now = time.time()
+    with transaction.atomic():
+        buckets = {b.key: b for b in RateLimitBucket.objects.filter(key__in=specs)}
+        missing = [
+            RateLimitBucket(key=key, tokens=capacity, refilled_at=now)
+            for key, (capacity, _) in specs.items() if key not in buckets
+        ]
+        if missing:
+            RateLimitBucket.objects.bulk_create(missing, ignore_conflicts=True)
+            buckets = {b.key: b for b in RateLimitBucket.objects.filter(key__in=specs)}
+
+        wait = 0.0
+        levels = {}
+        for key, (capacity, cost) in specs.items():
+            bucket = buckets[key]
+            rate = capacity / 60
+            cost = min(cost, capacity)  # a single oversized call must still fit eventually
+            level = min(capacity, bucket.tokens + (now - bucket.refilled_at) * rate)
+            if level < cost:
+                wait = max(wait, (cost - level) / rate)
+            levels[key] = level - cost
+        if wait:
+            return wait
+
+        for key, level in levels.items():
+            bucket = buckets[key]
+            updated = RateLimitBucket.objects.filter(key=key, version=bucket.version).update(
+                tokens=level, refilled_at=now, version=F("version") + 1
+            )
+            if not updated:
+                raise _Conflict
+    return 0.0
+
+
+def _enter_queue(options) -> None:
+    global _waiting
+    with _waiting_lock:
+        if _waiting >= options["MAX_WAITERS"]:
+            raise RateLimitExceeded(1)
+        _waiting += 1
+
+
+def _leave_queue() -> None:
+    global _waiting
+    with _waiting_lock:
+        _waiting -= 1
+
+
+def acquire_llm_quota(user, prompt_text: str) -> None:
+    """
+    Wait (up to MAX_WAIT_SECONDS) for global and per-user LLM budget, shared by all workers.
+    Raises RateLimitExceeded with a Retry-After hint when the budget will not free up in time.
+    """
+    options = _limit_options()
+    specs = _bucket_specs(user, prompt_text)
+    deadline = time.monotonic() + options["MAX_WAIT_SECONDS"]
+    queued = False
+    try:
+        while True:
+            try:
+                wait = _try_acquire(specs)
+            except _Conflict:
+                # Lost a race for a bucket; retry, but not past the wait budget
+                if time.monotonic() >= deadline:
+                    raise RateLimitExceeded(1)
+                continue
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(wait)
+            if not queued:
+                _enter_queue(options)
+                queued = True
+            time.sleep(wait)
+    finally:
+        if queued:
+            _leave_queue()
+
+
+async def aacquire_llm_quota(user, prompt_text: str) -> None:
+    """Async variant of acquire_llm_quota(); sleeps without blocking the event loop."""
+    options = _limit_options()
+    specs = _bucket_specs(user, prompt_text)
+    deadline = time.monotonic() + options["MAX_WAIT_SECONDS"]
+    queued = False
+    try:
+        while True:
+            try:
+                wait = await sync_to_async(_try_acquire)(specs)
+            except _Conflict:
+                # Lost a race for a bucket; retry, but not past the wait budget
+                if time.monotonic() >= deadline:
+                    raise RateLimitExceeded(1)
+                continue
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                raise RateLimitExceeded(wait)
+            if not queued:
+                _enter_queue(options)
+                queued = True
+            await asyncio.sleep(wait)
+    finally:
+        if queued:
+            _leave_queue()
@@ -0,0 +1,436 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+from django.conf import settings
+from pydantic import BaseModel, ValidationError
+
+from llm.backends import CircuitOpenError, InvalidLLMResponse, LLMBackend, LLMError, LLMTimeout
+from llm.services.rate_limiter import RateLimitExceeded, _limit_options, acquire_llm_quota, aacquire_llm_quota
+from llm.services.usage_ledger import record_llm_call
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def _resilience_options() -> dict:
+    options = {
+        "TIMEOUT_SECONDS": 30,
+        "MAX_RETRIES": 2,
+        "BACKOFF_BASE_SECONDS": 0.5,
+        "BACKOFF_MAX_SECONDS": 8,
+        "HEDGE": False,
+        "HEDGE_MIN_SECONDS": 2.0,
+        "HEDGE_PERCENTILE": 0.95,
+        "BREAKER_FAILURE_THRESHOLD": 5,
+        "BREAKER_RESET_SECONDS": 30,
+    }
+    options.update(getattr(settings, "LLM_RESILIENCE", {}))
+    return options
+
+
+# ====================================================================
+# Circuit breaker + counters (per process)
+# ====================================================================
+
+class CircuitBreaker:
+    """
+    Classic closed → open → half-open breaker.
+    Opens after `failure_threshold` consecutive failed attempts, rejects calls for
+    `reset_seconds`, then lets a single trial call through to decide.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def before_call(self) -> None:
+        options = _resilience_options()
+        with self._lock:
+            if self.state == "closed":
+                return
+            elapsed = time.monotonic() - self.opened_at
+            if self.state == "open" and elapsed >= options["BREAKER_RESET_SECONDS"]:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            stats.incr("short_circuits")
+            raise CircuitOpenError(max(0.0, options["BREAKER_RESET_SECONDS"] - elapsed))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= _resilience_options()["BREAKER_FAILURE_THRESHOLD"]:
+                if self.state != "open":
+                    stats.incr("breaker_trips")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Free a half-open trial slot without judging the provider."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures}
+
+
+class CallStats:
+    """Thread-safe counters and a window of recent latencies (for the hedge threshold)."""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self.counters: dict[str, int] = {}
+        self.latencies: deque[float] = deque(maxlen=window)
+
+    def incr(self, name: str, by: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + by
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        with self._lock:
+            if len(self.latencies) < 20:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.latencies.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+
+breaker = CircuitBreaker()
+stats = CallStats()
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-call")
+
+
+def llm_status() -> dict:
+    """Breaker state, counters and latency percentile for health checks/admin."""
+    p95 = stats.percentile(0.95)
+    return {
+        "breaker": breaker.snapshot(),
+        "counters": stats.snapshot(),
+        "p95_latency_seconds": round(p95, 3) if p95 is not None else None,
+    }
+
+
+# ====================================================================
+# Helpers
+# ====================================================================
+
+def parse_llm_response(text: str, schema: type[BaseModel]) -> BaseModel:
+    try:
+        return schema.model_validate(json.loads(text))
+    except (json.JSONDecodeError, ValidationError, TypeError) as e:
+        raise InvalidLLMResponse(f"LLM returned invalid response: {e}")
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (CircuitOpenError, RateLimitExceeded)):
+        return False
+    if isinstance(exc, (LLMError, httpx.TimeoutException, httpx.TransportError)):
+        return True
+    return getattr(exc, "code", None) in RETRYABLE_STATUS_CODES
+
+
+def generation_budget_seconds() -> float:
+    """
+    Longest a guarded call_llm()/acall_llm() can take: every attempt timing out,
+    the longest backoff between them, and the full wait for rate-limit quota.
+    """
+    options = _resilience_options()
+    attempts = options["MAX_RETRIES"] + 1
+    backoff = sum(
+        min(options["BACKOFF_MAX_SECONDS"], options["BACKOFF_BASE_SECONDS"] * 2 ** attempt)
+        for attempt in range(options["MAX_RETRIES"])
+    )
+    return attempts * options["TIMEOUT_SECONDS"] + backoff + _limit_options()["MAX_WAIT_SECONDS"]
+
+
+def _backoff(attempt: int, options: dict) -> float:
+    delay = min(options["BACKOFF_MAX_SECONDS"], options["BACKOFF_BASE_SECONDS"] * 2 ** attempt)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _hedge_delay(options: dict) -> float | None:
+    if not options["HEDGE"]:
+        return None
+    p = stats.percentile(options["HEDGE_PERCENTILE"])
+    return max(options["HEDGE_MIN_SECONDS"], p or 0.0)
+
+
+def _ledger_outcome(exc: BaseException | None) -> str:
+    if exc is None:
+        return "ok"
+    if isinstance(exc, InvalidLLMResponse):
+        return "invalid"
+    if isinstance(exc, (LLMTimeout, httpx.TimeoutException)):
+        return "timeout"
+    if isinstance(exc, RateLimitExceeded):
+        return "rate_limited"
+    if isinstance(exc, CircuitOpenError):
+        return "short_circuit"
+    return "error"
+
+
+def _record_call(backend: LLMBackend, user, prompt_type: str, started: float, exc: BaseException | None = None,
+                 response=None) -> None:
+    """Append one attempt to the usage ledger (buffered, no query here)."""
+    record_llm_call(
+        user,
+        prompt_type,
+        _ledger_outcome(exc),
+        model=getattr(response, "model", None) or backend.model,
+        latency_seconds=time.monotonic() - started,
+        input_tokens=getattr(response, "input_tokens", None),
+        output_tokens=getattr(response, "output_tokens", None),
+    )
+
+
+def _before_call(backend: LLMBackend, user, prompt_type: str) -> None:
+    try:
+        breaker.before_call()
+    except CircuitOpenError as e:
+        _record_call(backend, user, prompt_type, time.monotonic(), e)
+        raise
+
+
+def _record_outcome(exc: BaseException | None) -> None:
+    if exc is None:
+        breaker.record_success()
+    elif is_retryable(exc):
+        # Only provider-side trouble counts against the breaker
+        stats.incr("failures")
+        breaker.record_failure()
+    else:
+        breaker.release()
+
+
+# ====================================================================
+# Sync path
+# ====================================================================
+
+def _attempt(backend: LLMBackend, user, prompt_text: str, schema, options: dict):
+    """
+    One logical attempt: primary request plus an optional hedge, under one deadline.
+    Returns (validated result, winning LLMResponse).
+    """
+    acquire_llm_quota(user, prompt_text)
+    started = time.monotonic()
+    deadline = started + options["TIMEOUT_SECONDS"]
+    hedge_delay = _hedge_delay(options)
+    hedge_at = started + hedge_delay if hedge_delay is not None else None
+
+    primary = _executor.submit(backend.generate, prompt_text, schema)
+    pending = {primary}
+    error = None
+    while pending:
+        wake = min(deadline, hedge_at) if hedge_at else deadline
+        done, pending = wait(pending, timeout=max(0.0, wake - time.monotonic()), return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                response = future.result()
+                result = parse_llm_response(response.text, schema)
+            except Exception as e:
+                error = e
+                continue
+            stats.record_latency(time.monotonic() - started)
+            if future is not primary:
+                stats.incr("hedge_wins")
+            return result, response
+
+        now = time.monotonic()
+        if hedge_at and now >= hedge_at and pending:
+            hedge_at = None
+            try:
+                acquire_llm_quota(user, prompt_text)
+            except RateLimitExceeded:
+                continue  # no budget for a hedge; keep waiting on the primary
+            stats.incr("hedges")
+            pending.add(_executor.submit(backend.generate, prompt_text, schema))
+        elif now >= deadline and pending:
+            stats.incr("timeouts")
+            raise LLMTimeout(f"LLM call exceeded {options['TIMEOUT_SECONDS']}s")
+    raise error
+
+
+def call_llm(backend: LLMBackend, user, prompt_text: str, schema: type[BaseModel], prompt_type: str = "other") -> BaseModel:
+    """
+    Call the model and return the validated `schema` instance.
+    Applies the shared rate limit, a per-attempt deadline, optional hedging,
+    exponential-backoff retries for retryable errors, and the circuit breaker.
+    Every attempt is written to the usage ledger under `prompt_type`.
+    """
+    options = _resilience_options()
+    for attempt in range(options["MAX_RETRIES"] + 1):
+        _before_call(backend, user, prompt_type)
+        stats.incr("calls")
+        started = time.monotonic()
+        try:
+            result, response = _attempt(backend, user, prompt_text, schema, options)
+        except Exception as e:
+            _record_call(backend, user, prompt_type, started, e)
+            _record_outcome(e)
+            if attempt >= options["MAX_RETRIES"] or not is_retryable(e):
+                raise
+            stats.incr("retries")
+            time.sleep(_backoff(attempt, options))
+        except BaseException:
+            # Interrupted (e.g. KeyboardInterrupt) with no outcome: free a half-open trial slot
+            breaker.release()
+            raise
+        else:
+            _record_call(backend, user, prompt_type, started, response=response)
+            _record_outcome(None)
+            return result
+
+
+# ====================================================================
+# Async path
+# ====================================================================
+
+async def _aattempt(backend: LLMBackend, user, prompt_text: str, schema, options: dict):
+    await aacquire_llm_quota(user, prompt_text)
+    started = time.monotonic()
+    deadline = started + options["TIMEOUT_SECONDS"]
+    hedge_delay = _hedge_delay(options)
+    hedge_at = started + hedge_delay if hedge_delay is not None else None
+
+    primary = asyncio.ensure_future(backend.agenerate(prompt_text, schema))
+    pending = {primary}
+    error = None
+    try:
+        while pending:
+            wake = min(deadline, hedge_at) if hedge_at else deadline
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, wake - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                try:
+                    response = task.result()
+                    result = parse_llm_response(response.text, schema)
+                except Exception as e:
+                    error = e
+                    continue
+                stats.record_latency(time.monotonic() - started)
+                if task is not primary:
+                    stats.incr("hedge_wins")
+                return result, response
+
+            now = time.monotonic()
+            if hedge_at and now >= hedge_at and pending:
+                hedge_at = None
+                try:
+                    await aacquire_llm_quota(user, prompt_text)
+                except RateLimitExceeded:
+                    continue
+                stats.incr("hedges")
+                pending.add(asyncio.ensure_future(backend.agenerate(prompt_text, schema)))
+            elif now >= deadline and pending:
+                stats.incr("timeouts")
+                raise LLMTimeout(f"LLM call exceeded {options['TIMEOUT_SECONDS']}s")
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def acall_llm(backend: LLMBackend, user, prompt_text: str, schema: type[BaseModel], prompt_type: str = "other") -> BaseModel:
+    """Async variant of call_llm()."""
+    options = _resilience_options()
+    for attempt in range(options["MAX_RETRIES"] + 1):
+        _before_call(backend, user, prompt_type)
+        stats.incr("calls")
+        started = time.monotonic()
+        try:
+            result, response = await _aattempt(backend, user, prompt_text, schema, options)
+        except Exception as e:
+            _record_call(backend, user, prompt_type, started, e)
+            _record_outcome(e)
+            if attempt >= options["MAX_RETRIES"] or not is_retryable(e):
+                raise
+            stats.incr("retries")
+            await asyncio.sleep(_backoff(attempt, options))
+        except BaseException:
+            # Cancelled (client went away) with no outcome: free a half-open trial slot
+            breaker.release()
+            raise
+        else:
+            _record_call(backend, user, prompt_type, started, response=response)
+            _record_outcome(None)
+            return result
+
+
+async def astream_llm(backend: LLMBackend, user, prompt_text: str, schema: type[BaseModel], prompt_type: str = "other"):
+    """
+    Guarded streaming: breaker + rate limit up front, and TIMEOUT_SECONDS as the
+    longest allowed gap between chunks. Not retried, since chunks may already be sent.
+    Token counts are not reported mid-stream, so the ledger row records latency only.
+    """
+    options = _resilience_options()
+    _before_call(backend, user, prompt_type)
+    stats.incr("calls")
+    started = time.monotonic()
+    try:
+        await aacquire_llm_quota(user, prompt_text)
+    except RateLimitExceeded as e:
+        _record_call(backend, user, prompt_type, started, e)
+        _record_outcome(e)
+        raise
+    except BaseException:
+        breaker.release()
+        raise
+    chunks = backend.astream(prompt_text, schema).__aiter__()
+    started = time.monotonic()
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), options["TIMEOUT_SECONDS"])
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                stats.incr("timeouts")
+                raise LLMTimeout(f"LLM stream stalled for {options['TIMEOUT_SECONDS']}s")
+            yield chunk
+    except Exception as e:
+        _record_call(backend, user, prompt_type, started, e)
+        _record_outcome(e)
+        raise
+    except BaseException:
+        # Cancelled or closed mid-stream (CancelledError / GeneratorExit): no verdict on the provider
+        breaker.release()
+        raise
+    stats.record_latency(time.monotonic() - started)
+    _record_call(backend, user, prompt_type, started)
+    _record_outcome(None)
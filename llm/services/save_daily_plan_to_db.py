@@ -1,60 +1,172 @@
+import hashlib
+import json
+
 from llm.schema import DailyPlan
-from llm.models import DailySchedule, Task
-from datetime import datetime
-from typing import TYPE_CHECKING
+from llm.models import ChangeLog, DailySchedule, Task
+from llm.services.change_log import record_changes
+from llm.services.feedback_rollup import record_feedback_changes
+from llm.services.local_scheduler import parse_time
+from datetime import datetime, time
 from django.db import transaction
+from asgiref.sync import sync_to_async
 
+# ====================================================================
+# Diff-based schedule persistence
+# ====================================================================
+# Each DailySchedule stores the content hash of the plan it was last saved
+# from, so saving the same plan again (every cache hit) is one SELECT.
+# A different plan is diffed against the stored tasks (matched by name):
+# only added, changed and dropped tasks are written. The diff is returned
+# as JSON-patch-style ops; task paths use the task name ("/tasks/<name>",
+# escaped per RFC 6901) because positions shift between plans.
+#
+# Dropped tasks are unlinked, and deleted once no schedule lists them.
+#
+# Tasks belong to the schedule owner. New ones are written with one
+# bulk_create plus one batch of through-table rows, so a save costs the
+# same handful of queries for 5 or 50 tasks (backends with a low bound-
+# parameter limit, like SQLite, split very large plans into a few batches).
 
-def save_daily_plan_to_db(user, daily_plan: DailyPlan) -> DailySchedule:
+SCHEDULE_FIELDS = [
+    "day_of_week",
+    "total_committed_hours",
+    "total_available_hours",
+    "notes",
+    "updated_commitments",
+    "updated_goals",
+    "user_behaviour_patterns",
+]
+TASK_FIELDS = [
+    "description",
+    "estimated_duration_minutes",
+    "priority",
+    "related_goal",
+    "is_flexible",
+    "suggested_time",
+]
+
+
+def plan_hash(daily_plan: DailyPlan) -> str:
+    canonical = json.dumps(daily_plan.model_dump(), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def parse_suggested_time(value: str | None) -> time | None:
+    # 12-hour ("9:30 AM", "3pm") and 24-hour ("14:00") in one regex pass
+    minutes = parse_time(value)
+    return None if minutes is None else time(*divmod(minutes, 60))
+
+
+def _pointer(*parts) -> str:
+    return "".join("/" + str(part).replace("~", "~0").replace("/", "~1") for part in parts)
+
+
+def _task_values(t) -> dict:
+    values = {field: getattr(t, field) for field in TASK_FIELDS}
+    values["suggested_time"] = parse_suggested_time(t.suggested_time)
+    return values
+
+
+def apply_daily_plan(user, daily_plan: DailyPlan) -> tuple[DailySchedule, list[dict]]:
     """
-    Convert a DailyPlan (Pydantic model) into Django models:
-    - DailySchedule
-    - Task
-    Also store adaptive fields like updated_goals, updated_commitments, and user_behaviour_patterns.
+    Persist `daily_plan` as the user's schedule for its date, writing only what changed.
+    Returns (schedule, patch); the patch is empty when the stored schedule already matches.
     """
-
     schedule_date = datetime.fromisoformat(daily_plan.date).date()
+    content_hash = plan_hash(daily_plan)
 
-    # Using transaction.atomic for safer writes
+    # 🔹 Same plan as last time → nothing to write
+    schedule = DailySchedule.objects.filter(user=user, date=schedule_date).first()
+    if schedule is not None and schedule.plan_hash == content_hash:
+        return schedule, []
+
+    patch = []
     with transaction.atomic():
-        schedule, _ = DailySchedule.objects.get_or_create(
+        schedule, created = DailySchedule.objects.get_or_create(
             user=user,
             date=schedule_date,
-            defaults={
-                "day_of_week": daily_plan.day_of_week,
-                "total_committed_hours": daily_plan.total_committed_hours,
-                "total_available_hours": daily_plan.total_available_hours,
-                "notes": daily_plan.notes,
-            },
+            defaults={field: getattr(daily_plan, field) for field in SCHEDULE_FIELDS},
         )
 
-        # Clear old tasks (if regenerating)
-        schedule.tasks.clear()
+        # 🔹 Schedule-level fields
+        changed_fields = []
+        for field in SCHEDULE_FIELDS:
+            value = getattr(daily_plan, field)
+            if created or getattr(schedule, field) != value:
+                setattr(schedule, field, value)
+                changed_fields.append(field)
+                patch.append({"op": "add" if created else "replace", "path": _pointer(field), "value": value})
 
+        # 🔹 Tasks, matched by name
+        current = {task.task_name: task for task in schedule.tasks.all()}
+        planned = set()
+        updated, updated_fields, added, states = [], set(), [], []
         for t in daily_plan.tasks:
-            suggested_time = None
-            if t.suggested_time:
-                # Handle both 12-hour and 24-hour formats safely
-                for fmt in ("%I:%M %p", "%H:%M"):
-                    try:
-                        suggested_time = datetime.strptime(t.suggested_time, fmt).time()
-                        break
-                    except ValueError:
-                        continue
-
-            task, _ = Task.objects.get_or_create(
-                task_name=t.task_name,
-                defaults={
-                    "description": t.description,
-                    "estimated_duration_minutes": t.estimated_duration_minutes,
-                    "priority": t.priority,
-                    "related_goal": t.related_goal,
-                    "is_flexible": t.is_flexible,
-                    "suggested_time": suggested_time,
-                },
-            )
-            schedule.tasks.add(task)
-
-        schedule.save()
+            if t.task_name in planned:
+                continue
+            planned.add(t.task_name)
+            values = _task_values(t)
+            task = current.get(t.task_name)
+            if task is None:
+                added.append(Task(user=user, task_name=t.task_name, **values))
+                patch.append({"op": "add", "path": _pointer("tasks", t.task_name), "value": t.model_dump()})
+                continue
+            changes = {field: value for field, value in values.items() if getattr(task, field) != value}
+            if changes:
+                states.append(task.feedback_state())
+                updated_fields.update(changes)
+                for field, value in changes.items():
+                    setattr(task, field, value)
+                    patch.append({
+                        "op": "replace",
+                        "path": _pointer("tasks", t.task_name, field),
+                        "value": getattr(t, field),
+                    })
+                updated.append(task)
+
+        removed = [task for name, task in current.items() if name not in planned]
+        for task in removed:
+            patch.append({"op": "remove", "path": _pointer("tasks", task.task_name)})
+
+        if updated:
+            Task.objects.bulk_update(updated, sorted(updated_fields))
+        if added:
+            Task.objects.bulk_create(added)
+            Through = DailySchedule.tasks.through
+            Through.objects.bulk_create([Through(dailyschedule=schedule, task=task) for task in added])
+        if removed:
+            schedule.tasks.remove(*removed)
+            # Dropped tasks no other schedule still lists are deleted; the delete
+            # signals write their change-log tombstones and rollup decrements
+            Task.objects.filter(pk__in=[task.pk for task in removed], daily_schedules__isnull=True).delete()
+        record_changes(ChangeLog.KIND_TASK, [(user.pk, task.pk) for task in [*updated, *added]])
+        record_feedback_changes([
+            *zip(states, [task.feedback_state() for task in updated]),
+            *[(None, task.feedback_state()) for task in added],
+        ])
+
+        schedule.plan_hash = content_hash
+        schedule.save(update_fields=[*changed_fields, "plan_hash", "updated_at"])
+
+    return schedule, patch
 
+
+async def aapply_daily_plan(user, daily_plan: DailyPlan) -> tuple[DailySchedule, list[dict]]:
+    """Async variant of apply_daily_plan(); atomic blocks must run in a sync thread."""
+    return await sync_to_async(apply_daily_plan)(user, daily_plan)
+
+
+def save_daily_plan_to_db(user, daily_plan: DailyPlan) -> DailySchedule:
+    """
+    Convert a DailyPlan (Pydantic model) into Django models:
+    - DailySchedule
+    - Task
+    Also store adaptive fields like updated_goals, updated_commitments, and user_behaviour_patterns.
+    """
+    schedule, _ = apply_daily_plan(user, daily_plan)
     return schedule
+
+
+async def asave_daily_plan_to_db(user, daily_plan: DailyPlan) -> DailySchedule:
+    """Async variant of save_daily_plan_to_db(); atomic blocks must run in a sync thread."""
+    return await sync_to_async(save_daily_plan_to_db)(user, daily_plan)
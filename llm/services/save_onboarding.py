@@ -1,10 +1,16 @@
 from llm.services.save_daily_plan_to_db import save_daily_plan_to_db
-from users.models import UserPattern, Goal, Commitment
+from llm.services.pattern_context import record_patterns
+from users.models import Goal, Commitment
 from llm.schema import DailyPlan
 import hashlib
+from asgiref.sync import sync_to_async
 
-def save_onboarding(user, initial_plan: DailyPlan):
-    """Save onboarding outputs: goals, commitments, patterns, and first day's schedule."""
+def save_onboarding(user, initial_plan: DailyPlan, fresh: bool = True):
+    """
+    Save onboarding outputs: goals, commitments, patterns, and first day's schedule.
+    Patterns are only recorded for a `fresh` generation; replaying a cached plan
+    would count the same observations again.
+    """
 
     if not isinstance(initial_plan, DailyPlan):
         initial_plan = DailyPlan.model_validate(initial_plan)
@@ -23,13 +29,14 @@ def save_onboarding(user, initial_plan: DailyPlan):
             defaults={"llm_response": {"commitments": initial_plan.updated_commitments, "source": "onboarding_refined"}}
         )
 
-    # Save user behavior patterns (separate model, no hash or JSON)
-    if initial_plan.user_behaviour_patterns:
-        UserPattern.objects.create(
-            user=user,
-            pattern_text="\n".join(initial_plan.user_behaviour_patterns),
-            date=initial_plan.date if hasattr(initial_plan, "date") else None
-        )
+    # Merge user behavior patterns (deduped, compacted; see pattern_context.py)
+    if fresh and initial_plan.user_behaviour_patterns:
+        record_patterns(user, initial_plan.user_behaviour_patterns)
 
     # Save first day schedule
     save_daily_plan_to_db(user, initial_plan)
+
+
+async def asave_onboarding(user, initial_plan: DailyPlan, fresh: bool = True):
+    """Async variant of save_onboarding(), run in a sync thread."""
+    await sync_to_async(save_onboarding)(user, initial_plan, fresh)
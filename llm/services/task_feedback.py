@@ -0,0 +1,54 @@
+from django.db import transaction
+
+from llm.models import ChangeLog, DailySchedule, Task
+from llm.services.change_log import record_changes
+from llm.services.feedback_rollup import record_feedback_changes
+
+# ====================================================================
+# Batch task feedback
+# ====================================================================
+# End-of-day feedback for many tasks in one transaction: one SELECT for
+# the user's tasks, one bulk_update for the ones that actually changed,
+# then the same invalidation a single save() triggers (schedule
+# updated_at/ETag, the sync change log and the feedback rollups), done
+# once for the batch.
+
+FEEDBACK_FIELDS = ["completed", "rating", "feedback"]
+
+
+def apply_task_feedback(user, items: list[dict]) -> list[dict]:
+    """
+    Apply validated {id, completed?, rating?, feedback?} items to the user's tasks.
+    Returns one result per item, in order: status "updated", "unchanged" or "not_found",
+    with the task for the first two.
+    """
+    with transaction.atomic():
+        tasks = Task.objects.select_for_update().filter(user=user).in_bulk([item["id"] for item in items])
+
+        results, changed, changed_fields, states = [], [], set(), []
+        for item in items:
+            task = tasks.get(item["id"])
+            if task is None:
+                results.append({"id": item["id"], "status": "not_found"})
+                continue
+            changes = {
+                field: item[field]
+                for field in FEEDBACK_FIELDS
+                if field in item and getattr(task, field) != item[field]
+            }
+            if changes:
+                states.append(task.feedback_state())
+            for field, value in changes.items():
+                setattr(task, field, value)
+            if changes:
+                changed.append(task)
+                changed_fields.update(changes)
+            results.append({"id": task.id, "status": "updated" if changes else "unchanged", "task": task})
+
+        if changed:
+            Task.objects.bulk_update(changed, sorted(changed_fields))
+            DailySchedule.objects.filter(tasks__in=changed).touch()
+            record_changes(ChangeLog.KIND_TASK, [(task.user_id, task.pk) for task in changed])
+            record_feedback_changes(zip(states, [task.feedback_state() for task in changed]))
+
+    return results
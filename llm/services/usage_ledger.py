@@ -0,0 +1,169 @@
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from llm.models import LLMCall
+
+
+def _ledger_options() -> dict:
+    options = {
+        "ENABLED": True,
+        "BATCH_SIZE": 50,
+        "FLUSH_SECONDS": 5,
+        "MAX_BUFFER": 5_000,
+        # USD per million tokens, keyed by model name
+        "PRICES": {},
+    }
+    options.update(getattr(settings, "LLM_USAGE_LEDGER", {}))
+    return options
+
+
+def estimate_cost(model: str, input_tokens: int | None, output_tokens: int | None) -> float:
+    price = _ledger_options()["PRICES"].get(model)
+    if not price:
+        return 0.0
+    return (
+        (input_tokens or 0) * price.get("input", 0) + (output_tokens or 0) * price.get("output", 0)
+    ) / 1_000_000
+
+
+# ====================================================================
+# Buffered writer
+# ====================================================================
+# Recording a call only appends an unsaved row to an in-memory buffer, so
+# it is safe from async code and costs nothing on the request path. The
+# buffer is written with one bulk_create once it is full or old enough,
+# after the response has gone out (request_finished), from the job
+# worker loop, and at exit.
+
+class UsageLedger:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer: list[LLMCall] = []
+        self._oldest = 0.0
+
+    def record(self, **fields) -> None:
+        options = _ledger_options()
+        if not options["ENABLED"]:
+            return
+        fields.setdefault("created_at", timezone.now())
+        if "cost_usd" not in fields:
+            fields["cost_usd"] = estimate_cost(
+                fields.get("model", ""), fields.get("input_tokens"), fields.get("output_tokens")
+            )
+        with self._lock:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append(LLMCall(**fields))
+            overflow = len(self._buffer) - options["MAX_BUFFER"]
+            if overflow > 0:
+                # The database is not keeping up; keep the newest rows
+                del self._buffer[:overflow]
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def is_due(self) -> bool:
+        options = _ledger_options()
+        with self._lock:
+            return bool(self._buffer) and (
+                len(self._buffer) >= options["BATCH_SIZE"]
+                or time.monotonic() - self._oldest >= options["FLUSH_SECONDS"]
+            )
+
+    def flush(self) -> int:
+        """Write everything buffered so far in one query. Returns the number of rows written."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        try:
+            LLMCall.objects.bulk_create(rows, batch_size=500)
+        except Exception as e:
+            # Usage accounting must never take a request down with it
+            print(f"⚠️ Dropped {len(rows)} LLM ledger rows: {e}")
+            return 0
+        return len(rows)
+
+    def flush_if_due(self) -> int:
+        return self.flush() if self.is_due() else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buffer = []
+
+
+ledger = UsageLedger()
+
+
+def record_llm_call(user, prompt_type: str, outcome: str, *, model: str = "", latency_seconds: float = 0.0,
+                    input_tokens: int | None = None, output_tokens: int | None = None) -> None:
+    ledger.record(
+        user_id=getattr(user, "pk", None),
+        prompt_type=prompt_type,
+        model=model,
+        outcome=outcome,
+        cache_hit=outcome == "cache_hit",
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        latency_ms=int(latency_seconds * 1000),
+    )
+
+
+def record_cache_hit(user, prompt_type: str) -> None:
+    record_llm_call(user, prompt_type, "cache_hit")
+
+
+def _flush_after_request(sender, **kwargs) -> None:
+    ledger.flush_if_due()
+
+
+request_finished.connect(_flush_after_request, dispatch_uid="llm_usage_ledger_flush")
+atexit.register(ledger.flush)
+
+
+# ====================================================================
+# Rollups
+# ====================================================================
+
+def _rollup(queryset, *group_by):
+    return (
+        queryset.values(*group_by)
+        .annotate(
+            calls=Count("id", filter=~Q(outcome="cache_hit")),
+            cache_hits=Count("id", filter=Q(outcome="cache_hit")),
+            errors=Count("id", filter=~Q(outcome__in=["ok", "cache_hit"])),
+            input_tokens=Sum("input_tokens"),
+            output_tokens=Sum("output_tokens"),
+            cost_usd=Sum("cost_usd"),
+            avg_latency_ms=Avg("latency_ms", filter=~Q(outcome="cache_hit")),
+        )
+        .order_by(*group_by)
+    )
+
+
+def usage_by_user_day(start=None, end=None, queryset=None):
+    """Per user and calendar day, newest day first: calls, cache hits, errors, tokens, cost and mean latency."""
+    queryset = LLMCall.objects.all() if queryset is None else queryset
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    rows = _rollup(queryset.annotate(day=TruncDate("created_at")), "day", "user_id", "user__email")
+    return rows.order_by("-day", "user_id")
+
+
+def usage_by_prompt_type(start=None, end=None, queryset=None):
+    queryset = LLMCall.objects.all() if queryset is None else queryset
+    if start is not None:
+        queryset = queryset.filter(created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(created_at__lt=end)
+    return _rollup(queryset, "prompt_type", "model")
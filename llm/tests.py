@@ -1,3 +1,1122 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from datetime import date, time as datetime_time, timedelta
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.utils import timezone
+
+from core.models import Prompt
+from users.models import Goal, User, UserPattern
+from llm.backends import (
+    CircuitOpenError, InvalidLLMResponse, LLMBackend, LLMError, LLMResponse, LLMTimeout, get_llm_backend,
+)
+from llm.backends.fake import FakeBackend
+from llm.backends.gemini import GeminiBackend
+from llm.models import DailySchedule, FeedbackRollup, LLMCall, RateLimitBucket, Task
+from llm.schema import DailyPlan, DailyTask
+from llm.services import gemini_client, rate_limiter
+from llm.services.prompt_cache import (
+    GenerationWaitTimeout, get_or_create_prompt_cache, acquire_generation, complete_generation, release_generation,
+    _prompt_cache_key, _single_flight_options, get_or_create_structured_prompt, structured_prompt_key,
+)
+from llm.services.plan_stream import DailyTaskStreamParser
+from llm.services.resilience import acall_llm, astream_llm, breaker, call_llm, llm_status, stats as call_stats
+from llm.services.rate_limiter import RateLimitExceeded, acquire_llm_quota, aacquire_llm_quota
+from llm.services.local_scheduler import parse_override_tasks, reschedule_locally, schedule_tasks
+from llm.planners.daily_plan import generate_daily_plan
+from llm.planners.onboarding import generate_onboarding_plan
+from llm.services.feedback_rollup import feedback_trends
+from llm.services.pattern_context import compact_patterns, pattern_context, record_patterns
+from llm.services.prompt_store import prompt_store
+from llm.services.save_daily_plan_to_db import apply_daily_plan
+from llm.services.usage_ledger import ledger, record_llm_call, usage_by_user_day
+
+
+class GeminiClientRegistryTests(TestCase):
+
+    def setUp(self):
+        gemini_client._clients.clear()
+        self.addCleanup(gemini_client._clients.clear)
+
+    @mock.patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+    def test_get_gemini_client_reuses_instance(self):
+        first = gemini_client.get_gemini_client()
+        second = gemini_client.get_gemini_client()
+        self.assertIs(first, second)
+
+    @mock.patch.dict(os.environ, {}, clear=True)
+    def test_get_gemini_client_missing_key(self):
+        with self.assertRaises(ValueError):
+            gemini_client.get_gemini_client()
+
+    @override_settings(GEMINI_CLIENT={"TIMEOUT": 5})
+    @mock.patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+    def test_get_gemini_client_applies_timeout_setting(self):
+        client = gemini_client.get_gemini_client()
+        self.assertEqual(client._api_client._http_options.timeout, 5000)
+
+    @override_settings(GEMINI_CLIENT={"TIMEOUT": 60}, LLM_RESILIENCE={"TIMEOUT_SECONDS": 20})
+    @mock.patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+    def test_client_timeout_never_outlives_the_attempt_deadline(self):
+        client = gemini_client.get_gemini_client()
+        self.assertEqual(client._api_client._http_options.timeout, 20000)
+
+    @mock.patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+    def test_close_gemini_clients_empties_registry(self):
+        gemini_client.get_gemini_client()
+        gemini_client.close_gemini_clients()
+        self.assertEqual(gemini_client._clients, {})
+
+    @mock.patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+    def test_async_call_on_short_lived_loop_uses_pooled_sync_client(self):
+        backend = GeminiBackend("gemini-test")
+        response = mock.Mock(text="{}", usage_metadata=None)
+        with mock.patch.object(gemini_client.genai.Client, "models", create=True) as models:
+            models.generate_content.return_value = response
+            # async_to_sync runs each call on a new loop, as a WSGI request does
+            async_to_sync(backend.agenerate)("prompt", DailyPlan)
+            async_to_sync(backend.agenerate)("prompt", DailyPlan)
+        self.assertEqual(models.generate_content.call_count, 2)
+        self.assertEqual(len(gemini_client._clients), 1)
+        self.assertEqual(len(gemini_client._async_clients), 0)
+
+    @mock.patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+    def test_asgi_lifespan_gives_loop_one_async_client_and_closes_it(self):
+        from jing.asgi import application
+
+        async def lifespan():
+            messages = asyncio.Queue()
+            sent = []
+
+            async def send(message):
+                sent.append(message["type"])
+                if message["type"] == "lifespan.startup.complete":
+                    first = gemini_client.get_async_gemini_client()
+                    self.assertIs(gemini_client.get_async_gemini_client(), first)
+                    await messages.put({"type": "lifespan.shutdown"})
+
+            await messages.put({"type": "lifespan.startup"})
+            await application({"type": "lifespan"}, messages.get, send)
+            return sent
+
+        with mock.patch.object(gemini_client.genai.client.AsyncClient, "aclose") as aclose:
+            sent = async_to_sync(lifespan)()
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        aclose.assert_awaited()
+        self.assertEqual(len(gemini_client._async_clients), 0)
+
+    @mock.patch.dict(os.environ, {"GEMINI_API_KEY": "test-key"})
+    def test_reset_after_fork_drops_clients(self):
+        first = gemini_client.get_gemini_client()
+        gemini_client._reset_after_fork()
+        self.assertIsNot(gemini_client.get_gemini_client(), first)
+
+
+class DailyTaskStreamParserTests(TestCase):
+
+    def setUp(self):
+        self.plan = {
+            "date": "2025-01-01",
+            "day_of_week": "Wednesday",
+            "tasks": [
+                {"task_name": "Read {docs}", "description": "a \\\"quoted\\\" ] brace", "estimated_duration_minutes": 30, "priority": "NOW"},
+                {"task_name": "Walk", "description": "outside", "estimated_duration_minutes": 20, "priority": "LATER"},
+            ],
+            "notes": "done",
+        }
+
+    def test_feed_yields_tasks_as_they_complete(self):
+        raw = json.dumps(self.plan)
+        parser = DailyTaskStreamParser()
+        names = []
+        for i in range(0, len(raw), 7):
+            names.extend(t.task_name for t in parser.feed(raw[i:i + 7]))
+        self.assertEqual(names, ["Read {docs}", "Walk"])
+        self.assertEqual(json.loads(parser.buffer), self.plan)
+
+    def test_feed_single_chunk(self):
+        tasks = DailyTaskStreamParser().feed(json.dumps(self.plan))
+        self.assertEqual(len(tasks), 2)
+
+    def test_feed_skips_invalid_task(self):
+        raw = json.dumps({"tasks": [{"task_name": "missing fields"}]})
+        self.assertEqual(DailyTaskStreamParser().feed(raw), [])
+
+
+@override_settings(PROMPT_SINGLE_FLIGHT={"WAIT_SECONDS": 0, "POLL_INTERVAL": 0})
+class PromptSingleFlightTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        prompt_store.clear()
+        self.addCleanup(prompt_store.clear)
+        self.user = User.objects.create_user(username="flyer", password="strongpassword123")
+        self.prompt, _ = get_or_create_prompt_cache(self.user, "plan my day", "summary")
+
+    def test_acquire_generation_first_caller_leads(self):
+        self.assertTrue(acquire_generation(self.prompt))
+
+    def test_acquire_generation_waits_on_held_lease(self):
+        acquire_generation(self.prompt)
+        with self.assertRaises(GenerationWaitTimeout):
+            acquire_generation(Prompt.objects.get(pk=self.prompt.pk))
+
+    @override_settings(
+        PROMPT_SINGLE_FLIGHT={},
+        LLM_RESILIENCE={"TIMEOUT_SECONDS": 30, "MAX_RETRIES": 2, "BACKOFF_BASE_SECONDS": 0.5, "BACKOFF_MAX_SECONDS": 8},
+        LLM_RATE_LIMIT={"MAX_WAIT_SECONDS": 10},
+    )
+    def test_default_wait_outlasts_worst_case_generation(self):
+        options = _single_flight_options()
+        # 3 timed-out attempts + 0.5s and 1s backoff + 10s quota wait
+        self.assertGreater(options["WAIT_SECONDS"], 3 * 30 + 1.5 + 10)
+        self.assertGreater(options["LEASE_SECONDS"], options["WAIT_SECONDS"])
+
+    def test_acquire_generation_returns_stored_response(self):
+        acquire_generation(self.prompt)
+        complete_generation(self.prompt, {"date": "2025-01-01"})
+        follower = Prompt.objects.get(pk=self.prompt.pk)
+        self.assertFalse(acquire_generation(follower))
+        self.assertEqual(follower.llm_response, {"date": "2025-01-01"})
+
+    def test_acquire_generation_after_release(self):
+        acquire_generation(self.prompt)
+        release_generation(self.prompt)
+        self.assertTrue(acquire_generation(Prompt.objects.get(pk=self.prompt.pk)))
+
+    def test_acquire_generation_takes_over_expired_lease(self):
+        Prompt.objects.filter(pk=self.prompt.pk).update(generation_lease_until=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(acquire_generation(self.prompt))
+
+    def test_same_prompt_for_two_users_gets_separate_rows(self):
+        other = User.objects.create_user(username="other", password="strongpassword123")
+        theirs, created = get_or_create_prompt_cache(other, "plan my day", "summary")
+        self.assertTrue(created)
+        self.assertNotEqual(theirs.pk, self.prompt.pk)
+
+
+class FakeBackendTests(TestCase):
+
+    def test_generate_is_deterministic_and_schema_valid(self):
+        backend = FakeBackend("fake", TASKS=3)
+        first = backend.generate("same prompt", DailyPlan)
+        second = backend.generate("same prompt", DailyPlan)
+        self.assertEqual(first.text, second.text)
+        self.assertEqual(len(DailyPlan.model_validate_json(first.text).tasks), 3)
+
+    def test_generate_injects_errors(self):
+        with self.assertRaises(LLMError):
+            FakeBackend("fake", ERROR_RATE=1.0).generate("prompt", DailyPlan)
+
+    def test_astream_concatenates_to_full_response(self):
+        backend = FakeBackend("fake", STREAM_CHUNK_SIZE=16)
+
+        async def collect():
+            return [chunk async for chunk in backend.astream("prompt", DailyPlan)]
+
+        chunks = async_to_sync(collect)()
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), backend.generate("prompt", DailyPlan).text)
+
+    @override_settings(LLM_BACKEND={"BACKEND": "llm.backends.fake.FakeBackend", "MODEL": "fake"})
+    def test_get_llm_backend_uses_setting(self):
+        self.assertIsInstance(get_llm_backend(), FakeBackend)
+
+
+@override_settings(LLM_RATE_LIMIT={
+    "REQUESTS_PER_MINUTE": 100, "TOKENS_PER_MINUTE": 0, "USER_REQUESTS_PER_MINUTE": 2, "MAX_WAIT_SECONDS": 0,
+})
+class RateLimiterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="limited", password="strongpassword123")
+
+    def test_acquire_llm_quota_per_user_budget(self):
+        acquire_llm_quota(self.user, "prompt")
+        acquire_llm_quota(self.user, "prompt")
+        with self.assertRaises(RateLimitExceeded) as ctx:
+            acquire_llm_quota(self.user, "prompt")
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+
+    def test_acquire_llm_quota_users_are_independent(self):
+        other = User.objects.create_user(username="other", password="strongpassword123")
+        acquire_llm_quota(self.user, "prompt")
+        acquire_llm_quota(self.user, "prompt")
+        acquire_llm_quota(other, "prompt")
+
+    @override_settings(LLM_RATE_LIMIT={
+        "REQUESTS_PER_MINUTE": 100, "TOKENS_PER_MINUTE": 3000, "USER_REQUESTS_PER_MINUTE": 0,
+        "EST_OUTPUT_TOKENS": 1000, "MAX_WAIT_SECONDS": 0,
+    })
+    def test_acquire_llm_quota_global_token_budget(self):
+        acquire_llm_quota(self.user, "x" * 4000)  # ~2000 tokens
+        with self.assertRaises(RateLimitExceeded):
+            acquire_llm_quota(self.user, "x" * 4000)
+
+    def test_failed_acquire_takes_nothing(self):
+        acquire_llm_quota(self.user, "prompt")
+        acquire_llm_quota(self.user, "prompt")
+        before = RateLimitBucket.objects.get(key="global:requests").tokens
+        with self.assertRaises(RateLimitExceeded):
+            acquire_llm_quota(self.user, "prompt")
+        self.assertEqual(RateLimitBucket.objects.get(key="global:requests").tokens, before)
+
+    @override_settings(LLM_RATE_LIMIT={"MAX_WAIT_SECONDS": 0.05})
+    def test_contended_acquire_gives_up_at_the_wait_deadline(self):
+        with mock.patch("llm.services.rate_limiter._try_acquire", side_effect=rate_limiter._Conflict) as attempt:
+            with self.assertRaises(RateLimitExceeded):
+                acquire_llm_quota(self.user, "prompt")
+            with self.assertRaises(RateLimitExceeded):
+                async_to_sync(aacquire_llm_quota)(self.user, "prompt")
+        self.assertGreater(attempt.call_count, 2)
+
+    def test_async_acquire_llm_quota(self):
+        async_to_sync(aacquire_llm_quota)(self.user, "prompt")
+        self.assertEqual(RateLimitBucket.objects.get(key=f"user:{self.user.pk}:requests").version, 1)
+
+
+class FlakyBackend(LLMBackend):
+    """Test double: plays back a script of exceptions / response texts / delays."""
+
+    def __init__(self, script, delays=None):
+        super().__init__("flaky")
+        self.script = list(script)
+        self.delays = list(delays or [])
+        self.calls = 0
+
+    def _next(self):
+        self.calls += 1
+        item = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        delay = self.delays.pop(0) if self.delays else 0
+        return item, delay
+
+    def generate(self, prompt, schema):
+        item, delay = self._next()
+        time.sleep(delay)
+        if isinstance(item, Exception):
+            raise item
+        return LLMResponse(text=item, model=self.model)
+
+    async def agenerate(self, prompt, schema):
+        item, delay = self._next()
+        await asyncio.sleep(delay)
+        if isinstance(item, Exception):
+            raise item
+        return LLMResponse(text=item, model=self.model)
+
+
+PLAN_JSON = json.dumps({"date": "2025-01-01", "day_of_week": "Wednesday"})
+
+
+@override_settings(
+    LLM_RATE_LIMIT={"REQUESTS_PER_MINUTE": 0, "TOKENS_PER_MINUTE": 0, "USER_REQUESTS_PER_MINUTE": 0},
+    LLM_RESILIENCE={"MAX_RETRIES": 2, "BACKOFF_BASE_SECONDS": 0, "BREAKER_FAILURE_THRESHOLD": 3, "BREAKER_RESET_SECONDS": 60},
+)
+class ResilienceTests(TestCase):
+
+    def setUp(self):
+        breaker.reset()
+        call_stats.reset()
+        self.addCleanup(breaker.reset)
+        ledger.clear()
+        self.addCleanup(ledger.clear)
+
+    def test_call_llm_retries_retryable_errors(self):
+        backend = FlakyBackend([LLMError("503"), PLAN_JSON])
+        plan = call_llm(backend, None, "prompt", DailyPlan)
+        self.assertEqual(plan.date, "2025-01-01")
+        self.assertEqual(backend.calls, 2)
+        self.assertEqual(llm_status()["counters"]["retries"], 1)
+
+    def test_call_llm_does_not_retry_client_errors(self):
+        error = ValueError("bad request")
+        backend = FlakyBackend([error, PLAN_JSON])
+        with self.assertRaises(ValueError):
+            call_llm(backend, None, "prompt", DailyPlan)
+        self.assertEqual(backend.calls, 1)
+
+    def test_call_llm_invalid_json_raises_specific_error(self):
+        with self.assertRaises(InvalidLLMResponse):
+            call_llm(FlakyBackend(["{not json"]), None, "prompt", DailyPlan)
+
+    @override_settings(LLM_RESILIENCE={"TIMEOUT_SECONDS": 0.05, "MAX_RETRIES": 0})
+    def test_call_llm_enforces_deadline(self):
+        with self.assertRaises(LLMTimeout):
+            call_llm(FlakyBackend([PLAN_JSON], delays=[0.5]), None, "prompt", DailyPlan)
+
+    @override_settings(LLM_RESILIENCE={"HEDGE": True, "HEDGE_MIN_SECONDS": 0.05, "MAX_RETRIES": 0})
+    def test_call_llm_hedged_request_wins(self):
+        backend = FlakyBackend([PLAN_JSON], delays=[1.0, 0])
+        call_llm(backend, None, "prompt", DailyPlan)
+        counters = llm_status()["counters"]
+        self.assertEqual(counters["hedges"], 1)
+        self.assertEqual(counters["hedge_wins"], 1)
+
+    def test_breaker_opens_and_short_circuits(self):
+        with self.assertRaises(LLMError):
+            call_llm(FlakyBackend([LLMError("503")]), None, "prompt", DailyPlan)
+        self.assertEqual(llm_status()["breaker"]["state"], "open")
+        backend = FlakyBackend([PLAN_JSON])
+        with self.assertRaises(CircuitOpenError):
+            call_llm(backend, None, "prompt", DailyPlan)
+        self.assertEqual(backend.calls, 0)
+
+    @override_settings(LLM_RESILIENCE={"BREAKER_FAILURE_THRESHOLD": 1, "BREAKER_RESET_SECONDS": 0, "MAX_RETRIES": 0})
+    def test_breaker_half_open_trial_closes_on_success(self):
+        breaker.record_failure()
+        call_llm(FlakyBackend([PLAN_JSON]), None, "prompt", DailyPlan)
+        self.assertEqual(llm_status()["breaker"]["state"], "closed")
+
+    @override_settings(LLM_RESILIENCE={"BREAKER_FAILURE_THRESHOLD": 1, "BREAKER_RESET_SECONDS": 0, "MAX_RETRIES": 0})
+    def test_cancelled_half_open_trial_frees_the_slot(self):
+        breaker.record_failure()
+
+        async def cancel_trial():
+            task = asyncio.ensure_future(acall_llm(FlakyBackend([PLAN_JSON], delays=[5]), None, "prompt", DailyPlan))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        async_to_sync(cancel_trial)()
+        # The next caller gets the trial instead of "retry after 1s" forever
+        async_to_sync(acall_llm)(FlakyBackend([PLAN_JSON]), None, "prompt", DailyPlan)
+        self.assertEqual(llm_status()["breaker"]["state"], "closed")
+
+    @override_settings(LLM_RESILIENCE={"BREAKER_FAILURE_THRESHOLD": 1, "BREAKER_RESET_SECONDS": 0, "MAX_RETRIES": 0})
+    def test_closed_half_open_stream_frees_the_slot(self):
+        breaker.record_failure()
+
+        async def read_one_chunk():
+            stream = astream_llm(FakeBackend("fake", STREAM_CHUNK_SIZE=16), None, "prompt", DailyPlan)
+            await stream.__anext__()
+            await stream.aclose()  # client disconnected
+
+        async_to_sync(read_one_chunk)()
+        async_to_sync(acall_llm)(FlakyBackend([PLAN_JSON]), None, "prompt", DailyPlan)
+        self.assertEqual(llm_status()["breaker"]["state"], "closed")
+
+    def test_acall_llm_retries(self):
+        backend = FlakyBackend([LLMError("503"), PLAN_JSON])
+        plan = async_to_sync(acall_llm)(backend, None, "prompt", DailyPlan)
+        self.assertEqual(plan.day_of_week, "Wednesday")
+        self.assertEqual(backend.calls, 2)
+
+    def test_call_llm_writes_one_ledger_row_per_attempt(self):
+        backend = FlakyBackend([LLMError("503"), PLAN_JSON])
+        call_llm(backend, None, "prompt", DailyPlan, prompt_type="summary")
+        self.assertEqual(ledger.flush(), 2)
+        outcomes = LLMCall.objects.order_by("created_at").values_list("prompt_type", "outcome")
+        self.assertEqual(list(outcomes), [("summary", "error"), ("summary", "ok")])
+
+    def test_llm_status_requires_admin(self):
+        user = User.objects.create_user(username="plain", password="strongpassword123")
+        token = RefreshToken.for_user(user).access_token
+        response = self.client.get(reverse("llm:llm-status"), HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(LLM_USAGE_LEDGER={"BATCH_SIZE": 2, "FLUSH_SECONDS": 60, "PRICES": {"m": {"input": 1.0, "output": 2.0}}})
+class UsageLedgerTests(TestCase):
+
+    def setUp(self):
+        ledger.clear()
+        self.addCleanup(ledger.clear)
+        self.user = User.objects.create_user(username="ledger", email="l@example.com", password="strongpassword123")
+
+    def test_record_is_buffered_until_flush(self):
+        record_llm_call(self.user, "summary", "ok", model="m", input_tokens=1000, output_tokens=500)
+        self.assertEqual(LLMCall.objects.count(), 0)
+        self.assertEqual(ledger.flush(), 1)
+        call = LLMCall.objects.get()
+        self.assertAlmostEqual(call.cost_usd, 0.002)
+
+    def test_flush_if_due_waits_for_batch(self):
+        record_llm_call(self.user, "summary", "ok", model="m")
+        self.assertEqual(ledger.flush_if_due(), 0)
+        record_llm_call(self.user, "summary", "ok", model="m")
+        self.assertEqual(ledger.flush_if_due(), 2)
+
+    @override_settings(LLM_USAGE_LEDGER={"ENABLED": False})
+    def test_disabled_ledger_records_nothing(self):
+        record_llm_call(self.user, "summary", "ok")
+        self.assertEqual(ledger.pending(), 0)
+
+    def test_usage_by_user_day(self):
+        record_llm_call(self.user, "summary", "ok", model="m", input_tokens=100, output_tokens=50, latency_seconds=0.2)
+        record_llm_call(self.user, "summary", "timeout", model="m", latency_seconds=0.4)
+        record_llm_call(self.user, "summary", "cache_hit")
+        ledger.flush()
+        (row,) = usage_by_user_day()
+        self.assertEqual(row["day"], timezone.now().date())
+        self.assertEqual((row["calls"], row["cache_hits"], row["errors"]), (2, 1, 1))
+        self.assertEqual((row["input_tokens"], row["output_tokens"]), (100, 50))
+        self.assertEqual(row["avg_latency_ms"], 300)
+
+    def test_usage_by_user_day_newest_first(self):
+        record_llm_call(self.user, "summary", "ok", model="m")
+        record_llm_call(self.user, "summary", "ok", model="m")
+        ledger.flush()
+        LLMCall.objects.filter(pk=LLMCall.objects.first().pk).update(created_at=timezone.now() - timedelta(days=3))
+        days = [row["day"] for row in usage_by_user_day()]
+        self.assertEqual(days, sorted(days, reverse=True))
+        self.assertEqual(days[0], timezone.now().date())
+
+    def test_admin_changelist_shows_daily_rollup(self):
+        admin = User.objects.create_superuser(username="root", email="r@example.com", password="strongpassword123")
+        record_llm_call(self.user, "summary", "ok", model="m", input_tokens=10, output_tokens=5)
+        ledger.flush()
+        self.client.force_login(admin)
+        response = self.client.get(reverse("admin:llm_llmcall_changelist"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["daily_usage"]), 1)
+
+
+@override_settings(USER_PATTERNS={"WINDOW": 3, "DIGEST_ITEMS": 2, "COMPACT_SLACK": 1, "SIMILARITY": 0.8, "MAX_CHARS": 2000})
+class PatternContextTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="habits", email="h@example.com", password="strongpassword123")
+
+    def test_record_patterns_dedupes_near_identical(self):
+        record_patterns(self.user, ["Prefers short focus blocks", "prefers short focus blocks."])
+        record_patterns(self.user, ["Prefers short, focused blocks", "Works late on Fridays"])
+        self.assertEqual(UserPattern.objects.filter(user=self.user).count(), 3)
+        row = UserPattern.objects.get(user=self.user, pattern_text="Prefers short focus blocks")
+        self.assertEqual(row.seen_count, 2)
+
+    def test_context_stays_bounded(self):
+        for i in range(20):
+            record_patterns(self.user, [f"pattern number {i}", "Prefers mornings"])
+        compact_patterns(self.user)
+        self.assertLessEqual(UserPattern.objects.filter(user=self.user).count(), 5)
+        context = pattern_context(self.user)
+        self.assertIn("Prefers mornings", context)
+        self.assertIn("pattern number 19", context)
+        self.assertNotIn("pattern number 0", context)
+        self.assertLessEqual(len(context), 5)
+
+    @override_settings(USER_PATTERNS={"MAX_CHARS": 30})
+    def test_context_respects_char_budget(self):
+        record_patterns(self.user, ["a" * 20, "b" * 20])
+        self.assertEqual(len(pattern_context(self.user)), 1)
+
+    @override_settings(LLM_BACKEND={"BACKEND": "llm.backends.fake.FakeBackend", "MODEL": "fake"})
+    def test_onboarding_replay_does_not_recount_patterns(self):
+        cache.clear()
+        prompt_store.clear()
+        self.addCleanup(prompt_store.clear)
+        self.addCleanup(ledger.clear)
+        generate_onboarding_plan(self.user)
+        generate_onboarding_plan(self.user)
+        row = UserPattern.objects.get(user=self.user, pattern_text="Prefers short focus blocks")
+        self.assertEqual(row.seen_count, 1)
+
+    def test_compact_command(self):
+        for i in range(5):
+            UserPattern.objects.create(user=self.user, pattern_text=f"unrelated thing {i}")
+        call_command("compact_user_patterns", stdout=StringIO())
+        self.assertEqual(UserPattern.objects.filter(user=self.user, kind=UserPattern.KIND_OBSERVATION).count(), 3)
+        self.assertEqual(UserPattern.objects.filter(user=self.user, kind=UserPattern.KIND_DIGEST).count(), 2)
+
+
+def plan_with(*tasks):
+    return DailyPlan(date="2025-01-01", day_of_week="Wednesday", tasks=[DailyTask(**t) for t in tasks])
+
+
+@override_settings(LOCAL_SCHEDULER={"DAY_START": "09:00", "DAY_END": "12:00", "BUFFER_MINUTES": 10})
+class LocalSchedulerTests(TestCase):
+
+    def test_places_around_fixed_tasks_with_buffer(self):
+        plan = plan_with(
+            {"task_name": "Standup", "description": "", "estimated_duration_minutes": 30,
+             "priority": "High", "suggested_time": "9:00 AM", "is_flexible": False},
+            {"task_name": "Email", "description": "", "estimated_duration_minutes": 20, "priority": "Low"},
+            {"task_name": "Deep work", "description": "", "estimated_duration_minutes": 60, "priority": "Highest"},
+        )
+        times = {t.task_name: t.suggested_time for t in schedule_tasks(plan).tasks}
+        self.assertEqual(times, {"Standup": "9:00 AM", "Deep work": "9:40 AM", "Email": "10:50 AM"})
+
+    def test_fixed_task_bumps_overlapping_flexible_task(self):
+        plan = plan_with(
+            {"task_name": "Read", "description": "", "estimated_duration_minutes": 30,
+             "priority": "Medium", "suggested_time": "9:00 AM"},
+        )
+        new = parse_override_tasks("Call dentist at 9:15 am for 15 min")
+        times = {t.task_name: t.suggested_time for t in schedule_tasks(plan, new).tasks}
+        self.assertEqual(times, {"Call dentist": "9:15 AM", "Read": "9:40 AM"})
+
+    def test_task_that_does_not_fit_is_noted(self):
+        plan = plan_with({"task_name": "Marathon", "description": "", "estimated_duration_minutes": 240, "priority": "High"})
+        result = schedule_tasks(plan)
+        self.assertIsNone(result.tasks[0].suggested_time)
+        self.assertIn("Marathon", result.notes)
+
+    def test_parse_override_tasks(self):
+        (walk,) = parse_override_tasks("Add a 20 min walk")
+        self.assertEqual((walk.task_name, walk.estimated_duration_minutes, walk.is_flexible), ("Walk", 20, True))
+        (call,) = parse_override_tasks("Call mom at 3pm for 15 min, high")
+        self.assertEqual((call.suggested_time, call.priority, call.is_flexible), ("3:00 PM", "High", False))
+
+    def test_parse_override_tasks_defers_to_model(self):
+        self.assertIsNone(parse_override_tasks("cancel the gym"))
+        self.assertIsNone(parse_override_tasks("Please rework my whole day so I can visit my grandmother"))
+
+    def test_reschedule_locally_is_idempotent(self):
+        plan = reschedule_locally(plan_with(), "Add a walk")
+        self.assertEqual(reschedule_locally(plan, "Add a walk"), plan)
+
+
+class ApplyDailyPlanTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="saver", email="s@example.com", password="strongpassword123")
+        self.plan = plan_with(
+            {"task_name": "Read", "description": "", "estimated_duration_minutes": 30, "priority": "NOW",
+             "suggested_time": "9:00 AM"},
+            {"task_name": "Email", "description": "", "estimated_duration_minutes": 15, "priority": "LATER"},
+        )
+
+    def test_same_plan_is_a_single_select(self):
+        apply_daily_plan(self.user, self.plan)
+        with self.assertNumQueries(1):
+            schedule, patch = apply_daily_plan(self.user, self.plan.model_copy(deep=True))
+        self.assertEqual(patch, [])
+        self.assertEqual(schedule.tasks.count(), 2)
+
+    def test_changed_plan_writes_only_the_diff(self):
+        schedule, _ = apply_daily_plan(self.user, self.plan)
+        read = schedule.tasks.get(task_name="Read")
+        read.completed = True
+        read.save()
+
+        changed = self.plan.model_copy(deep=True)
+        changed.tasks[0].suggested_time = "10:30 AM"
+        changed.tasks[1] = DailyTask(task_name="Walk/run", description="", estimated_duration_minutes=20, priority="NOW")
+        schedule, patch = apply_daily_plan(self.user, changed)
+
+        self.assertEqual(patch, [
+            {"op": "replace", "path": "/tasks/Read/suggested_time", "value": "10:30 AM"},
+            {"op": "add", "path": "/tasks/Walk~1run", "value": changed.tasks[1].model_dump()},
+            {"op": "remove", "path": "/tasks/Email"},
+        ])
+        self.assertEqual(sorted(schedule.tasks.values_list("task_name", flat=True)), ["Read", "Walk/run"])
+        # Unchanged tasks keep their identity (and completion state)
+        self.assertTrue(schedule.tasks.get(task_name="Read").completed)
+
+    def test_dropped_tasks_are_deleted(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            schedule, _ = apply_daily_plan(self.user, self.plan)
+        email = schedule.tasks.get(task_name="Email")
+        changed = self.plan.model_copy(deep=True)
+        changed.tasks = changed.tasks[:1]
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_daily_plan(self.user, changed)
+
+        self.assertFalse(Task.objects.filter(pk=email.pk).exists())
+        self.assertTrue(self.user.changes.get(kind="task", object_id=email.pk).deleted)
+        self.assertFalse(FeedbackRollup.objects.filter(user=self.user, priority="LATER", total_tasks__gt=0).exists())
+
+    def test_first_save_query_count_does_not_grow_with_tasks(self):
+        def plan(size):
+            return plan_with(*[
+                {"task_name": f"Task {i}", "description": "", "estimated_duration_minutes": 5, "priority": "NOW"}
+                for i in range(size)
+            ])
+
+        other = User.objects.create_user(username="saver2", email="s2@example.com", password="strongpassword123")
+        with CaptureQueriesContext(connection) as small:
+            apply_daily_plan(self.user, plan(5))
+        with CaptureQueriesContext(connection) as large:
+            apply_daily_plan(other, plan(50).model_copy(update={"date": "2025-01-02"}))
+        self.assertEqual(len(small), len(large))
+
+    def test_tasks_are_owned_per_user(self):
+        other = User.objects.create_user(username="saver2", email="s2@example.com", password="strongpassword123")
+        apply_daily_plan(self.user, self.plan)
+        apply_daily_plan(other, self.plan.model_copy(update={"date": "2025-01-02"}))
+        self.assertEqual(self.user.tasks.count(), 2)
+        self.assertEqual(other.tasks.count(), 2)
+        self.assertEqual(str(self.user.tasks.get(task_name="Read").suggested_time), "09:00:00")
+
+
+class ScheduleTaskCountTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="counter", email="c@example.com", password="strongpassword123")
+        for day in range(1, 6):
+            apply_daily_plan(self.user, plan_with(
+                {"task_name": "Read", "description": "", "estimated_duration_minutes": 30, "priority": "NOW"},
+                {"task_name": "Email", "description": "", "estimated_duration_minutes": 15, "priority": "LATER"},
+            ).model_copy(update={"date": f"2025-01-0{day}"}))
+
+    def test_annotated_counts_need_no_extra_queries(self):
+        schedules = list(DailySchedule.objects.with_task_counts())
+        with self.assertNumQueries(0):
+            summaries = [schedule.summary() for schedule in schedules]
+        self.assertEqual(summaries[0]["tasks"], 2)
+        self.assertEqual(summaries[0]["high_priority"], 1)
+
+    def test_admin_changelist_query_count_is_flat(self):
+        self.client.force_login(self.user)
+        url = reverse("admin:llm_dailyschedule_changelist")
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for day in range(10, 20):
+            DailySchedule.objects.create(user=self.user, date=f"2025-01-{day}", day_of_week="Friday")
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(few), len(many))
+
+
+class ScheduleApiTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="pager", email="pg@example.com", password="strongpassword123")
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+        self.url = reverse("llm:schedule-list")
+        for day in range(1, 8):
+            apply_daily_plan(self.user, plan_with(
+                {"task_name": f"Task {day}", "description": "", "estimated_duration_minutes": 30, "priority": "NOW"},
+                {"task_name": "Email", "description": "", "estimated_duration_minutes": 15, "priority": "LATER"},
+            ).model_copy(update={"date": f"2025-01-0{day}"}))
+
+    def test_schedules_scoped_to_owner(self):
+        other = User.objects.create_user(username="other", email="ot@example.com", password="strongpassword123")
+        theirs, _ = apply_daily_plan(other, plan_with().model_copy(update={"date": "2025-01-01"}))
+        response = self.client.get(self.url, **self.auth)
+        self.assertEqual(len(response.json()["results"]), 7)
+        response = self.client.get(reverse("llm:schedule-detail", args=[theirs.id]), **self.auth)
+        self.assertEqual(response.status_code, 404)
+
+    def test_schedules_cursor_pages_with_date_filter(self):
+        response = self.client.get(
+            self.url, {"page_size": 2, "date_from": "2025-01-02", "date_to": "2025-01-05"}, **self.auth
+        )
+        page = response.json()
+        self.assertEqual([s["date"] for s in page["results"]], ["2025-01-05", "2025-01-04"])
+        self.assertEqual(page["results"][0]["total_tasks"], 2)
+        page = self.client.get(page["next"], **self.auth).json()
+        self.assertEqual([s["date"] for s in page["results"]], ["2025-01-03", "2025-01-02"])
+        self.assertIsNone(page["next"])
+
+    def test_duplicate_schedule_date_rejected(self):
+        body = {"date": "2025-01-01", "day_of_week": "Wednesday", "tasks": []}
+        response = self.client.post(self.url, json.dumps(body), content_type="application/json", **self.auth)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("date", response.json())
+        body["date"] = "2025-02-01"
+        response = self.client.post(self.url, json.dumps(body), content_type="application/json", **self.auth)
+        self.assertEqual(response.status_code, 201)
+
+    def test_schedules_bad_date_filter_rejected(self):
+        response = self.client.get(self.url, {"date_from": "yesterday"}, **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_schedule_page_query_count_is_flat(self):
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url, {"page_size": 2}, **self.auth)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(self.url, {"page_size": 7}, **self.auth)
+        self.assertEqual(len(small), len(large))
+
+    def test_schedule_detail_if_none_match_returns_304(self):
+        schedule = DailySchedule.objects.get(user=self.user, date="2025-01-03")
+        url = reverse("llm:schedule-detail", args=[schedule.id])
+        response = self.client.get(url, **self.auth)
+        self.assertIn("Last-Modified", response)
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"], **self.auth)
+        self.assertEqual(cached.status_code, 304)
+        # JWT user lookup + the validator lookup; tasks are never loaded
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(any("llm_task" in q["sql"] for q in queries.captured_queries))
+
+    def test_schedule_detail_if_modified_since_returns_304(self):
+        schedule = DailySchedule.objects.get(user=self.user, date="2025-01-03")
+        url = reverse("llm:schedule-detail", args=[schedule.id])
+        last_modified = self.client.get(url, **self.auth)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified, **self.auth)
+        self.assertEqual(response.status_code, 304)
+
+    def test_schedule_etag_changes_with_task_feedback(self):
+        schedule = DailySchedule.objects.get(user=self.user, date="2025-01-03")
+        url = reverse("llm:schedule-detail", args=[schedule.id])
+        etag = self.client.get(url, **self.auth)["ETag"]
+        task = schedule.tasks.get(task_name="Email")
+        self.client.post(
+            reverse("llm:task-give-feedback", args=[task.id]), {"completed": True}, **self.auth
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_tasks_scoped_and_filtered_by_schedule_date(self):
+        other = User.objects.create_user(username="other", email="ot@example.com", password="strongpassword123")
+        Task.objects.create(user=other, task_name="Secret", priority="NOW")
+        response = self.client.get(reverse("llm:task-list"), {"date_from": "2025-01-07"}, **self.auth)
+        names = sorted(t["task_name"] for t in response.json()["results"])
+        self.assertEqual(names, ["Email", "Task 7"])
+
+
+class TaskFeedbackBatchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="rater", email="ra@example.com", password="strongpassword123")
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+        self.url = reverse("llm:task-give-feedback-batch")
+        self.schedule, _ = apply_daily_plan(self.user, plan_with(*[
+            {"task_name": f"Task {i}", "description": "", "estimated_duration_minutes": 30, "priority": "NOW"}
+            for i in range(20)
+        ]))
+        self.tasks = list(self.schedule.tasks.order_by("id"))
+
+    def post(self, items):
+        return self.client.post(self.url, json.dumps(items), content_type="application/json", **self.auth)
+
+    def test_batch_feedback_applies_and_reports_per_item(self):
+        other = User.objects.create_user(username="other", email="ot@example.com", password="strongpassword123")
+        theirs = Task.objects.create(user=other, task_name="Secret", priority="NOW")
+        first, second = self.tasks[:2]
+        response = self.post([
+            {"id": first.id, "completed": True, "rating": 5, "feedback": "Easy"},
+            {"id": second.id, "completed": False},
+            {"id": theirs.id, "completed": True},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["status"] for r in response.json()], ["updated", "unchanged", "not_found"])
+        self.assertEqual(response.json()[0]["task"]["rating"], 5)
+        first.refresh_from_db()
+        theirs.refresh_from_db()
+        self.assertEqual((first.completed, first.rating, first.feedback), (True, 5, "Easy"))
+        self.assertFalse(theirs.completed)
+
+    def test_batch_feedback_invalid_item_rejects_whole_batch(self):
+        response = self.post([
+            {"id": self.tasks[0].id, "completed": True},
+            {"id": self.tasks[1].id, "rating": 9},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("rating", response.json()[1])
+        self.assertFalse(Task.objects.filter(completed=True).exists())
+
+    def test_batch_feedback_rejects_duplicate_ids(self):
+        response = self.post([{"id": self.tasks[0].id, "completed": True}, {"id": self.tasks[0].id, "rating": 2}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_feedback_query_count_is_flat(self):
+        with CaptureQueriesContext(connection) as small:
+            self.post([{"id": task.id, "completed": True} for task in self.tasks[:2]])
+        with CaptureQueriesContext(connection) as large:
+            self.post([{"id": task.id, "completed": True, "rating": 3} for task in self.tasks[2:]])
+        self.assertEqual(len(small), len(large))
+
+    def test_batch_feedback_invalidates_schedule_etag_and_sync(self):
+        url = reverse("llm:schedule-detail", args=[self.schedule.id])
+        etag = self.client.get(url, **self.auth)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post([{"id": self.tasks[0].id, "completed": True}])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag, **self.auth).status_code, 200)
+        self.assertTrue(self.user.changes.filter(kind="task", object_id=self.tasks[0].id).exists())
+        self.assertTrue(self.user.changes.filter(kind="schedule", object_id=self.schedule.id).exists())
+
+
+class FeedbackRollupTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        prompt_store.clear()
+        self.addCleanup(prompt_store.clear)
+        self.user = User.objects.create_user(username="trends", email="tr@example.com", password="strongpassword123")
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+        self.schedule, _ = apply_daily_plan(self.user, plan_with(*[
+            {"task_name": f"Run {i}", "description": "", "estimated_duration_minutes": 30, "priority": "NOW",
+             "related_goal": "Run 5k", "suggested_time": "7:00 AM"}
+            for i in range(4)
+        ], {"task_name": "Email", "description": "", "estimated_duration_minutes": 15, "priority": "LATER"}))
+        self.runs = list(self.schedule.tasks.filter(related_goal="Run 5k").order_by("id"))
+
+    def rollups(self):
+        return sorted(FeedbackRollup.objects.filter(user=self.user).values_list(
+            "goal", "bucket", "priority", "total_tasks", "completed_tasks", "rated_tasks", "rating_sum",
+        ))
+
+    def assert_matches_rebuild(self):
+        incremental = self.rollups()
+        call_command("rebuild_feedback_rollups", stdout=StringIO())
+        self.assertEqual(incremental, self.rollups())
+
+    def test_new_tasks_counted_by_goal_bucket_priority(self):
+        self.assertEqual(self.rollups(), [
+            ("", "anytime", "LATER", 1, 0, 0, 0),
+            ("Run 5k", "morning", "NOW", 4, 0, 0, 0),
+        ])
+
+    def test_feedback_updates_rollup_incrementally(self):
+        run = self.runs[0]
+        self.client.post(
+            reverse("llm:task-give-feedback", args=[run.id]), {"completed": True, "rating": 4}, **self.auth
+        )
+        self.client.post(
+            reverse("llm:task-give-feedback-batch"),
+            json.dumps([{"id": self.runs[1].id, "completed": True, "rating": 2}, {"id": run.id, "rating": 5}]),
+            content_type="application/json", **self.auth,
+        )
+        self.assertIn(("Run 5k", "morning", "NOW", 4, 2, 2, 7), self.rollups())
+        self.assert_matches_rebuild()
+
+    def test_rescheduled_and_deleted_tasks_move_counts(self):
+        run = self.runs[0]
+        run.completed = True
+        run.suggested_time = datetime_time(19, 0)
+        run.save()
+        self.runs[1].delete()
+        self.assertEqual(self.rollups(), [
+            ("", "anytime", "LATER", 1, 0, 0, 0),
+            ("Run 5k", "evening", "NOW", 1, 1, 0, 0),
+            ("Run 5k", "morning", "NOW", 2, 0, 0, 0),
+        ])
+        self.assert_matches_rebuild()
+
+    def test_trends_read_in_two_queries(self):
+        for run in self.runs[:3]:
+            run.completed, run.rating = True, 4
+            run.save()
+        with CaptureQueriesContext(connection) as queries:
+            trends = feedback_trends(self.user, date(2025, 1, 2))
+        self.assertEqual(len(queries), 2)
+        # The single LATER task is below MIN_TASKS and left out
+        self.assertEqual(trends, "- Run 5k · morning · NOW: 3/4 completed (75%), avg rating 4.0/5")
+
+    def test_trends_leave_out_the_target_day(self):
+        self.assertIsNone(feedback_trends(self.user, date(2025, 1, 1)))
+
+    @override_settings(
+        LLM_BACKEND={"BACKEND": "llm.backends.fake.FakeBackend", "MODEL": "fake"}, FEEDBACK_TRENDS={"MIN_TASKS": 1},
+    )
+    def test_saving_todays_plan_keeps_the_prompt_cached(self):
+        ledger.clear()
+        self.addCleanup(ledger.clear)
+        with mock.patch("llm.planners.daily_plan.acall_llm", wraps=acall_llm) as llm:
+            generate_daily_plan(self.user, reschedule=True)
+            generate_daily_plan(self.user, reschedule=True)
+        self.assertEqual(llm.call_count, 1)
+        self.assertEqual(Prompt.objects.filter(user=self.user, type="summary").count(), 1)
+
+    @override_settings(LLM_BACKEND={"BACKEND": "llm.backends.fake.FakeBackend", "MODEL": "fake"})
+    def test_trends_included_in_plan_prompt(self):
+        ledger.clear()
+        self.addCleanup(ledger.clear)
+        self.runs[0].completed = True
+        self.runs[0].save()
+        generate_daily_plan(self.user)
+        prompt = Prompt.objects.get(user=self.user, type="summary")
+        self.assertIn("- Run 5k · morning · NOW: 1/4 completed (25%)", prompt.text)
+
+
+class SyncTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="syncer", email="sy@example.com", password="strongpassword123")
+        token = RefreshToken.for_user(self.user).access_token
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+        self.url = reverse("llm:sync")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.schedule, _ = apply_daily_plan(self.user, plan_with(
+                {"task_name": "Write", "description": "", "estimated_duration_minutes": 30, "priority": "NOW"},
+                {"task_name": "Email", "description": "", "estimated_duration_minutes": 15, "priority": "LATER"},
+            ))
+            self.goal = Goal.objects.create(user=self.user, llm_response={"goal": "Ship it"})
+
+    def sync(self, since=0, **params):
+        return self.client.get(self.url, {"since": since, **params}, **self.auth).json()
+
+    def test_sync_from_zero_returns_everything(self):
+        data = self.sync()
+        self.assertEqual(sorted(t["task_name"] for t in data["tasks"]), ["Email", "Write"])
+        self.assertEqual([s["id"] for s in data["schedules"]], [self.schedule.id])
+        self.assertEqual([g["id"] for g in data["goals"]], [self.goal.id])
+        self.assertFalse(data["has_more"])
+        self.assertEqual(self.sync(data["cursor"])["tasks"], [])
+
+    def test_sync_returns_only_changed_task_and_its_schedule(self):
+        cursor = self.sync()["cursor"]
+        task = self.schedule.tasks.get(task_name="Email")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("llm:task-give-feedback", args=[task.id]), {"completed": True, "rating": 4}, **self.auth
+            )
+        data = self.sync(cursor)
+        self.assertEqual([(t["id"], t["completed"], t["rating"]) for t in data["tasks"]], [(task.id, True, 4)])
+        self.assertEqual([s["id"] for s in data["schedules"]], [self.schedule.id])
+        self.assertEqual(data["goals"], [])
+        self.assertGreater(data["cursor"], cursor)
+
+    def test_sync_deleted_task_becomes_tombstone(self):
+        cursor = self.sync()["cursor"]
+        task = self.schedule.tasks.get(task_name="Write")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse("llm:task-detail", args=[task.id]), **self.auth)
+        data = self.sync(cursor)
+        self.assertEqual(data["deleted"]["tasks"], [task.id])
+        self.assertEqual(data["tasks"], [])
+        # Only the latest change per object is kept
+        self.assertEqual(self.user.changes.filter(kind="task", object_id=task.id).count(), 1)
+
+    @override_settings(CHANGE_SYNC={"MAX_CHANGES": 2})
+    def test_sync_pages_with_has_more(self):
+        first = self.sync()
+        self.assertTrue(first["has_more"])
+        rest = self.sync(first["cursor"])
+        self.assertFalse(rest["has_more"])
+        synced = len(first["tasks"]) + len(first["schedules"]) + len(first["goals"]) + len(rest["tasks"]) \
+            + len(rest["schedules"]) + len(rest["goals"])
+        self.assertEqual(synced, 4)
+
+    def test_change_ids_are_allocated_under_the_user_lock(self):
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                Goal.objects.create(user=self.user, llm_response={"goal": "Another"})
+        sql = [query["sql"] for query in queries.captured_queries]
+        lock = next(i for i, q in enumerate(sql) if 'FROM "users_user"' in q)
+        insert = next(i for i, q in enumerate(sql) if q.startswith('INSERT INTO "llm_changelog"'))
+        self.assertLess(lock, insert)
+
+    def test_sync_rejects_bad_cursor(self):
+        response = self.client.get(self.url, {"since": "yesterday"}, **self.auth)
+        self.assertEqual(response.status_code, 400)
+
+    def test_sync_changes_scoped_to_owner(self):
+        other = User.objects.create_user(username="other", email="ot@example.com", password="strongpassword123")
+        with self.captureOnCommitCallbacks(execute=True):
+            Goal.objects.create(user=other, llm_response={"goal": "Not yours"})
+        self.assertEqual([g["id"] for g in self.sync()["goals"]], [self.goal.id])
+
+
+class StructuredPromptKeyTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="keys", email="k@example.com", password="strongpassword123")
+        prompt_store.clear()
+        self.addCleanup(prompt_store.clear)
+
+    def test_key_ignores_input_ordering(self):
+        a = structured_prompt_key("summary", {"goals": ["a"], "date": "2025-01-01"}, 1)
+        b = structured_prompt_key("summary", {"date": "2025-01-01", "goals": ["a"]}, 1)
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, structured_prompt_key("summary", {"goals": ["a"], "date": "2025-01-01"}, 2))
+
+    def test_render_only_on_miss(self):
+        render = mock.Mock(return_value="rendered prompt")
+        first, created = get_or_create_structured_prompt(self.user, "summary", {"goals": []}, render, 1)
+        second, created_again = get_or_create_structured_prompt(self.user, "summary", {"goals": []}, render, 1)
+        self.assertEqual((created, created_again), (True, False))
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(second.text, "rendered prompt")
+        self.assertEqual(render.call_count, 1)
+
+    def test_ignore_time_matches_emitted_labels(self):
+        morning = "Current time: 09:00 AM\nApproximate remaining hours today: 15.0\nGoals"
+        evening = "Current time: 06:30 PM\nApproximate remaining hours today: 5.5\nGoals"
+        self.assertEqual(
+            _prompt_cache_key(morning, "summary", ignore_time=True),
+            _prompt_cache_key(evening, "summary", ignore_time=True),
+        )
+
+    def test_onboarding_prompt_is_deterministic_for_same_inputs(self):
+        from llm.prompts.onboarding import onboard_user
+        with mock.patch("llm.prompts.onboarding.datetime") as fake_datetime:
+            fake_datetime.now.return_value = timezone.now()
+            self.assertEqual(onboard_user("run 5k", "work 9-5"), onboard_user("run 5k", "work 9-5"))
+
+
+@override_settings(PROMPT_CACHE={"GENERATION_CHECK_SECONDS": 0})
+class PromptStoreTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        prompt_store.clear()
+        self.addCleanup(prompt_store.clear)
+        self.user = User.objects.create_user(username="tiers", email="t@example.com", password="strongpassword123")
+
+    def _get(self):
+        return get_or_create_structured_prompt(self.user, "summary", {"goals": ["x"]}, lambda: "prompt", 1)
+
+    def test_hit_is_served_from_cache_without_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            created_prompt, _ = self._get()
+        with self.assertNumQueries(0):
+            prompt, created = self._get()
+        self.assertFalse(created)
+        self.assertEqual(prompt.pk, created_prompt.pk)
+
+    def test_shared_tier_survives_local_clear(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._get()
+        prompt_store.clear()
+        with self.assertNumQueries(0):
+            self._get()
+
+    def test_used_count_is_flushed_in_batches(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            prompt, _ = self._get()
+        self._get()
+        self._get()
+        self.assertEqual(Prompt.objects.get(pk=prompt.pk).used_count, 0)
+        with self.assertNumQueries(1):
+            prompt_store.flush_hits()
+        self.assertEqual(Prompt.objects.get(pk=prompt.pk).used_count, 2)
+
+    def test_update_invalidates_cached_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            prompt, _ = self._get()
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_generation(prompt, {"tasks": []})
+        cached, _ = self._get()
+        self.assertEqual(cached.llm_response, {"tasks": []})
+
+    def test_invalidating_one_row_keeps_the_others_local(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first, _ = self._get()
+            other, _ = get_or_create_structured_prompt(self.user, "summary", {"goals": ["y"]}, lambda: "other", 1)
+        prompt_store.invalidate(first.hash)
+        self.assertIsNone(cache.get("prompt-cache:generation"))
+        self.assertIsNone(cache.get(f"prompt-cache:{first.hash}"))
+        self.assertIsNotNone(prompt_store.get(other.hash))
+
+    def test_local_entry_rechecks_shared_tier(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            prompt, _ = self._get()
+        cache.delete(f"prompt-cache:{prompt.hash}")  # another worker invalidated it
+        with self.assertNumQueries(1):
+            self._get()
+
+    def test_generation_bump_drops_local_entries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._get()
+        cache.delete_many([k for k in [f"prompt-cache:{h}" for h in Prompt.objects.values_list("hash", flat=True)]])
+        cache.set("prompt-cache:generation", 99)  # another worker invalidated something
+        with self.assertNumQueries(1):
+            self._get()
+
+    def test_local_memory_l2_lives_no_longer_than_l1(self):
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            with self.captureOnCommitCallbacks(execute=True):
+                self._get()
+        self.assertEqual(cache_set.call_args.kwargs["timeout"], 30)
@@ -1,11 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TaskViewSet, DailyScheduleViewSet
+from .views import TaskViewSet, DailyScheduleViewSet, LLMStatusView, SyncView
 
 router = DefaultRouter()
 router.register(r"tasks", TaskViewSet, basename="task")
 router.register(r"schedules", DailyScheduleViewSet, basename="schedule")
 app_name = "llm"
 urlpatterns = [
+    path("status/", LLMStatusView.as_view(), name="llm-status"),
+    path("sync/", SyncView.as_view(), name="sync"),
     path("", include(router.urls)),
 ]
@@ -1,16 +1,61 @@
+import hashlib
+from datetime import date
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.views import APIView
+
+from core.conditional import not_modified, set_validators
 
 from .models import Task, DailySchedule
-from .serializers import TaskSerializer, DailyScheduleSerializer
+from .pagination import ScheduleCursorPagination, TaskCursorPagination
+from users.serializers import GoalSerializer
+
+from .serializers import TaskSerializer, DailyScheduleSerializer, TaskFeedbackSerializer
+from .services.change_log import changes_since
+from .services.task_feedback import apply_task_feedback
+from .services.resilience import llm_status
+
+
+# Largest end-of-day batch accepted by POST /tasks/feedback/
+MAX_FEEDBACK_ITEMS = 100
+
+
+def _date_range(request) -> tuple[date | None, date | None]:
+    """Parse ?date_from=/?date_to= (inclusive, YYYY-MM-DD)."""
+    bounds = []
+    for param in ("date_from", "date_to"):
+        value = request.query_params.get(param)
+        try:
+            bounds.append(date.fromisoformat(value) if value else None)
+        except ValueError:
+            raise ValidationError({param: "Use YYYY-MM-DD."})
+    return bounds[0], bounds[1]
 
 
 class TaskViewSet(viewsets.ModelViewSet):
-    queryset = Task.objects.all()
+    """The user's own tasks, newest first; ?date_from=/?date_to= filter on the schedule date."""
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TaskCursorPagination
+
+    def get_queryset(self):
+        queryset = Task.objects.filter(user=self.request.user)
+        date_from, date_to = _date_range(self.request)
+        if date_from or date_to:
+            schedules = DailySchedule.objects.filter(user=self.request.user)
+            if date_from:
+                schedules = schedules.filter(date__gte=date_from)
+            if date_to:
+                schedules = schedules.filter(date__lte=date_to)
+            queryset = queryset.filter(daily_schedules__in=schedules).distinct()
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
 
     @action(detail=True, methods=["post"], url_path="feedback")
     def give_feedback(self, request, pk=None):
@@ -21,12 +66,99 @@ class TaskViewSet(viewsets.ModelViewSet):
         serializer.save()
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["post"], url_path="feedback")
+    def give_feedback_batch(self, request):
+        """
+        Feedback for many tasks at once: a list of {id, completed, rating, feedback}.
+        Items are validated together and applied in one transaction; the response has
+        one {id, status[, task]} result per item, in request order.
+        """
+        serializer = TaskFeedbackSerializer(
+            data=request.data, many=True, allow_empty=False, max_length=MAX_FEEDBACK_ITEMS
+        )
+        serializer.is_valid(raise_exception=True)
+        results = apply_task_feedback(request.user, serializer.validated_data)
+        for result in results:
+            if "task" in result:
+                result["task"] = TaskSerializer(result["task"]).data
+        return Response(results, status=status.HTTP_200_OK)
+
 
 class DailyScheduleViewSet(viewsets.ModelViewSet):
-    queryset = DailySchedule.objects.all()
+    """The user's schedules, newest day first, with ?date_from=/?date_to= filters."""
     serializer_class = DailyScheduleSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ScheduleCursorPagination
+
+    def get_queryset(self):
+        # Prefetched tasks also serve total_tasks/high_priority_tasks without extra queries
+        queryset = DailySchedule.objects.filter(user=self.request.user).prefetch_related("tasks")
+        date_from, date_to = _date_range(self.request)
+        if date_from:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(date__lte=date_to)
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    def retrieve(self, request, *args, **kwargs):
+        # 🔹 Validators from one narrow lookup; a 304 skips the prefetch and the serializer
+        try:
+            row = (
+                DailySchedule.objects.filter(user=request.user, pk=kwargs["pk"])
+                .values("id", "plan_hash", "updated_at")
+                .first()
+            )
+        except (TypeError, ValueError):
+            row = None
+        if row is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag, last_modified = _schedule_validators(row)
+        response = not_modified(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            return response
+        return set_validators(super().retrieve(request, *args, **kwargs), etag, last_modified)
+
+
+def _schedule_validators(row: dict) -> tuple[str, float]:
+    """Strong ETag from the saved plan's hash and the last write; Last-Modified from updated_at."""
+    updated_at = row["updated_at"]
+    digest = hashlib.sha256(f"{row['id']}:{row['plan_hash']}:{updated_at.isoformat()}".encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"', updated_at.timestamp()
+
+
+class SyncView(APIView):
+    """
+    Delta sync: tasks, schedules and goals changed since ?since=<cursor> (0 for everything),
+    with deleted ids as tombstones. Pass the returned cursor next time; repeat while has_more.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get("since") or 0)
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            raise ValidationError({"since": "Use the cursor from the previous sync, or 0."})
+
+        page = changes_since(request.user, since)
+        return Response({
+            "cursor": page["cursor"],
+            "has_more": page["has_more"],
+            "tasks": TaskSerializer(page["tasks"], many=True).data,
+            "schedules": DailyScheduleSerializer(page["schedules"], many=True).data,
+            "goals": GoalSerializer(page["goals"], many=True).data,
+            "deleted": page["deleted"],
+        }, status=status.HTTP_200_OK)
+
+
+class LLMStatusView(APIView):
+    """Circuit breaker state and call/retry/hedge counters for this worker process."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(llm_status(), status=status.HTTP_200_OK)
@@ -3,6 +3,13 @@ from django.contrib import admin
 # Register your models here.
 from .models import User, Goal, Commitment, UserPattern
 admin.site.register(User)
-admin.site.register(UserPattern)
 admin.site.register(Goal)
 admin.site.register(Commitment)
+
+
+@admin.register(UserPattern)
+class UserPatternAdmin(admin.ModelAdmin):
+    list_display = ("user", "kind", "pattern_text", "seen_count", "last_seen_at")
+    list_filter = ("kind",)
+    search_fields = ("user__email", "pattern_text")
+    ordering = ("user", "kind", "-last_seen_at")
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:12
+
+import hashlib
+import re
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def _normalize(text):
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower()))
+
+
+def split_and_fingerprint_patterns(apps, schema_editor):
+    """Split the old newline-joined rows into one row per pattern, merging exact duplicates."""
+    UserPattern = apps.get_model("users", "UserPattern")
+    seen = {}
+    for row in UserPattern.objects.order_by("user_id", "created_at", "id").iterator():
+        lines = [line.strip() for line in row.pattern_text.splitlines() if _normalize(line)]
+        if not lines:
+            row.delete()
+            continue
+        first = True
+        for line in lines:
+            fingerprint = hashlib.sha256(_normalize(line).encode("utf-8")).hexdigest()
+            existing = seen.get((row.user_id, fingerprint))
+            if existing is not None:
+                existing.seen_count += 1
+                existing.last_seen_at = row.created_at
+                existing.save(update_fields=["seen_count", "last_seen_at"])
+                continue
+            if first:
+                target = row
+                target.pattern_text = line
+                first = False
+            else:
+                target = UserPattern(user_id=row.user_id)
+                target.pattern_text = line
+            target.fingerprint = fingerprint
+            target.last_seen_at = row.created_at
+            target.save()
+            seen[(row.user_id, fingerprint)] = target
+        if first:
+            row.delete()  # every line was a duplicate of an earlier row
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_commitment_goal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpattern',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='userpattern',
+            name='kind',
+            field=models.CharField(choices=[('observation', 'Observation'), ('digest', 'Digest')], default='observation', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='userpattern',
+            name='last_seen_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='userpattern',
+            name='seen_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddIndex(
+            model_name='userpattern',
+            index=models.Index(fields=['user', 'kind', '-last_seen_at'], name='users_userp_user_id_ef307d_idx'),
+        ),
+        migrations.RunPython(split_and_fingerprint_patterns, migrations.RunPython.noop),
+    ]
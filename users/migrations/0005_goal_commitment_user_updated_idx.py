@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_userpattern_compaction'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commitment',
+            index=models.Index(fields=['user', '-updated_at'], name='users_commit_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['user', '-updated_at'], name='users_goal_user_updated_idx'),
+        ),
+    ]
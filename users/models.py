@@ -2,6 +2,7 @@ from django.db import models
 
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.utils import timezone
 import hashlib
 
 
@@ -14,12 +15,31 @@ class User(AbstractUser):
 
 
 class UserPattern(models.Model):
+    # One observed pattern per row; rows outside the rolling window are folded
+    # into digest rows (the DIGEST_ITEMS most recurring are kept) by
+    # llm/services/pattern_context.py
+    KIND_OBSERVATION = "observation"
+    KIND_DIGEST = "digest"
+    KIND_CHOICES = [
+        (KIND_OBSERVATION, "Observation"),
+        (KIND_DIGEST, "Digest"),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date = models.DateField(auto_now_add=True)
     pattern_text = models.TextField()  # from daily_plan.user_behaviour_patterns
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES, default=KIND_OBSERVATION)
+    fingerprint = models.CharField(max_length=64, blank=True, default="")  # hash of the normalized text
+    seen_count = models.PositiveIntegerField(default=1)
+    last_seen_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "kind", "-last_seen_at"]),
+        ]
+
     def __str__(self):
         return f"Pattern for {self.user.username} on {self.date}"
 
@@ -33,6 +53,12 @@ class Goal(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     hash = models.CharField(max_length=64, unique=True, editable=False)
 
+    class Meta:
+        indexes = [
+            # user.goals.order_by("-updated_at")
+            models.Index(fields=["user", "-updated_at"], name="users_goal_user_updated_idx"),
+        ]
+
     def save(self, *args, **kwargs):
         # Use the serialized llm_response to compute a hash
         self.hash = hashlib.sha256(
@@ -55,6 +81,12 @@ class Commitment(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     hash = models.CharField(max_length=64, unique=True, editable=False)
 
+    class Meta:
+        indexes = [
+            # user.commitments.order_by("-updated_at")
+            models.Index(fields=["user", "-updated_at"], name="users_commit_user_updated_idx"),
+        ]
+
     def save(self, *args, **kwargs):
         self.hash = hashlib.sha256(
             f"{self.user_id}::commitment::{self.llm_response}".encode("utf-8")
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import User
+from .models import Goal, User
 from django.contrib.auth.password_validation import validate_password
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -16,3 +16,10 @@ class RegisterSerializer(serializers.ModelSerializer):
             password=validated_data['password']
         )
         return user
+
+
+class GoalSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Goal
+        fields = ('id', 'llm_response', 'created_at', 'updated_at')
+        read_only_fields = fields